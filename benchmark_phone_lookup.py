@@ -0,0 +1,71 @@
+"""
+Замер времени поиска дубликатов при регистрации в зависимости от размера таблицы users
+Запуск: python benchmark_phone_lookup.py [размер1 размер2 ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot"))
+
+import logging
+
+from sqlalchemy import create_engine
+
+import database
+from database import Base, User, find_existing_user, find_existing_user_safe, normalize_phone
+
+LOOKUPS = 200
+
+
+def fill_users(engine, start: int, count: int):
+    """Быстрое заполнение таблицы пользователями с телефонами"""
+    rows = []
+    for i in range(start, start + count):
+        phone = f"+7900{i:07d}"
+        rows.append(
+            {
+                "telegram_id": 1_000_000 + i,
+                "name": f"User_{i}",
+                "email": f"user{i}@example.com",
+                "phone": phone,
+                "phone_normalized": normalize_phone(phone),
+            }
+        )
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), rows)
+
+
+def measure(func, size: int) -> float:
+    """Среднее время (мс) поиска нового пользователя, которого нет в базе"""
+    started = time.perf_counter()
+    for i in range(LOOKUPS):
+        func(900_000_000 + i, f"new{i}@example.com", f"+7911{size + i:07d}")
+    return (time.perf_counter() - started) * 1000 / LOOKUPS
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    logging.getLogger("database").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        database.SessionLocal.configure(bind=engine)
+
+        print(f"{'пользователей':>14} | {'find_existing_user':>18} | {'find_existing_user_safe':>23}")
+        filled = 0
+        for size in sorted(sizes):
+            fill_users(engine, filled, size - filled)
+            filled = size
+            plain = measure(find_existing_user, size)
+            safe = measure(find_existing_user_safe, size)
+            print(f"{size:>14} | {plain:>15.3f} мс | {safe:>20.3f} мс")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import os
+import io
 import json
 import asyncio
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -232,9 +233,9 @@ async def request_manual_ids(callback: CallbackQuery, state: FSMContext, is_admi
 123456789, 987654321, 555444333
 
 <b>Формат:</b>
-• ID разделяются запятыми
-• Пробелы игнорируются
-• Некорректные ID будут пропущены
+• ID разделяются запятыми, пробелами или переносами строк
+• Некорректные ID и повторы будут пропущены
+• Длинный список можно прислать файлом .txt или .csv
 
 Введите список ID:"""
     
@@ -250,26 +251,51 @@ async def handle_manual_ids(message: Message, state: FSMContext, is_admin: bool
         await state.clear()
         return
     
-    ids_text = message.text.strip()
+    from database import parse_telegram_ids, validate_telegram_ids
     
-    # Парсим ID
     try:
-        id_list = []
-        for id_str in ids_text.split(','):
-            id_str = id_str.strip()
-            if id_str.isdigit():
-                id_list.append(int(id_str))
+        # Парсим ID построчно: из текста сообщения или из присланного файла
+        if message.document:
+            file = await message.bot.get_file(message.document.file_id)
+            buffer = await message.bot.download_file(file.file_path)
+            buffer.seek(0)
+            parsed = parse_telegram_ids(io.TextIOWrapper(buffer, encoding="utf-8", errors="replace"))
+        else:
+            parsed = parse_telegram_ids((message.text or "").splitlines())
         
-        if not id_list:
+        if not parsed['ids']:
             await message.answer("❌ Некорректные ID. Попробуйте снова.")
             return
         
+        # Проверяем всех разом: известные и доступные, заблокировавшие бота, неизвестные
+        check = await validate_telegram_ids(parsed['ids'])
+        id_list = check['valid']
+        
+        skipped = []
+        if check['invalid']:
+            skipped.append(f"• Нет в базе: {len(check['invalid'])}")
+        if check['unreachable']:
+            skipped.append(f"• Заблокировали бота: {len(check['unreachable'])}")
+        if parsed['malformed_count']:
+            examples = ', '.join(parsed['malformed'][:3])
+            skipped.append(f"• Некорректные: {parsed['malformed_count']} ({examples})")
+        if parsed['duplicates']:
+            skipped.append(f"• Повторы: {parsed['duplicates']}")
+        skipped_text = "\n\n<b>Пропущено:</b>\n" + "\n".join(skipped) if skipped else ""
+        
+        if not id_list:
+            await message.answer(
+                f"❌ Среди введенных ID нет доступных пользователей бота.{skipped_text}",
+                parse_mode="HTML"
+            )
+            return
+        
         await state.update_data(manual_ids=id_list)
         
         text = f"""✅ <b>ID приняты</b>
 
 <b>Список получателей ({len(id_list)} ID):</b>
-{', '.join(map(str, id_list[:10]))}{'...' if len(id_list) > 10 else ''}
+{', '.join(map(str, id_list[:10]))}{'...' if len(id_list) > 10 else ''}{skipped_text}
 
 Теперь введите текст сообщения:"""
         
@@ -339,14 +365,12 @@ async def execute_broadcast(callback: CallbackQuery, state: FSMContext, is_admin
         filter_type = state_data.get('broadcast_filter')
         manual_ids = state_data.get('manual_ids', [])
         
-        # Получаем список получателей
+        # Ручной список - по ID, остальные фильтры выбираются из БД по ходу рассылки
         if filter_type == "manual":
-            target_ids = manual_ids
+            result = await send_broadcast_to_ids(callback.bot, manual_ids, broadcast_text, "admin_manual")
         else:
-            target_ids = await get_user_ids_by_filter(filter_type)
-        
-        # Выполняем рассылку
-        result = await send_broadcast_to_ids(callback.bot, target_ids, broadcast_text)
+            result = await send_broadcast_to_ids(callback.bot, None, broadcast_text,
+                                                 f"admin_{filter_type}", audience=filter_type)
         
         # Результат
         success_rate = (result['sent'] / result['total'] * 100) if result['total'] > 0 else 0
@@ -379,63 +403,34 @@ async def execute_broadcast(callback: CallbackQuery, state: FSMContext, is_admin
 
 # =========================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===========================
 
-async def get_user_ids_by_filter(filter_type: str) -> list:
-    """Получение ID пользователей по фильтру"""
-    from database import SessionLocal, User
-    def _get_ids():
-        db = SessionLocal()
-        try:
-            if filter_type == "all":
-                users = db.query(User).filter(User.registration_completed == True).all()
-            elif filter_type == "completed":
-                users = db.query(User).filter(User.completed_diagnostic == True).all()
-            elif filter_type == "uncompleted":
-                users = db.query(User).filter(
-                    User.registration_completed == True,
-                    User.completed_diagnostic == False
-                ).all()
-            elif filter_type == "survey":
-                users = db.query(User).filter(User.survey_completed == True).all()
-            elif filter_type == "tests":
-                users = db.query(User).filter(User.tests_completed == True).all()
-            else:
-                return []
-            
-            return [user.telegram_id for user in users]
-        finally:
-            db.close()
+async def send_broadcast_to_ids(bot, target_ids: list, message_text: str,
+                                broadcast_type: str = "admin_manual", audience: str = None) -> dict:
+    """Отправка рассылки по списку ID или по аудитории (через сохраняемое задание рассылки)
     
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _get_ids)
-
-async def send_broadcast_to_ids(bot, target_ids: list, message_text: str) -> dict:
-    """Отправка рассылки по списку ID"""
-    total = len(target_ids)
-    sent = 0
-    errors = 0
-    error_details = []
+    При target_ids=None получатели выбираются из БД по аудитории audience.
+    """
+    from broadcast import start_broadcast_job
     
-    for user_id in target_ids:
-        try:
-            await bot.send_message(user_id, message_text, parse_mode="Markdown")
-            sent += 1
-            # Задержка для избежания лимитов
-            await asyncio.sleep(0.05)
-        except Exception as e:
-            errors += 1
-            error_details.append(f"ID {user_id}: {str(e)[:50]}")
+    result = await start_broadcast_job(bot, broadcast_type, message_text, target_ids,
+                                       target_audience=audience, parse_mode="Markdown")
+    total = result['total']
+    sent = result['sent']
+    errors = result['errors']
+    error_details = result['error_details']
     
     # Формируем детали для отчета
     details = ""
-    if error_details and len(error_details) <= 5:
+    # error_details - только первые примеры, общее число ошибок в errors
+    if error_details and errors <= 5:
         details = "\n\n🔍 <b>Детали ошибок:</b>\n" + "\n".join(error_details)
     elif error_details:
-        details = f"\n\n🔍 <b>Ошибки:</b> {len(error_details)} (показаны первые 5)\n" + "\n".join(error_details[:5])
+        details = f"\n\n🔍 <b>Ошибки:</b> {errors} (показаны первые 5)\n" + "\n".join(error_details[:5])
     
     return {
         'total': total,
         'sent': sent,
         'errors': errors,
+        'blocked': result['blocked'],
         'details': details
     }
 
@@ -460,7 +455,7 @@ async def test_broadcast(callback: CallbackQuery, state: FSMContext, is_admin: b
 
 Это сообщение получили только администраторы."""
         
-        result = await send_broadcast_to_ids(callback.bot, admin_ids, test_message)
+        result = await send_broadcast_to_ids(callback.bot, admin_ids, test_message, "admin_test")
         
         result_text = f"""✅ <b>ТЕСТ ЗАВЕРШЕН</b>
 
@@ -544,6 +539,7 @@ async def show_stats(callback: CallbackQuery, state: FSMContext, is_admin: bool
 • Завершили опрос: {stats['completed_surveys']}
 • Прошли тесты: {stats['completed_tests']}
 • Завершили диагностику: {stats['completed_diagnostic']}
+• Недоступны (заблокировали бота): {stats.get('unreachable_users', 0)}
 
 📈 <b>Конверсия:</b>
 • Регистрация: {stats['completed_registration']/max(stats['total_users'], 1)*100:.1f}%
@@ -700,7 +696,7 @@ async def handle_import_file(message: Message, state: FSMContext, is_admin: bool
 
 {analysis.get('warnings', '')}
 
-⚠️ <b>ВНИМАНИЕ!</b> Текущие данные будут заменены!"""
+⚠️ <b>ВНИМАНИЕ!</b> Записи пользователей из файла будут обновлены, новые - добавлены."""
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="✅ ПОДТВЕРДИТЬ ИМПОРТ", callback_data="confirm_import")],
@@ -766,8 +762,10 @@ async def execute_import(callback: CallbackQuery, state: FSMContext, is_admin: b
     if not await check_admin_auth(callback, state, is_admin):
         return
     
+    from admin_jobs import admin_jobs
+    
     await callback.answer()
-    await callback.message.edit_text("⏳ Выполняю импорт данных...")
+    await callback.message.edit_text("⏳ Ставлю импорт в очередь...")
     
     try:
         state_data = await state.get_data()
@@ -777,17 +775,27 @@ async def execute_import(callback: CallbackQuery, state: FSMContext, is_admin: b
             await callback.message.edit_text("❌ Файл не найден")
             return
         
-        # Создаем резервную копию
-        backup_path = await create_database_backup()
+        # Бэкап, импорт и удаление временного файла выполняются фоновой задачей
+        job_id = await admin_jobs.submit(
+            "import", {"file_path": file_path, "mode": "upsert"}, created_by=callback.from_user.id
+        )
         
-        # Выполняем импорт
-        import_result = await perform_database_import(file_path)
+        # Очищаем состояние
+        await state.clear()
+        await state.update_data(admin_authenticated=True)
         
-        # Удаляем временный файл
-        os.remove(file_path)
+        admin_jobs.watch(job_id, callback.message, lambda job: show_import_result(callback.message, job))
         
-        if import_result['success']:
-            result_text = f"""✅ <b>ИМПОРТ ЗАВЕРШЕН УСПЕШНО</b>
+    except Exception as e:
+        await callback.message.edit_text(f"❌ Критическая ошибка импорта: {e}")
+
+async def show_import_result(message: Message, job: dict):
+    """Итог фоновой задачи импорта"""
+    import_result = job['result'] or {'success': False, 'error': job['error']}
+    backup_path = import_result.get('backup_path')
+    
+    if import_result['success']:
+        result_text = f"""✅ <b>ИМПОРТ ЗАВЕРШЕН УСПЕШНО</b>
 
 <b>📊 Импортировано:</b>
 • Пользователей: {import_result['imported_users']}
@@ -796,20 +804,21 @@ async def execute_import(callback: CallbackQuery, state: FSMContext, is_admin: b
 
 <b>🔄 Обновлено записей:</b> {import_result['updated_records']}
 <b>🆕 Создано новых:</b> {import_result['created_records']}
+<b>➖ Без изменений:</b> {import_result['unchanged_records']}
 
 <b>💾 Резервная копия:</b> {backup_path}
 
-<b>⏱ Время импорта:</b> {import_result['import_time']:.2f} сек
+<b>⏱ Время импорта:</b> {import_result['import_time']:.2f} сек ({import_result['rows_per_second']:.0f} строк/с)
 
-База данных успешно восстановлена из Excel файла!"""
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="📊 Проверить статистику", callback_data="admin_stats")],
-                [InlineKeyboardButton(text="📤 Тестовая рассылка", callback_data="broadcast_test")],
-                [InlineKeyboardButton(text="⬅️ В админку", callback_data="admin_back")]
-            ])
-        else:
-            result_text = f"""❌ <b>ОШИБКА ИМПОРТА</b>
+Изменения из Excel файла применены к базе данных!"""
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📊 Проверить статистику", callback_data="admin_stats")],
+            [InlineKeyboardButton(text="📤 Тестовая рассылка", callback_data="broadcast_test")],
+            [InlineKeyboardButton(text="⬅️ В админку", callback_data="admin_back")]
+        ])
+    else:
+        result_text = f"""❌ <b>ОШИБКА ИМПОРТА</b>
 
 <b>Причина:</b> {import_result['error']}
 
@@ -820,21 +829,14 @@ async def execute_import(callback: CallbackQuery, state: FSMContext, is_admin: b
 • Проверьте формат файла
 • Убедитесь в корректности данных
 • Обратитесь к инструкции по импорту"""
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="📋 Инструкция", callback_data="import_help")],
-                [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="admin_import_menu")],
-                [InlineKeyboardButton(text="⬅️ В админку", callback_data="admin_back")]
-            ])
-        
-        await callback.message.edit_text(result_text, parse_mode="HTML", reply_markup=keyboard)
         
-        # Очищаем состояние
-        await state.clear()
-        await state.update_data(admin_authenticated=True)
-        
-    except Exception as e:
-        await callback.message.edit_text(f"❌ Критическая ошибка импорта: {e}")
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="📋 Инструкция", callback_data="import_help")],
+            [InlineKeyboardButton(text="🔄 Попробовать снова", callback_data="admin_import_menu")],
+            [InlineKeyboardButton(text="⬅️ В админку", callback_data="admin_back")]
+        ])
+    
+    await message.edit_text(result_text, parse_mode="HTML", reply_markup=keyboard)
 
 @admin_router.callback_query(F.data == "cancel_import")
 async def cancel_import(callback: CallbackQuery, state: FSMContext, is_admin: bool = False):
@@ -860,6 +862,7 @@ async def cancel_import(callback: CallbackQuery, state: FSMContext, is_admin: bo
 
 async def analyze_import_file(file_path: str) -> dict:
     """Анализ файла для импорта"""
+    from database import run_db_read
     def _analyze():
         try:
             # Читаем Excel файл
@@ -964,195 +967,16 @@ async def analyze_import_file(file_path: str) -> dict:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _analyze)
-
-async def create_database_backup() -> str:
-    """Создание резервной копии базы данных"""
-    def _backup():
-        import shutil
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = f"backup_before_import_{timestamp}.db"
-        
-        if os.path.exists("cardio_bot.db"):
-            shutil.copy2("cardio_bot.db", backup_path)
-            return backup_path
-        return None
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _backup)
+    return await run_db_read(_analyze)
 
 async def perform_database_import(file_path: str) -> dict:
-    """Выполнение импорта данных в базу"""
+    """Выполнение импорта данных в базу (upsert по telegram_id, одной транзакцией)"""
+    from database import run_db_write
     def _import():
-        import time
-        start_time = time.time()
-        
-        try:
-            from database import SessionLocal, User, Survey, TestResult
-            
-            # Читаем Excel файл
-            df = pd.read_excel(file_path, sheet_name="Все данные" if "Все данные" in pd.ExcelFile(file_path).sheet_names else 0)
-            
-            # Подготавливаем данные
-            df = df.where(pd.notnull(df), None)  # Заменяем NaN на None
-            
-            db = SessionLocal()
-            
-            try:
-                imported_users = 0
-                imported_surveys = 0
-                imported_tests = 0
-                updated_records = 0
-                created_records = 0
-                
-                # Очищаем существующие данные
-                db.query(TestResult).delete()
-                db.query(Survey).delete()
-                db.query(User).delete()
-                db.commit()
-                
-                # Импортируем пользователей
-                processed_users = set()
-                
-                for _, row in df.iterrows():
-                    telegram_id = row.get('telegram_id')
-                    
-                    if pd.isna(telegram_id) or telegram_id in processed_users:
-                        continue
-                    
-                    processed_users.add(telegram_id)
-                    
-                    # Создаем пользователя
-                    user = User(
-                        telegram_id=int(telegram_id),
-                        name=row.get('name') or f"User_{int(telegram_id)}",
-                        email=row.get('email') or f"user_{int(telegram_id)}@bot.com",
-                        phone=row.get('phone') or f"+{int(telegram_id)}",
-                        completed_diagnostic=bool(row.get('completed_diagnostic', False)),
-                        registration_completed=bool(row.get('registration_completed', True)),
-                        survey_completed=bool(row.get('survey_completed', False)),
-                        tests_completed=bool(row.get('tests_completed', False)),
-                        created_at=pd.to_datetime(row.get('registration_date', datetime.now())),
-                        updated_at=datetime.now(),
-                        last_activity=pd.to_datetime(row.get('last_activity', datetime.now()))
-                    )
-                    db.add(user)
-                    imported_users += 1
-                    created_records += 1
-                
-                db.commit()
-                
-                # Импортируем опросы
-                for _, row in df.iterrows():
-                    telegram_id = row.get('telegram_id')
-                    age = row.get('age')
-                    
-                    if pd.isna(telegram_id) or pd.isna(age):
-                        continue
-                    
-                    # Обработка JSON полей
-                    def safe_json_field(value):
-                        if pd.isna(value) or value == '':
-                            return None
-                        if isinstance(value, str) and (value.startswith('[') or value.startswith('{')):
-                            return value
-                        return json.dumps([value] if value else [], ensure_ascii=False)
-                    
-                    survey = Survey(
-                        telegram_id=int(telegram_id),
-                        age=int(age) if not pd.isna(age) else None,
-                        gender=row.get('gender'),
-                        location=row.get('location'),
-                        education=row.get('education'),
-                        family_status=row.get('family_status'),
-                        children=row.get('children'),
-                        income=row.get('income'),
-                        health_rating=int(row.get('health_rating')) if not pd.isna(row.get('health_rating')) else None,
-                        death_cause=row.get('death_cause'),
-                        heart_disease=row.get('heart_disease'),
-                        cv_risk=row.get('cv_risk'),
-                        cv_knowledge=row.get('cv_knowledge'),
-                        heart_danger=safe_json_field(row.get('heart_danger')),
-                        health_importance=row.get('health_importance'),
-                        checkup_history=row.get('checkup_history'),
-                        checkup_content=safe_json_field(row.get('checkup_content')),
-                        prevention_barriers=safe_json_field(row.get('prevention_barriers')),
-                        prevention_barriers_other=row.get('prevention_barriers_other'),
-                        health_advice=safe_json_field(row.get('health_advice')),
-                        created_at=datetime.now(),
-                        completed_at=pd.to_datetime(row.get('survey_completed_at', datetime.now()))
-                    )
-                    db.add(survey)
-                    imported_surveys += 1
-                    created_records += 1
-                
-                db.commit()
-                
-                # Импортируем результаты тестов
-                for _, row in df.iterrows():
-                    telegram_id = row.get('telegram_id')
-                    hads_score = row.get('hads_anxiety_score')
-                    
-                    if pd.isna(telegram_id) or pd.isna(hads_score):
-                        continue
-                    
-                    test_result = TestResult(
-                        telegram_id=int(telegram_id),
-                        hads_anxiety_score=int(hads_score) if not pd.isna(hads_score) else None,
-                        hads_depression_score=int(row.get('hads_depression_score')) if not pd.isna(row.get('hads_depression_score')) else None,
-                        hads_total_score=int(row.get('hads_total_score')) if not pd.isna(row.get('hads_total_score')) else None,
-                        hads_anxiety_level=row.get('hads_anxiety_level'),
-                        hads_depression_level=row.get('hads_depression_level'),
-                        burns_score=int(row.get('burns_score')) if not pd.isna(row.get('burns_score')) else None,
-                        burns_level=row.get('burns_level'),
-                        isi_score=int(row.get('isi_score')) if not pd.isna(row.get('isi_score')) else None,
-                        isi_level=row.get('isi_level'),
-                        stop_bang_score=int(row.get('stop_bang_score')) if not pd.isna(row.get('stop_bang_score')) else None,
-                        stop_bang_risk=row.get('stop_bang_risk'),
-                        ess_score=int(row.get('ess_score')) if not pd.isna(row.get('ess_score')) else None,
-                        ess_level=row.get('ess_level'),
-                        fagerstrom_score=int(row.get('fagerstrom_score')) if not pd.isna(row.get('fagerstrom_score')) else None,
-                        fagerstrom_level=row.get('fagerstrom_level'),
-                        fagerstrom_skipped=bool(row.get('fagerstrom_skipped', False)),
-                        audit_score=int(row.get('audit_score')) if not pd.isna(row.get('audit_score')) else None,
-                        audit_level=row.get('audit_level'),
-                        audit_skipped=bool(row.get('audit_skipped', False)),
-                        overall_cv_risk_score=int(row.get('overall_cv_risk_score')) if not pd.isna(row.get('overall_cv_risk_score')) else None,
-                        overall_cv_risk_level=row.get('overall_cv_risk_level'),
-                        risk_factors_count=int(row.get('risk_factors_count')) if not pd.isna(row.get('risk_factors_count')) else None,
-                        created_at=datetime.now(),
-                        completed_at=pd.to_datetime(row.get('tests_completed_at', datetime.now()))
-                    )
-                    db.add(test_result)
-                    imported_tests += 1
-                    created_records += 1
-                
-                db.commit()
-                
-                import_time = time.time() - start_time
-                
-                return {
-                    "success": True,
-                    "imported_users": imported_users,
-                    "imported_surveys": imported_surveys,
-                    "imported_tests": imported_tests,
-                    "updated_records": updated_records,
-                    "created_records": created_records,
-                    "import_time": import_time
-                }
-                
-            except Exception as e:
-                db.rollback()
-                raise e
-            finally:
-                db.close()
-                
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        from bulk_import import bulk_import_file
+        return bulk_import_file(file_path, mode="upsert")
     
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _import)
+    return await run_db_write(_import)
 
 # =========================== ИСТОРИЯ РАССЫЛОК ===========================
 
@@ -1165,20 +989,12 @@ async def broadcast_history(callback: CallbackQuery, state: FSMContext, is_admin
     await callback.answer()
     
     try:
-        # Получаем историю рассылок из БД
-        def _get_history():
-            from database import BroadcastLog, SessionLocal
-            db = SessionLocal()
-            try:
-                logs = db.query(BroadcastLog).order_by(BroadcastLog.created_at.desc()).limit(10).all()
-                return logs
-            finally:
-                db.close()
+        # Получаем историю заданий рассылок с прогрессом доставки
+        from database import get_broadcast_jobs_history, run_db_read
         
-        loop = asyncio.get_event_loop()
-        logs = await loop.run_in_executor(None, _get_history)
+        jobs = await run_db_read(get_broadcast_jobs_history, 10)
         
-        if not logs:
+        if not jobs:
             text = """📊 <b>ИСТОРИЯ РАССЫЛОК</b>
 
 📭 История рассылок пуста.
@@ -1191,14 +1007,19 @@ async def broadcast_history(callback: CallbackQuery, state: FSMContext, is_admin
 
 """
             
-            for i, log in enumerate(logs, 1):
-                status = "✅" if log.sent_count > 0 else "❌"
-                date_str = log.created_at.strftime('%d.%m %H:%M')
-                success_rate = (log.sent_count / log.total_users * 100) if log.total_users > 0 else 0
+            status_icons = {"pending": "🕓", "running": "⏳", "completed": "✅", "failed": "❌"}
+            
+            for i, job in enumerate(jobs, 1):
+                status = status_icons.get(job['status'], "•")
+                if job['status'] == "completed" and job['sent'] == 0:
+                    status = "❌"
+                date_str = job['created_at'].strftime('%d.%m %H:%M')
+                success_rate = (job['sent'] / job['total'] * 100) if job['total'] > 0 else 0
                 
-                text += f"""{status} <b>{i}. {log.broadcast_type}</b>
-📅 {date_str} | 👥 {log.sent_count}/{log.total_users} ({success_rate:.1f}%)
-📝 {log.message_text[:50]}{'...' if len(log.message_text) > 50 else ''}
+                text += f"""{status} <b>{i}. {job['broadcast_type']}</b> (#{job['id']})
+📅 {date_str} | 👥 {job['sent']}/{job['total']} ({success_rate:.1f}%)
+🚫 Заблокировали: {job['blocked']} | ❌ Ошибок: {job['failed']} | 🕓 В очереди: {job['pending']}
+📝 {job['message_text'][:50]}{'...' if len(job['message_text']) > 50 else ''}
 
 """
         
@@ -1231,6 +1052,7 @@ async def quick_stats(message: Message, state: FSMContext, is_admin: bool = Fals
 ✅ Завершили диагностику: {stats['completed_diagnostic']}
 📝 Прошли опрос: {stats['completed_surveys']}
 🧪 Прошли тесты: {stats['completed_tests']}
+🚫 Недоступны: {stats.get('unreachable_users', 0)}
 
 📈 Конверсия: {stats['completed_diagnostic']/max(stats['total_users'], 1)*100:.1f}%"""
         
@@ -1240,31 +1062,41 @@ async def quick_stats(message: Message, state: FSMContext, is_admin: bool = Fals
         await message.answer(f"❌ Ошибка: {e}")
 
 @admin_router.message(Command("export"))
-async def quick_export(message: Message, state: FSMContext, is_admin: bool = False):
-    """Быстрый экспорт"""
-    from database import admin_export_data
+async def quick_export(message: Message, state: FSMContext, is_admin: bool = False, command: CommandObject = None):
+    """Быстрый экспорт (/export - Excel, /export csv - сжатый CSV)"""
+    from admin_jobs import admin_jobs
     if not is_admin:
         await message.answer("❌ У вас нет прав администратора.")
         return
     
-    await message.answer("⏳ Создаю экспорт...")
+    export_format = "csv.gz" if command and (command.args or "").strip().lower() == "csv" else "xlsx"
+    
+    status_message = await message.answer("⏳ Создаю экспорт...")
     
     try:
-        filename = await admin_export_data()
+        job_id = await admin_jobs.submit("export", {"export_format": export_format}, created_by=message.from_user.id)
         
-        if os.path.exists(filename):
-            document = FSInputFile(filename)
-            await message.answer_document(
-                document, 
-                caption="📥 Экспорт базы данных готов"
-            )
-            os.remove(filename)
-        else:
-            await message.answer("❌ Ошибка создания файла")
+        async def _send(job):
+            await send_export_file(status_message, job, "📥 Экспорт базы данных готов")
+        
+        admin_jobs.watch(job_id, status_message, _send)
             
     except Exception as e:
         await message.answer(f"❌ Ошибка: {e}")
 
+async def send_export_file(status_message: Message, job: dict, caption: str) -> bool:
+    """Отправка результата фоновой задачи экспорта"""
+    filename = (job['result'] or {}).get('path')
+    
+    if job['error'] or not filename or not os.path.exists(filename):
+        await status_message.edit_text(f"❌ Ошибка создания файла: {job['error'] or 'файл не найден'}")
+        return False
+    
+    document = FSInputFile(filename)  # Файл остается в кэше выгрузок
+    await status_message.answer_document(document, caption=caption)
+    await status_message.delete()
+    return True
+
 @admin_router.message(Command("broadcast"))
 async def quick_broadcast_menu(message: Message, state: FSMContext, is_admin: bool = False):
     """Быстрый доступ к рассылкам"""
@@ -1340,8 +1172,11 @@ async def admin_help(message: Message, state: FSMContext, is_admin: bool = False
 <b>🎛 Основные команды:</b>
 /admin - Главная панель админки
 /stats - Быстрая статистика
-/export - Экспорт базы в Excel
+/export - Экспорт базы в Excel (/export csv - в сжатый CSV)
 /broadcast - Быстрые рассылки
+/backup - Резервная копия базы
+/maintenance - Обслуживание БД (VACUUM, дубликаты, целостность, пересчет риска)
+/jobs - Фоновые задачи и их статус
 /adminhelp - Эта справка
 
 <b>📤 СИСТЕМА РАССЫЛОК:</b>
@@ -1483,15 +1318,14 @@ async def db_broadcast_command(message: Message, state: FSMContext, is_admin: bo
     try:
         await message.answer(f"📤 Выполняю рассылку по фильтру '{filter_type}'...")
         
-        # Получаем ID пользователей
-        target_ids = await get_user_ids_by_filter(filter_type)
+        from database import count_recipients
         
-        if not target_ids:
+        if not await count_recipients(filter_type):
             await message.answer("❌ Пользователи по данному фильтру не найдены")
             return
         
         # Выполняем рассылку
-        result = await send_broadcast_to_ids(message.bot, target_ids, message_text)
+        result = await send_broadcast_to_ids(message.bot, None, message_text, audience=filter_type)
         
         result_text = f"""✅ <b>РАССЫЛКА ПО БД ЗАВЕРШЕНА</b>
 
@@ -1517,25 +1351,126 @@ async def manual_backup(message: Message, state: FSMContext, is_admin: bool = Fa
         await message.answer("❌ У вас нет прав администратора.")
         return
     
-    await message.answer("💾 Создаю резервную копию...")
+    from admin_jobs import admin_jobs
+    
+    status_message = await message.answer("💾 Создаю резервную копию...")
     
     try:
-        backup_path = await create_database_backup()
+        job_id = await admin_jobs.submit("backup", created_by=message.from_user.id)
         
-        if backup_path and os.path.exists(backup_path):
-            document = FSInputFile(backup_path)
-            await message.answer_document(
-                document,
-                caption=f"💾 Резервная копия базы данных\n🕐 {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"
-            )
-            # Удаляем временный файл бэкапа после отправки
-            os.remove(backup_path)
-        else:
-            await message.answer("❌ Не удалось создать резервную копию")
+        async def _send(job):
+            result = job['result'] or {}
+            backup_path = result.get('path')
+            
+            if backup_path and os.path.exists(backup_path):
+                caption = (
+                    f"💾 Резервная копия базы данных\n"
+                    f"🕐 {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n"
+                    f"📦 {result['size_mb']} МБ за {result['seconds']:.1f}с"
+                )
+                if result.get('compression_ratio'):
+                    caption += f" (сжатие x{result['compression_ratio']})"
+                document = FSInputFile(backup_path)
+                # Файл остается в папке бэкапов, старые копии удаляет ротация
+                await message.answer_document(document, caption=caption)
+                await status_message.delete()
+            else:
+                await status_message.edit_text(f"❌ Не удалось создать резервную копию: {job['error'] or 'файл не найден'}")
+        
+        admin_jobs.watch(job_id, status_message, _send)
             
     except Exception as e:
         await message.answer(f"❌ Ошибка создания бэкапа: {e}")
 
+# =========================== ФОНОВЫЕ ЗАДАЧИ ===========================
+
+MAINTENANCE_JOBS = {
+    "optimize": "optimize",
+    "merge": "merge_duplicates",
+    "repair": "repair",
+    "risk": "recalculate_risk",
+}
+
+@admin_router.message(Command("maintenance"))
+async def maintenance_command(message: Message, state: FSMContext, is_admin: bool = False, command: CommandObject = None):
+    """Обслуживание БД фоновой задачей (/maintenance optimize|merge|repair|risk)"""
+    from admin_jobs import admin_jobs
+    if not is_admin:
+        await message.answer("❌ У вас нет прав администратора.")
+        return
+    
+    operation = (command.args or "").strip().lower() if command else ""
+    job_type = MAINTENANCE_JOBS.get(operation)
+    if not job_type:
+        await message.answer(
+            "🛠 <b>Обслуживание БД</b>\n\n"
+            "/maintenance optimize - VACUUM, ANALYZE, REINDEX\n"
+            "/maintenance merge - объединение дубликатов по email\n"
+            "/maintenance repair - исправление целостности данных\n"
+            "/maintenance risk - пересчет общего риска по текущим правилам",
+            parse_mode="HTML"
+        )
+        return
+    
+    status_message = await message.answer("⏳ Ставлю задачу в очередь...")
+    
+    try:
+        job_id = await admin_jobs.submit(job_type, created_by=message.from_user.id)
+        admin_jobs.watch(job_id, status_message, lambda job: show_maintenance_result(status_message, job))
+    except Exception as e:
+        await status_message.edit_text(f"❌ Ошибка: {e}")
+
+async def show_maintenance_result(message: Message, job: dict):
+    """Итог задачи обслуживания БД"""
+    from admin_jobs import format_job_status
+    result = job['result'] or {}
+    
+    details = result.get('optimizations') or result.get('repairs') or []
+    if 'merged' in result:
+        details = [f"Объединено дубликатов: {result['merged']}"]
+    if 'processed' in result:
+        details = [f"Пересчитано результатов: {result['processed']}, изменилось: {result['updated']}"]
+    if result.get('db_size_after_mb') is not None:
+        details.append(f"Размер БД: {result['db_size_after_mb']} МБ")
+    
+    text = format_job_status(job)
+    if details:
+        text += "\n\n" + "\n".join(f"• {line}" for line in details)
+    
+    await message.edit_text(text, parse_mode="HTML")
+
+@admin_router.message(Command("jobs"))
+async def jobs_command(message: Message, state: FSMContext, is_admin: bool = False):
+    """Последние фоновые задачи админки"""
+    from admin_jobs import JOB_TITLES, STATUS_LABELS, admin_jobs
+    from database import run_db_read
+    if not is_admin:
+        await message.answer("❌ У вас нет прав администратора.")
+        return
+    
+    try:
+        jobs = await run_db_read(admin_jobs.get_history, 10)
+        
+        if not jobs:
+            await message.answer("📭 Фоновых задач еще не было")
+            return
+        
+        text = "⚙️ <b>ФОНОВЫЕ ЗАДАЧИ</b>\n\n"
+        for job in jobs:
+            date_str = job['created_at'].strftime('%d.%m %H:%M') if job['created_at'] else ''
+            text += f"#{job['id']} {JOB_TITLES.get(job['job_type'], job['job_type'])} - {STATUS_LABELS.get(job['status'], job['status'])}"
+            if job['status'] == 'running':
+                text += f" ({job['progress']}%)"
+            text += f"\n📅 {date_str}"
+            if job['error']:
+                text += f" | {job['error'][:80]}"
+            text += "\n\n"
+        
+        await message.answer(text, parse_mode="HTML")
+        
+    except Exception as e:
+        await message.answer(f"❌ Ошибка загрузки задач: {e}")
+
 # =========================== ОТЛАДОЧНЫЕ КОМАНДЫ ===========================
 
 @admin_router.message(Command("debug_db"))
@@ -1547,7 +1482,10 @@ async def debug_database(message: Message, state: FSMContext, is_admin: bool = F
     
     try:
         def _debug():
-            from database import SessionLocal, User, Survey, TestResult, ActivityLog
+            from database import (
+                DB_BACKEND, SessionLocal, User, Survey, TestResult, ActivityLog,
+                database_exists, get_backup_metrics, get_database_size_mb,
+            )
             db = SessionLocal()
             try:
                 users_count = db.query(User).count()
@@ -1571,13 +1509,16 @@ async def debug_database(message: Message, state: FSMContext, is_admin: bool = F
                     'actual_surveys': actual_surveys,
                     'users_with_tests': users_with_tests,
                     'actual_tests': actual_tests,
-                    'db_size': os.path.getsize("cardio_bot.db") / 1024 / 1024 if os.path.exists("cardio_bot.db") else 0
+                    'db_size': get_database_size_mb(),
+                    'db_backend': DB_BACKEND,
+                    'db_exists': database_exists(),
+                    'backups': get_backup_metrics(),
                 }
             finally:
                 db.close()
         
-        loop = asyncio.get_event_loop()
-        debug_info = await loop.run_in_executor(None, _debug)
+        from database import run_db_read
+        debug_info = await run_db_read(_debug)
         
         text = f"""🐛 <b>ОТЛАДКА БАЗЫ ДАННЫХ</b>
 
@@ -1598,7 +1539,13 @@ async def debug_database(message: Message, state: FSMContext, is_admin: bool = F
 
 <b>💾 Размер БД:</b> {debug_info['db_size']:.2f} МБ
 
-<b>📁 Файл БД:</b> {'✅' if os.path.exists("cardio_bot.db") else '❌'} cardio_bot.db"""
+<b>🗄 СУБД:</b> {'✅' if debug_info['db_exists'] else '❌'} {debug_info['db_backend']}"""
+        
+        backups = debug_info['backups']
+        text += f"\n\n<b>💾 Бэкапов с запуска:</b> {backups['count']} (ошибок: {backups['failed']})"
+        if backups['last']:
+            last = backups['last']
+            text += f"\nПоследний: {last['size_mb']} МБ за {last['seconds']:.1f}с, {last['created_at'][:19]}"
         
         await message.answer(text, parse_mode="HTML")
         
@@ -1608,7 +1555,7 @@ async def debug_database(message: Message, state: FSMContext, is_admin: bool = F
 @admin_router.callback_query(F.data == "admin_export")
 async def export_data(callback: CallbackQuery, state: FSMContext, is_admin: bool = False):
     """Экспорт данных"""
-    from database import admin_export_data
+    from admin_jobs import admin_jobs
 
     if not await check_admin_auth(callback, state, is_admin):
         return
@@ -1617,18 +1564,13 @@ async def export_data(callback: CallbackQuery, state: FSMContext, is_admin: bool
     await callback.message.edit_text("⏳ Подготавливаю экспорт...")
     
     try:
-        filename = await admin_export_data()
+        job_id = await admin_jobs.submit("export", {"export_format": "xlsx"}, created_by=callback.from_user.id)
         
-        if os.path.exists(filename):
-            document = FSInputFile(filename)
-            await callback.message.answer_document(
-                document, 
-                caption="📥 Полный экспорт базы данных готов"
-            )
-            os.remove(filename)
-            await show_admin_panel(callback.message)
-        else:
-            await callback.message.edit_text("❌ Ошибка создания файла")
+        async def _send(job):
+            if await send_export_file(callback.message, job, "📥 Полный экспорт базы данных готов"):
+                await show_admin_panel(callback.message)
+        
+        admin_jobs.watch(job_id, callback.message, _send)
     except Exception as e:
         await callback.message.edit_text(f"❌ Ошибка: {e}")
 
@@ -1662,7 +1604,7 @@ async def clean_data_menu(callback: CallbackQuery, state: FSMContext, is_admin:
 @admin_router.callback_query(F.data.startswith("clean_"))
 async def clean_old_data_action(callback: CallbackQuery, state: FSMContext, is_admin: bool = False):
     """Очистка старых данных"""
-    from database import clean_old_data
+    from admin_jobs import admin_jobs
     if not await check_admin_auth(callback, state, is_admin):
         return
     
@@ -1672,12 +1614,18 @@ async def clean_old_data_action(callback: CallbackQuery, state: FSMContext, is_a
     await callback.message.edit_text(f"⏳ Удаляю данные старше {days} дней...")
     
     try:
-        def _clean():
-            return clean_old_data(days)
-        
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, _clean)
-        
+        job_id = await admin_jobs.submit("clean", {"days": days}, created_by=callback.from_user.id)
+        admin_jobs.watch(job_id, callback.message, lambda job: show_clean_result(callback.message, job, days))
+    except Exception as e:
+        await callback.message.edit_text(f"❌ Ошибка очистки: {e}")
+
+async def show_clean_result(message: Message, job: dict, days: int):
+    """Итог фоновой задачи очистки"""
+    result = job['result'] or {}
+    
+    if job['error']:
+        text = f"❌ Ошибка очистки: {job['error']}"
+    else:
         text = f"""✅ <b>Очистка завершена</b>
 
 Удалено за {days} дней:
@@ -1686,12 +1634,9 @@ async def clean_old_data_action(callback: CallbackQuery, state: FSMContext, is_a
 • Системной статистики: {result.get('deleted_system_stats', 0)}
 
 💾 Основные данные сохранены."""
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")]
-        ])
-        
-        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
-        
-    except Exception as e:
-        await callback.message.edit_text(f"❌ Ошибка: {e}")
\ No newline at end of file
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")]
+    ])
+    
+    await message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
\ No newline at end of file
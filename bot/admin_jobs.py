@@ -0,0 +1,363 @@
+"""
+Фоновые задачи админки
+Тяжелые операции (импорт, экспорт, бэкап, VACUUM, обслуживание БД) выполняются
+в собственном ограниченном пуле потоков, а не в общем executor'е бота, поэтому
+не отнимают потоки у обработки пользовательских сообщений
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram.types import Message
+
+from database import (
+    backup_database,
+    clean_old_data,
+    create_admin_job,
+    create_backup,
+    database_exists,
+    fail_interrupted_admin_jobs,
+    get_admin_jobs_history,
+    get_cached_export,
+    merge_duplicate_users,
+    optimize_database,
+    recalculate_cv_risk,
+    repair_database_integrity,
+    run_db_write,
+    update_admin_job,
+)
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# НАСТРОЙКИ
+# ============================================================================
+
+# SQLite допускает одного писателя, поэтому по умолчанию задачи идут по одной
+ADMIN_JOB_WORKERS = int(os.getenv("ADMIN_JOB_WORKERS", "1"))
+# Сколько задач может одновременно стоять в очереди и выполняться
+ADMIN_JOB_MAX_ACTIVE = int(os.getenv("ADMIN_JOB_MAX_ACTIVE", "5"))
+# Как часто обновлять сообщение со статусом задачи
+ADMIN_JOB_POLL_SECONDS = float(os.getenv("ADMIN_JOB_POLL_SECONDS", "2"))
+
+# Статусы задач
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+JOB_TITLES = {
+    "export": "Экспорт данных",
+    "import": "Импорт данных",
+    "backup": "Резервная копия",
+    "clean": "Очистка старых данных",
+    "optimize": "Оптимизация БД (VACUUM)",
+    "merge_duplicates": "Объединение дубликатов",
+    "repair": "Исправление целостности",
+    "recalculate_risk": "Пересчет общего риска",
+}
+
+STATUS_LABELS = {
+    STATUS_QUEUED: "🕐 В очереди",
+    STATUS_RUNNING: "⏳ Выполняется",
+    STATUS_DONE: "✅ Готово",
+    STATUS_FAILED: "❌ Ошибка",
+}
+
+
+# ============================================================================
+# ЗАДАЧИ
+# ============================================================================
+
+# Каждая задача: (progress, **params) -> словарь результата.
+# progress(доля 0..1, сообщение) можно вызывать сколько угодно часто -
+# прогресс хранится в памяти и в БД не пишется.
+
+
+def _job_export(progress, export_format: str = "xlsx") -> Dict[str, Any]:
+    return {"success": True, "path": get_cached_export(export_format, progress=progress)}
+
+
+def _job_import(progress, file_path: str, mode: str = "upsert") -> Dict[str, Any]:
+    from bulk_import import bulk_import_file
+
+    backup_path = None
+    try:
+        if database_exists():
+            progress(0.0, "Резервная копия перед импортом")
+            backup_path = backup_database(prefix="backup_before_import")
+
+        result = bulk_import_file(file_path, mode=mode, progress=progress)
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    result["backup_path"] = backup_path
+    return result
+
+
+def _job_backup(progress) -> Dict[str, Any]:
+    return {"success": True, **create_backup(progress=progress)}
+
+
+def _job_clean(progress, days: int = 30) -> Dict[str, Any]:
+    return clean_old_data(days)
+
+
+def _job_optimize(progress) -> Dict[str, Any]:
+    return optimize_database(progress=progress)
+
+
+def _job_merge_duplicates(progress) -> Dict[str, Any]:
+    return {"success": True, "merged": merge_duplicate_users(progress=progress)}
+
+
+def _job_repair(progress) -> Dict[str, Any]:
+    # Исправление удаляет дубликаты, поэтому сначала резервная копия
+    backup_path = None
+    if database_exists():
+        progress(0.0, "Резервная копия перед исправлением")
+        backup_path = backup_database(prefix="backup_before_repair")
+
+    result = repair_database_integrity()
+    result["backup_path"] = backup_path
+    return result
+
+
+def _job_recalculate_risk(progress) -> Dict[str, Any]:
+    return recalculate_cv_risk(progress=progress)
+
+
+JOB_FUNCTIONS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "export": _job_export,
+    "import": _job_import,
+    "backup": _job_backup,
+    "clean": _job_clean,
+    "optimize": _job_optimize,
+    "merge_duplicates": _job_merge_duplicates,
+    "repair": _job_repair,
+    "recalculate_risk": _job_recalculate_risk,
+}
+
+
+# ============================================================================
+# ОТОБРАЖЕНИЕ
+# ============================================================================
+
+
+def format_progress_bar(percent: int, width: int = 10) -> str:
+    filled = max(0, min(width, round(percent * width / 100)))
+    return "▓" * filled + "░" * (width - filled)
+
+
+def format_job_status(job: Dict[str, Any]) -> str:
+    """Текст сообщения со статусом задачи"""
+    title = JOB_TITLES.get(job["job_type"], job["job_type"])
+    lines = [
+        f"<b>{title}</b> (задача #{job['id']})",
+        "",
+        STATUS_LABELS.get(job["status"], job["status"]),
+    ]
+    if job["status"] == STATUS_RUNNING:
+        lines.append(f"{format_progress_bar(job['progress'])} {job['progress']}%")
+    if job.get("progress_message"):
+        lines.append(f"<i>{job['progress_message']}</i>")
+    if job.get("error"):
+        lines.append(f"Причина: {job['error']}")
+    return "\n".join(lines)
+
+
+# ============================================================================
+# ИСПОЛНИТЕЛЬ
+# ============================================================================
+
+
+class AdminJobRunner:
+    """Очередь фоновых задач админки с собственным пулом потоков
+
+    Статусы задач (queued/running/done/failed) и результат пишутся в таблицу
+    admin_jobs. Прогресс обновляется только в памяти: задача может держать
+    блокировку записи SQLite, и отдельная запись прогресса ждала бы ее.
+    """
+
+    def __init__(self, workers: int = ADMIN_JOB_WORKERS, max_active: int = ADMIN_JOB_MAX_ACTIVE):
+        self.workers = workers
+        self.max_active = max_active
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # job_id -> состояние задачи (тот же вид, что и строка admin_jobs)
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._watchers: set = set()
+
+    async def start(self):
+        """Создать пул и пометить задачи, прерванные прошлым перезапуском"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="admin-job"
+            )
+
+        interrupted = await run_db_write(fail_interrupted_admin_jobs)
+        if interrupted:
+            logger.warning(f"⚠️ Фоновых задач прервано перезапуском: {interrupted}")
+        logger.info(f"✅ Фоновые задачи админки: пул на {self.workers} потоков")
+
+    async def stop(self):
+        """Остановить наблюдателей и пул (очередь задач отменяется)"""
+        for task in list(self._watchers):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def submit(
+        self, job_type: str, params: Dict[str, Any] = None, created_by: int = None
+    ) -> int:
+        """Поставить задачу в очередь и вернуть ее ID
+
+        Если такая же задача уже в очереди или выполняется, возвращается ее ID.
+        """
+        if job_type not in JOB_FUNCTIONS:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+        if self._executor is None:
+            raise RuntimeError("Исполнитель фоновых задач не запущен")
+
+        params = params or {}
+
+        # Завершенные задачи уже записаны в БД, в памяти они больше не нужны
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_STATUSES]
+        for job_id in finished:
+            self._jobs.pop(job_id)
+
+        for job_id, job in self._jobs.items():
+            if (
+                job["job_type"] == job_type
+                and job["params"] == params
+                and job["status"] not in FINISHED_STATUSES
+            ):
+                return job_id
+
+        if len(self._futures) >= self.max_active:
+            raise RuntimeError(
+                f"Слишком много фоновых задач ({len(self._futures)}), попробуйте позже"
+            )
+
+        job_id = await run_db_write(create_admin_job, job_type, params, created_by)
+
+        self._jobs[job_id] = {
+            "id": job_id,
+            "job_type": job_type,
+            "params": params,
+            "status": STATUS_QUEUED,
+            "progress": 0,
+            "progress_message": None,
+            "result": None,
+            "error": None,
+        }
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._run, job_id)
+        self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        return job_id
+
+    def _run(self, job_id: int) -> Dict[str, Any]:
+        """Выполнение задачи в потоке пула"""
+        job = self._jobs[job_id]
+        job["status"] = STATUS_RUNNING
+        update_admin_job(job_id, status=STATUS_RUNNING, started_at=datetime.now())
+
+        def progress(fraction: float, message: str = None):
+            job["progress"] = int(max(0.0, min(1.0, fraction)) * 100)
+            if message:
+                job["progress_message"] = message
+
+        started = datetime.now()
+        try:
+            result = JOB_FUNCTIONS[job["job_type"]](progress, **job["params"])
+            job["result"] = result
+            if isinstance(result, dict) and result.get("success") is False:
+                job["error"] = result.get("error") or "Неизвестная ошибка"
+        except Exception as e:
+            logger.error(f"❌ Фоновая задача #{job_id} ({job['job_type']}): {e}")
+            job["error"] = str(e)
+
+        job["status"] = STATUS_FAILED if job["error"] else STATUS_DONE
+        if job["status"] == STATUS_DONE:
+            job["progress"] = 100
+
+        elapsed = (datetime.now() - started).total_seconds()
+        update_admin_job(
+            job_id,
+            status=job["status"],
+            progress=job["progress"],
+            progress_message=job["progress_message"],
+            result=job["result"],
+            error=job["error"],
+            finished_at=datetime.now(),
+        )
+        logger.info(f"🏁 Фоновая задача #{job_id} ({job['job_type']}): {job['status']} за {elapsed:.1f}с")
+        return job["result"]
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Текущее состояние задачи этого процесса (с прогрессом)"""
+        return self._jobs.get(job_id)
+
+    def watch(
+        self,
+        job_id: int,
+        message: Message,
+        on_done: Callable[[Dict[str, Any]], Awaitable[None]],
+    ):
+        """Обновлять message статусом задачи, по завершении вызвать on_done(job)"""
+        task = asyncio.create_task(self._watch(job_id, message, on_done))
+        self._watchers.add(task)
+        task.add_done_callback(self._watchers.discard)
+
+    async def _watch(self, job_id: int, message: Message, on_done):
+        # Состояние обновляется на месте, поэтому достаточно взять его один раз
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        last_text = None
+        while True:
+            future = self._futures.get(job_id)
+            if job["status"] in FINISHED_STATUSES or future is None:
+                break
+
+            text = format_job_status(job)
+            if text != last_text:
+                try:
+                    await message.edit_text(text, parse_mode="HTML")
+                except Exception as e:
+                    logger.debug(f"Не удалось обновить статус задачи #{job_id}: {e}")
+                last_text = text
+
+            await asyncio.wait({future}, timeout=ADMIN_JOB_POLL_SECONDS)
+
+        try:
+            await on_done(job)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки результата задачи #{job_id}: {e}")
+
+    def get_history(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние задачи из БД с актуальным прогрессом выполняющихся"""
+        history = get_admin_jobs_history(limit)
+        for job in history:
+            live = self._jobs.get(job["id"])
+            if live is not None:
+                job.update(
+                    status=live["status"],
+                    progress=live["progress"],
+                    progress_message=live["progress_message"],
+                )
+        return history
+
+
+# Один исполнитель на процесс
+admin_jobs = AdminJobRunner()
@@ -10,7 +10,22 @@ from typing import Optional, Dict, Any
 import pytz
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from database import get_all_users, get_completed_users, get_uncompleted_users, log_broadcast
+from database import (
+    AUDIENCE_FILTERS,
+    count_recipients,
+    log_broadcast,
+    create_broadcast_job,
+    get_broadcast_job,
+    count_pending_deliveries,
+    iter_pending_delivery_ids,
+    mark_broadcast_job_running,
+    record_delivery_results,
+    finish_broadcast_job,
+    get_unfinished_broadcast_job_ids,
+    broadcast_job_exists,
+    run_db_read,
+)
+from broadcast_engine import get_broadcast_engine
 
 logger = logging.getLogger(__name__)
 
@@ -55,12 +70,9 @@ class BroadcastScheduler:
         """Получить текущее время в Москве"""
         return datetime.now(self.timezone)
     
-    async def check_and_send_broadcasts(self):
-        """Проверка времени и отправка рассылок"""
-        now = self.get_moscow_time()
-        
-        # Временные точки для рассылок
-        broadcast_schedule = {
+    def get_broadcast_schedule(self) -> Dict[str, datetime]:
+        """Временные точки для рассылок"""
+        return {
             # За неделю до вебинара
             'week_before': self.webinar_date - timedelta(days=7),
             # За 3 дня
@@ -76,13 +88,33 @@ class BroadcastScheduler:
             # Рассылка записи
             'recording_available': self.recording_date,
         }
+    
+    def get_scheduled_for(self, broadcast_type: str) -> Optional[datetime]:
+        """Запланированное время рассылки (naive UTC, как в БД) или None"""
+        broadcast_time = self.get_broadcast_schedule().get(broadcast_type)
+        if broadcast_time is None:
+            return None
+        return broadcast_time.astimezone(pytz.utc).replace(tzinfo=None)
+    
+    async def check_and_send_broadcasts(self):
+        """Проверка времени и отправка рассылок"""
+        now = self.get_moscow_time()
         
         # Проверяем каждое время рассылки
-        for broadcast_id, broadcast_time in broadcast_schedule.items():
+        for broadcast_id, broadcast_time in self.get_broadcast_schedule().items():
             # Проверяем, нужно ли отправить рассылку (в пределах 5 минут)
             time_diff = abs((now - broadcast_time).total_seconds())
             
             if time_diff < 300 and broadcast_id not in self.sent_broadcasts:  # 5 минут
+                # После перезапуска флаги в памяти пусты - проверяем задания в БД.
+                # Сверяем и тип, и время: после переноса даты вебинара задания
+                # прошлого вебинара не должны блокировать новые рассылки
+                scheduled_for = self.get_scheduled_for(broadcast_id)
+                if await run_db_read(broadcast_job_exists, broadcast_id, scheduled_for):
+                    logger.info(f"⏭ Рассылка {broadcast_id} на {broadcast_time} уже создавалась, пропускаю")
+                    self.sent_broadcasts.add(broadcast_id)
+                    continue
+                
                 logger.info(f"⏰ Время для рассылки: {broadcast_id}")
                 await self.send_broadcast_by_type(broadcast_id)
                 self.sent_broadcasts.add(broadcast_id)
@@ -139,7 +171,7 @@ class BroadcastScheduler:
 
 Подготовка уже началась! Не забудьте пройти диагностику и опрос, если ещё этого не сделали. Это важно ― так вы сможете извлечь максимум пользы из вебинара и получить бонусы 🎁"""
         
-        await self.broadcast_to_users(text, self.get_diagnostic_keyboard(), "week_before")
+        await self.broadcast_to_users(text, self.get_diagnostic_keyboard(), broadcast_type="week_before")
     
     async def send_three_days_reminder(self):
         """Рассылка за 3 дня до вебинара"""
@@ -153,7 +185,7 @@ class BroadcastScheduler:
 
 Ссылка на эфир будет здесь, в боте."""
         
-        await self.broadcast_to_users(text, self.get_diagnostic_keyboard(), "three_days")
+        await self.broadcast_to_users(text, self.get_diagnostic_keyboard(), broadcast_type="three_days")
     
     async def send_day_reminder(self):
         """Рассылка за день до вебинара"""
@@ -182,7 +214,7 @@ class BroadcastScheduler:
             [InlineKeyboardButton(text="✅ Диагностика пройдена", callback_data="already_completed")]
         ])
         
-        await self.broadcast_to_users(text, keyboard, "one_day")
+        await self.broadcast_to_users(text, keyboard, broadcast_type="one_day")
     
     async def send_three_hours_reminder(self):
         """Рассылка за 3 часа до вебинара"""
@@ -275,49 +307,29 @@ class BroadcastScheduler:
 
 🛎️ <b>Напоминание:</b> бот также будет доступен для вас, чтобы возвращаться к полезным инструментам — калькуляторам, памяткам и подсказкам."""
         
-        await self.broadcast_to_users(text, self.get_recording_keyboard(), "recording_available")
+        await self.broadcast_to_users(text, self.get_recording_keyboard(), broadcast_type="recording_available")
     
     async def broadcast_to_users(self, text: str, keyboard: Optional[InlineKeyboardMarkup] = None, 
                                 target_audience: str = "all", broadcast_type: str = ""):
         """Отправка сообщения пользователям"""
         try:
-            # Получаем список пользователей
-            if target_audience == "completed":
-                users = await get_completed_users()
-            elif target_audience == "uncompleted":
-                users = await get_uncompleted_users()
-            else:
-                users = await get_all_users()
-            
-            total_users = len(users)
-            sent_count = 0
-            error_count = 0
+            # Неизвестная аудитория - как раньше, все зарегистрированные
+            audience = target_audience if target_audience in AUDIENCE_FILTERS else "all"
             
-            logger.info(f"📤 Начинаю рассылку для {total_users} пользователей (тип: {broadcast_type})")
+            logger.info(f"📤 Начинаю рассылку (аудитория: {audience}, тип: {broadcast_type})")
             
-            for user in users:
-                try:
-                    if keyboard:
-                        await self.bot.send_message(
-                            user.telegram_id, 
-                            text, 
-                            parse_mode="HTML",
-                            reply_markup=keyboard
-                        )
-                    else:
-                        await self.bot.send_message(
-                            user.telegram_id, 
-                            text, 
-                            parse_mode="HTML"
-                        )
-                    sent_count += 1
-                    
-                    # Задержка между отправками для избежания лимитов
-                    await asyncio.sleep(0.05)  # 50ms между сообщениями
-                    
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"❌ Ошибка отправки пользователю {user.telegram_id}: {e}")
+            result = await start_broadcast_job(
+                self.bot,
+                broadcast_type,
+                text,
+                target_audience=audience,
+                parse_mode="HTML",
+                reply_markup=keyboard,
+                scheduled_for=self.get_scheduled_for(broadcast_type)
+            )
+            total_users = result['total']
+            sent_count = result['sent']
+            error_count = result['errors']
             
             # Логируем результат рассылки
             await log_broadcast(
@@ -334,37 +346,144 @@ class BroadcastScheduler:
         except Exception as e:
             logger.error(f"❌ Критическая ошибка при рассылке: {e}")
 
+# ============================================================================
+# ВОЗОБНОВЛЯЕМЫЕ ЗАДАНИЯ РАССЫЛОК
+# ============================================================================
+
+# Результаты доставки пишутся в БД при накоплении DELIVERY_FLUSH_SIZE штук
+# или не реже чем раз в DELIVERY_FLUSH_INTERVAL секунд
+DELIVERY_FLUSH_SIZE = 20
+DELIVERY_FLUSH_INTERVAL = 1.0
+
+async def run_broadcast_job(bot: Bot, job_id: int) -> Dict[str, Any]:
+    """Выполнение (или продолжение) задания рассылки по строкам доставки
+
+    Отправляются только получатели в статусе pending, поэтому повторный
+    запуск после перезапуска бота не дублирует уже доставленные сообщения.
+    Доставка "хотя бы один раз": при аварийной остановке процесса статусы
+    последних отправок (не больше DELIVERY_FLUSH_SIZE плюс отправки в работе,
+    и не старше DELIVERY_FLUSH_INTERVAL секунд) не успевают записаться,
+    и после перезапуска эти сообщения уйдут повторно.
+    """
+    job = await get_broadcast_job(job_id)
+    if not job:
+        logger.warning(f"⚠️ Задание рассылки #{job_id} не найдено")
+        return {"total": 0, "sent": 0, "errors": 0, "blocked": 0, "failed": 0, "error_details": []}
+    
+    keyboard = None
+    if job['reply_markup']:
+        keyboard = InlineKeyboardMarkup.model_validate_json(job['reply_markup'])
+    
+    pending = await count_pending_deliveries(job_id)
+    await mark_broadcast_job_running(job_id)
+    
+    logger.info(f"📤 Задание рассылки #{job_id} ({job['broadcast_type']}): "
+                f"осталось {pending} из {job['total_users']}")
+    
+    buffer = []
+    stopped = asyncio.Event()
+    
+    async def flush():
+        if buffer:
+            batch = buffer[:]
+            buffer.clear()
+            await record_delivery_results(job_id, batch)
+    
+    async def on_result(result: Dict[str, Any]):
+        buffer.append(result)
+        if len(buffer) >= DELIVERY_FLUSH_SIZE:
+            await flush()
+    
+    async def flush_periodically():
+        # Сбрасываем и медленный поток результатов (например, при паузе по RetryAfter).
+        # Останавливается по событию, а не cancel(): запись в очереди писателя не теряется
+        while not stopped.is_set():
+            try:
+                await asyncio.wait_for(stopped.wait(), DELIVERY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                await flush()
+    
+    flusher = asyncio.create_task(flush_periodically())
+    try:
+        # ID читаются из БД страницами по ходу отправки
+        result = await get_broadcast_engine(bot).run(
+            iter_pending_delivery_ids(job_id),
+            job['message_text'],
+            parse_mode=job['parse_mode'],
+            reply_markup=keyboard,
+            on_result=on_result
+        )
+    finally:
+        stopped.set()
+        await flusher
+        # Сохраняем хвост даже при остановке бота посреди рассылки
+        await flush()
+    
+    totals = await finish_broadcast_job(job_id)
+    totals['job_id'] = job_id
+    totals['error_details'] = result['error_details']
+    return totals
+
+async def start_broadcast_job(bot: Bot, broadcast_type: str, text: str, telegram_ids: Optional[list] = None,
+                              target_audience: str = None, parse_mode: Optional[str] = "HTML",
+                              reply_markup: Optional[InlineKeyboardMarkup] = None,
+                              filters: Optional[Dict[str, Any]] = None,
+                              scheduled_for: Optional[datetime] = None) -> Dict[str, Any]:
+    """Создание задания рассылки в БД и его выполнение
+    
+    Без telegram_ids получатели берутся из аудитории target_audience
+    (и filters) прямо в БД, без списка ID в памяти.
+    scheduled_for - время плановой рассылки (naive UTC) для защиты от повтора.
+    """
+    job_id = await create_broadcast_job(
+        broadcast_type=broadcast_type,
+        message_text=text,
+        telegram_ids=telegram_ids,
+        target_audience=target_audience,
+        parse_mode=parse_mode,
+        reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+        filters=filters,
+        scheduled_for=scheduled_for
+    )
+    return await run_broadcast_job(bot, job_id)
+
+async def resume_unfinished_broadcasts(bot: Bot):
+    """Продолжение рассылок, прерванных перезапуском бота"""
+    try:
+        job_ids = await get_unfinished_broadcast_job_ids()
+        if not job_ids:
+            return
+        
+        logger.info(f"🔁 Найдено незавершенных рассылок: {len(job_ids)}")
+        
+        for job_id in job_ids:
+            result = await run_broadcast_job(bot, job_id)
+            logger.info(f"✅ Рассылка #{job_id} возобновлена и завершена: "
+                        f"{result['sent']}/{result['total']}, ошибок: {result['errors']}")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Ошибка возобновления рассылок: {e}")
+
 # Дополнительные функции для административной рассылки
 
 async def send_custom_broadcast(bot: Bot, message_text: str, user_filter: str = "all"):
     """Отправка произвольной рассылки через админку"""
     try:
-        if user_filter == "completed":
-            users = await get_completed_users()
-        elif user_filter == "uncompleted":
-            users = await get_uncompleted_users()
-        else:
-            users = await get_all_users()
-        
-        total_users = len(users)
-        sent_count = 0
-        error_count = 0
+        audience = user_filter if user_filter in AUDIENCE_FILTERS else "all"
         
-        logger.info(f"📤 Отправка кастомной рассылки для {total_users} пользователей")
+        logger.info(f"📤 Отправка кастомной рассылки (аудитория: {audience})")
         
-        for user in users:
-            try:
-                await bot.send_message(
-                    user.telegram_id,
-                    message_text,
-                    parse_mode="HTML"
-                )
-                sent_count += 1
-                await asyncio.sleep(0.05)
-                
-            except Exception as e:
-                error_count += 1
-                logger.error(f"❌ Ошибка отправки пользователю {user.telegram_id}: {e}")
+        result = await start_broadcast_job(
+            bot,
+            "custom_admin",
+            message_text,
+            target_audience=audience,
+            parse_mode="HTML"
+        )
+        total_users = result['total']
+        sent_count = result['sent']
+        error_count = result['errors']
         
         # Логируем результат
         await log_broadcast(
@@ -388,14 +507,14 @@ async def test_broadcast_system():
     
     # Проверяем наличие пользователей
     try:
-        all_users = await get_all_users()
-        completed_users = await get_completed_users()
-        uncompleted_users = await get_uncompleted_users()
+        all_users = await count_recipients("all")
+        completed_users = await count_recipients("completed")
+        uncompleted_users = await count_recipients("uncompleted")
         
         logger.info(f"📊 Статистика пользователей:")
-        logger.info(f"   Всего: {len(all_users)}")
-        logger.info(f"   Завершили диагностику: {len(completed_users)}")
-        logger.info(f"   Не завершили: {len(uncompleted_users)}")
+        logger.info(f"   Всего: {all_users}")
+        logger.info(f"   Завершили диагностику: {completed_users}")
+        logger.info(f"   Не завершили: {uncompleted_users}")
         
         return True
         
@@ -0,0 +1,317 @@
+"""
+Движок массовых рассылок
+Параллельная отправка с учетом лимитов Telegram (глобальный и на чат),
+паузой по RetryAfter, повторами сетевых ошибок и классификацией блокировок
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union, AsyncIterable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# НАСТРОЙКИ
+# ============================================================================
+
+# Telegram допускает ~30 сообщений в секунду суммарно и ~1 сообщение в секунду в один чат
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_BURST = int(os.getenv("BROADCAST_BURST", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+PER_CHAT_INTERVAL = 1.0
+# При таком числе отметок по чатам истекшие удаляются (память не растет с аудиторией)
+CHAT_SLOTS_PRUNE_SIZE = 1000
+# Сколько примеров ошибок доставки хранится в итогах (остальные только считаются)
+ERROR_EXAMPLES = 20
+
+# Статусы доставки
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_BLOCKED = "blocked"
+
+# Ошибки, после которых чат считается недоступным навсегда
+UNREACHABLE_MARKERS = (
+    "chat not found",
+    "user is deactivated",
+    "bot was blocked",
+    "bot was kicked",
+    "peer_id_invalid",
+)
+
+
+# ============================================================================
+# ОГРАНИЧИТЕЛЬ СКОРОСТИ
+# ============================================================================
+
+
+class TokenBucket:
+    """Токен-бакет с возможностью глобальной паузы (для RetryAfter)"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов всем отправителям на заданное время"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        # Накопление токенов начинается после паузы, иначе сразу за ней
+        # ушел бы полный burst и снова получил RetryAfter
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        """Дождаться свободного токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                elapsed = now - self._updated
+                self._updated = now
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# ============================================================================
+# ДВИЖОК РАССЫЛОК
+# ============================================================================
+
+
+def classify_error(error: Exception) -> str:
+    """Определить, является ли ошибка постоянной блокировкой или просто сбоем"""
+    if isinstance(error, TelegramForbiddenError):
+        return STATUS_BLOCKED
+
+    message = str(error).lower()
+    if isinstance(error, TelegramBadRequest) and any(
+        marker in message for marker in UNREACHABLE_MARKERS
+    ):
+        return STATUS_BLOCKED
+
+    return STATUS_FAILED
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Сетевые и серверные ошибки, которые имеет смысл повторить"""
+    return isinstance(
+        error, (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError, OSError)
+    )
+
+
+class BroadcastEngine:
+    """Общий движок рассылок для планировщика и админки
+
+    Пул из concurrency отправителей берет получателей из ограниченной очереди,
+    каждый перед отправкой получает токен из общего бакета.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = BROADCAST_RATE,
+        burst: int = BROADCAST_BURST,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        # Общие для всех рассылок этого бота: две рассылки в один чат тоже разносятся
+        self._chat_next_allowed: Dict[int, float] = {}
+
+    def _prune_chat_slots(self):
+        """Удалить отметки чатов, интервал которых уже прошел"""
+        now = time.monotonic()
+        expired = [chat_id for chat_id, next_allowed in self._chat_next_allowed.items() if next_allowed <= now]
+        for chat_id in expired:
+            del self._chat_next_allowed[chat_id]
+
+    async def _wait_chat_slot(self, chat_id: int):
+        """Соблюдение лимита ~1 сообщение в секунду на один чат"""
+        if len(self._chat_next_allowed) >= CHAT_SLOTS_PRUNE_SIZE:
+            self._prune_chat_slots()
+        now = time.monotonic()
+        next_allowed = self._chat_next_allowed.get(chat_id, 0.0)
+        if next_allowed > now:
+            await asyncio.sleep(next_allowed - now)
+        self._chat_next_allowed[chat_id] = max(now, next_allowed) + PER_CHAT_INTERVAL
+
+    async def send_one(
+        self,
+        chat_id: int,
+        text: str,
+        parse_mode: Optional[str] = "HTML",
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ) -> Dict[str, Any]:
+        """Отправка одного сообщения с повторами
+
+        Возвращает словарь: chat_id, status, attempts, message_id, error
+        """
+        attempts = 0
+        last_error = None
+
+        while True:
+            attempts += 1
+            await self.bucket.acquire()
+            await self._wait_chat_slot(chat_id)
+
+            try:
+                message = await self.bot.send_message(
+                    chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup
+                )
+                return {
+                    "chat_id": chat_id,
+                    "status": STATUS_SENT,
+                    "attempts": attempts,
+                    "message_id": message.message_id,
+                    "error": None,
+                }
+
+            except TelegramRetryAfter as e:
+                # Flood control: останавливаем весь бакет, а не только этого отправителя
+                logger.warning(f"⏸ RetryAfter {e.retry_after}с, рассылка приостановлена")
+                self.bucket.pause(e.retry_after)
+                last_error = e
+                if attempts > self.max_retries + 2:
+                    break
+
+            except Exception as e:
+                last_error = e
+                if is_transient_error(e) and attempts <= self.max_retries:
+                    backoff = min(30.0, 0.5 * 2 ** (attempts - 1)) + random.uniform(0, 0.25)
+                    await asyncio.sleep(backoff)
+                    continue
+                break
+
+        status = classify_error(last_error) if last_error else STATUS_FAILED
+        return {
+            "chat_id": chat_id,
+            "status": status,
+            "attempts": attempts,
+            "message_id": None,
+            "error": str(last_error)[:200] if last_error else None,
+        }
+
+    async def run(
+        self,
+        chat_ids: Union[Iterable[int], AsyncIterable[int]],
+        text: str,
+        parse_mode: Optional[str] = "HTML",
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """Рассылка по списку (или асинхронному потоку) ID
+
+        Повторы в списке отбрасываются; асинхронный поток должен выдавать
+        ID без повторов (так работают выборки из БД).
+        on_result вызывается после каждой попытки доставки (для учета статусов).
+        В error_details попадают первые ERROR_EXAMPLES ошибок, их общее число - errors.
+        """
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 4)
+        stats = {"total": 0, "sent": 0, "failed": 0, "blocked": 0}
+        error_details: List[str] = []
+
+        async def producer():
+            if hasattr(chat_ids, "__aiter__"):
+                # Потоки из БД уже без повторов: не копим множество ID,
+                # чтобы память не росла вместе с аудиторией
+                async for chat_id in chat_ids:
+                    await queue.put(chat_id)
+            else:
+                seen = set()
+                for chat_id in chat_ids:
+                    if chat_id not in seen:
+                        seen.add(chat_id)
+                        await queue.put(chat_id)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def worker():
+            while True:
+                chat_id = await queue.get()
+                if chat_id is None:
+                    return
+
+                stats["total"] += 1
+                result = await self.send_one(chat_id, text, parse_mode, reply_markup)
+                stats[result["status"]] += 1
+
+                if result["status"] != STATUS_SENT and len(error_details) < ERROR_EXAMPLES:
+                    error_details.append(f"ID {chat_id}: {(result['error'] or '')[:50]}")
+
+                if on_result:
+                    try:
+                        await on_result(result)
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка обработки результата доставки {chat_id}: {e}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await producer()
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            # Не clear(): отметки других идущих рассылок должны сохраниться
+            self._prune_chat_slots()
+
+        elapsed = time.monotonic() - started
+        rate = stats["total"] / elapsed if elapsed > 0 else 0.0
+
+        logger.info(
+            f"📊 Рассылка: {stats['sent']}/{stats['total']} отправлено, "
+            f"заблокировано {stats['blocked']}, ошибок {stats['failed']}, "
+            f"{elapsed:.1f}с ({rate:.1f} сообщ/с)"
+        )
+
+        return {
+            "total": stats["total"],
+            "sent": stats["sent"],
+            "blocked": stats["blocked"],
+            "failed": stats["failed"],
+            "errors": stats["blocked"] + stats["failed"],
+            "error_details": error_details,
+            "elapsed": round(elapsed, 2),
+        }
+
+
+# Один движок на бота, чтобы все рассылки делили общий лимит скорости
+_engines: Dict[int, BroadcastEngine] = {}
+
+
+def get_broadcast_engine(bot: Bot) -> BroadcastEngine:
+    """Получить общий движок рассылок для бота"""
+    engine = _engines.get(id(bot))
+    if engine is None or engine.bot is not bot:
+        engine = BroadcastEngine(bot)
+        _engines[id(bot)] = engine
+    return engine
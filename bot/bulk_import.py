@@ -0,0 +1,536 @@
+"""
+Массовый импорт данных из Excel/CSV
+Векторная очистка колонок в pandas и пакетная запись Core-запросами
+(executemany порциями) в одной транзакции: полная замена или
+инкрементальный upsert по telegram_id
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import or_, select
+
+from database import Survey, TestResult, User, engine, live_stats, upsert_insert
+from surveys import (
+    CV_RISK_FIELDS,
+    CV_RISK_SURVEY_FIELDS,
+    CV_RISK_TEST_FIELDS,
+    TEST_LEVEL_COLUMNS,
+    TEST_NORMS,
+    calculate_cv_risk_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+# Размер порции для executemany и для IN-списков
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+# replace - полная замена таблиц (восстановление из выгрузки),
+# upsert - вставка новых и обновление изменившихся строк по telegram_id
+IMPORT_MODES = ("replace", "upsert")
+
+# Заголовки старых выгрузок -> актуальные названия колонок
+COLUMN_ALIASES = {
+    "hads_anxiety": "hads_anxiety_score",
+    "hads_depression": "hads_depression_score",
+}
+
+USER_TEXT_COLUMNS = ("name", "email", "phone")
+USER_FLAG_DEFAULTS = {
+    "completed_diagnostic": False,
+    "registration_completed": True,
+    "survey_completed": False,
+    "tests_completed": False,
+}
+
+SURVEY_TEXT_COLUMNS = (
+    "gender",
+    "location",
+    "education",
+    "family_status",
+    "children",
+    "income",
+    "death_cause",
+    "heart_disease",
+    "cv_risk",
+    "cv_knowledge",
+    "health_importance",
+    "checkup_history",
+    "prevention_barriers_other",
+)
+SURVEY_INT_COLUMNS = ("age", "health_rating")
+SURVEY_JSON_COLUMNS = ("heart_danger", "checkup_content", "prevention_barriers", "health_advice")
+# Опрос создается, если заполнено хотя бы одно из этих полей
+SURVEY_MARKER_COLUMNS = ("age", "gender", "health_rating")
+
+TEST_SCORE_COLUMNS = (
+    "hads_anxiety_score",
+    "hads_depression_score",
+    "hads_total_score",
+    "burns_score",
+    "isi_score",
+    "stop_bang_score",
+    "ess_score",
+    "fagerstrom_score",
+    "audit_score",
+    "overall_cv_risk_score",
+    "risk_factors_count",
+)
+TEST_TEXT_COLUMNS = (
+    "hads_anxiety_level",
+    "hads_depression_level",
+    "burns_level",
+    "isi_level",
+    "stop_bang_risk",
+    "ess_level",
+    "fagerstrom_level",
+    "audit_level",
+    "overall_cv_risk_level",
+)
+# Результаты тестов создаются, если есть хотя бы один балл
+TEST_MARKER_COLUMNS = (
+    "hads_anxiety_score",
+    "hads_depression_score",
+    "burns_score",
+    "isi_score",
+    "stop_bang_score",
+    "ess_score",
+    "fagerstrom_score",
+    "audit_score",
+)
+
+# Поля опроса и баллы, по которым считается общий риск (правила surveys.CV_RISK_RULES)
+RISK_INPUT_COLUMNS = CV_RISK_FIELDS
+RISK_DERIVED_COLUMNS = ("overall_cv_risk_score", "risk_factors_count", "overall_cv_risk_level")
+
+# Колонки файла с датами -> колонки таблиц
+DATE_COLUMNS = {
+    "users": {"registration_date": "created_at", "last_activity": "last_activity"},
+    "surveys": {"survey_completed_at": "completed_at"},
+    "tests": {"tests_completed_at": "completed_at"},
+}
+
+# Уровни, которые вычисляются по баллу, если в файле их нет (нормы из реестра
+# тестов): колонка уровня -> (колонка балла, границы, подписи)
+DERIVED_LEVELS = {
+    column: (
+        f"{scale}_score",
+        [upper for _, upper in TEST_NORMS[scale].values()][:-1],
+        list(TEST_NORMS[scale]),
+    )
+    for column, scale in TEST_LEVEL_COLUMNS.items()
+}
+
+
+# ============================================================================
+# ЧТЕНИЕ И ОЧИСТКА
+# ============================================================================
+
+
+def read_import_file(file_path: str) -> pd.DataFrame:
+    """Чтение файла импорта (лист «Все данные», если он есть; CSV и CSV.GZ)"""
+    # Телефоны вида +7900... иначе превратятся в числа без плюса
+    text_dtypes = {column: str for column in USER_TEXT_COLUMNS}
+
+    if file_path.endswith((".csv", ".csv.gz")):
+        return pd.read_csv(file_path, encoding="utf-8-sig", dtype=text_dtypes)
+
+    excel = pd.ExcelFile(file_path)
+    sheet = "Все данные" if "Все данные" in excel.sheet_names else 0
+    return excel.parse(sheet, dtype=text_dtypes)
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Строки без пробелов по краям, пустые значения -> NaN"""
+    result = series.astype("string").str.strip()
+    return result.mask(result == "")
+
+
+def _int(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce").round().astype("Int64")
+
+
+def _bool(series: pd.Series) -> pd.Series:
+    """Флаги из Excel/CSV: bool, 0/1 или строки true/да/yes"""
+    if series.dtype == bool:
+        return series
+    as_text = series.astype("string").str.strip().str.lower()
+    numeric = pd.to_numeric(series, errors="coerce")
+    return (numeric.fillna(0) != 0) | as_text.isin(["true", "да", "yes"]).fillna(False)
+
+
+def _datetime(series: pd.Series) -> pd.Series:
+    """Даты файла; пустые остаются NaT и заполняются при записи (см. _fill_dates)"""
+    return pd.to_datetime(series, errors="coerce")
+
+
+def _json_list(series: pd.Series) -> pd.Series:
+    """Списки опроса: готовый JSON оставляем, текст «a; b» из выгрузки -> JSON-список"""
+    text_values = _text(series)
+    is_json = text_values.str.startswith("[") | text_values.str.startswith("{")
+    wrapped = text_values.str.split("; ").map(
+        lambda items: json.dumps(items, ensure_ascii=False), na_action="ignore"
+    )
+    return text_values.where(is_json.fillna(False), wrapped)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Колонка файла или пустая колонка той же длины"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(np.nan, index=df.index, dtype="object")
+
+
+def _normalized_phone(phones: pd.Series) -> pd.Series:
+    digits = phones.astype("string").str.replace(r"\D", "", regex=True)
+    return digits.str[-10:].where(digits.str.len() >= 10)
+
+
+def _provided_columns(columns) -> Dict[str, Set[str]]:
+    """Колонки таблиц, значения которых пришли из файла (явно или вычислены из него)
+
+    При upsert обновляются только они: значения по умолчанию для отсутствующих
+    колонок нужны новым строкам, но не должны затирать существующие данные.
+    """
+    columns = set(columns)
+    provided = {
+        table: {target for source, target in dates.items() if source in columns}
+        for table, dates in DATE_COLUMNS.items()
+    }
+
+    provided["users"] |= columns & (set(USER_TEXT_COLUMNS) | set(USER_FLAG_DEFAULTS))
+    if "phone" in columns:
+        provided["users"].add("phone_normalized")
+
+    provided["surveys"] |= columns & set(
+        SURVEY_INT_COLUMNS + SURVEY_TEXT_COLUMNS + SURVEY_JSON_COLUMNS
+    )
+
+    tests = provided["tests"]
+    tests |= columns & set(TEST_SCORE_COLUMNS + TEST_TEXT_COLUMNS)
+    tests |= {level for level, (score, _, _) in DERIVED_LEVELS.items() if score in columns}
+    tests |= {
+        f"{test_type}_skipped"
+        for test_type in ("fagerstrom", "audit")
+        if {f"{test_type}_skipped", f"{test_type}_score"} & columns
+    }
+    if {"hads_anxiety_score", "hads_depression_score"} <= columns:
+        tests.add("hads_total_score")
+    if columns & set(RISK_INPUT_COLUMNS):
+        tests |= set(RISK_DERIVED_COLUMNS)
+
+    return provided
+
+
+def prepare_import_frames(df: pd.DataFrame) -> Dict[str, Any]:
+    """Векторная очистка: пользователи, опросы и результаты тестов
+
+    Кроме таблиц возвращает "provided" - колонки, которые пришли из файла,
+    и "imported_at" - время импорта для пустых дат новых строк.
+    """
+    now = datetime.now()
+    df = df.rename(
+        columns={old: new for old, new in COLUMN_ALIASES.items() if new not in df.columns}
+    ).reset_index(drop=True)
+
+    telegram_ids = pd.to_numeric(_column(df, "telegram_id"), errors="coerce")
+    df = df[telegram_ids.notna() & (telegram_ids > 0)].copy()
+    df["telegram_id"] = telegram_ids[df.index].astype("int64")
+    df = df.drop_duplicates(subset="telegram_id", keep="first")
+    ids = df["telegram_id"]
+
+    # Пользователи
+    users = pd.DataFrame({"telegram_id": ids})
+    for column in USER_TEXT_COLUMNS:
+        users[column] = _text(_column(df, column))
+
+    users["name"] = users["name"].fillna("User_" + ids.astype(str))
+    users["email"] = users["email"].fillna("user_" + ids.astype(str) + "@bot.com")
+    users["phone"] = users["phone"].fillna("+" + ids.astype(str))
+    users["phone_normalized"] = _normalized_phone(users["phone"])
+
+    for column, default in USER_FLAG_DEFAULTS.items():
+        if column in df.columns:
+            users[column] = _bool(df[column])
+        else:
+            users[column] = default
+
+    users["created_at"] = _datetime(_column(df, "registration_date"))
+    users["updated_at"] = now
+    users["last_activity"] = _datetime(_column(df, "last_activity"))
+    users["is_reachable"] = True
+
+    # Опросы
+    surveys = pd.DataFrame({"telegram_id": ids})
+    for column in SURVEY_INT_COLUMNS:
+        surveys[column] = _int(_column(df, column))
+    for column in SURVEY_TEXT_COLUMNS:
+        surveys[column] = _text(_column(df, column))
+    for column in SURVEY_JSON_COLUMNS:
+        surveys[column] = _json_list(_column(df, column))
+    surveys["created_at"] = now
+    surveys["completed_at"] = _datetime(_column(df, "survey_completed_at"))
+    surveys = surveys[surveys[list(SURVEY_MARKER_COLUMNS)].notna().any(axis=1)]
+
+    # Результаты тестов
+    tests = pd.DataFrame({"telegram_id": ids})
+    for column in TEST_SCORE_COLUMNS:
+        tests[column] = _int(_column(df, column))
+    for column in TEST_TEXT_COLUMNS:
+        tests[column] = _text(_column(df, column))
+
+    for column, (score_column, bins, labels) in DERIVED_LEVELS.items():
+        derived = pd.cut(
+            tests[score_column].astype("float"),
+            bins=[-np.inf] + bins + [np.inf],
+            labels=labels,
+        ).astype("string")
+        tests[column] = tests[column].fillna(derived)
+
+    for test_type in ("fagerstrom", "audit"):
+        skipped_column = f"{test_type}_skipped"
+        if skipped_column in df.columns:
+            tests[skipped_column] = _bool(df[skipped_column])
+        else:
+            tests[skipped_column] = tests[f"{test_type}_score"].isna()
+
+    tests["hads_total_score"] = tests["hads_total_score"].fillna(
+        tests["hads_anxiety_score"] + tests["hads_depression_score"]
+    )
+    _derive_overall_risk(tests, surveys)
+
+    tests["created_at"] = now
+    tests["completed_at"] = _datetime(_column(df, "tests_completed_at"))
+    tests = tests[tests[list(TEST_MARKER_COLUMNS)].notna().any(axis=1)]
+
+    return {
+        "users": users,
+        "surveys": surveys,
+        "tests": tests,
+        "provided": _provided_columns(df.columns),
+        "imported_at": now,
+    }
+
+
+def _derive_overall_risk(tests: pd.DataFrame, surveys: pd.DataFrame):
+    """Общий риск для строк, где его нет в файле (по баллам и опросу из файла)"""
+    inputs = tests[list(CV_RISK_TEST_FIELDS)].join(surveys[list(CV_RISK_SURVEY_FIELDS)])
+    risk = calculate_cv_risk_batch(inputs)
+
+    tests["overall_cv_risk_score"] = tests["overall_cv_risk_score"].fillna(risk["risk_score"])
+    tests["risk_factors_count"] = tests["risk_factors_count"].fillna(risk["factors_count"])
+    tests["overall_cv_risk_level"] = tests["overall_cv_risk_level"].fillna(
+        risk["risk_level"].astype("string")
+    )
+
+
+def _records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Строки DataFrame -> словари с обычными Python-типами (NaN/NA -> None)
+
+    Преобразование идет по колонкам целиком, а не по строкам.
+    """
+    columns = []
+    for name in frame.columns:
+        series = frame[name]
+        columns.append(series.astype(object).where(series.notna(), None).tolist())
+
+    names = list(frame.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+# ============================================================================
+# ЗАПИСЬ В БАЗУ
+# ============================================================================
+
+
+IMPORT_TABLES = (
+    ("users", User.__table__),
+    ("surveys", Survey.__table__),
+    ("tests", TestResult.__table__),
+)
+
+
+def _chunks(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _fill_dates(rows: List[Dict[str, Any]], columns: List[str], existing: Dict[int, Any], now: datetime):
+    """Пустые даты: значение из базы для существующих строк, время импорта для новых"""
+    for row in rows:
+        current = existing.get(row["telegram_id"])
+        for position, column in enumerate(columns):
+            if row[column] is None:
+                row[column] = current[position] if current is not None else now
+
+
+def _replace_tables(conn, frames: Dict[str, Any], chunk_size: int, on_chunk: Callable[[int], None]):
+    """Полная замена: очистка таблиц и вставка всех строк"""
+    for table in (TestResult.__table__, Survey.__table__, User.__table__):
+        conn.execute(table.delete())
+
+    diff = {}
+    for name, table in IMPORT_TABLES:
+        rows = frames[name]
+        _fill_dates(rows, list(DATE_COLUMNS[name].values()), {}, frames["imported_at"])
+        for chunk in _chunks(rows, chunk_size):
+            conn.execute(table.insert(), chunk)
+            on_chunk(len(chunk))
+        diff[name] = {"inserted": len(rows), "updated": 0, "unchanged": 0}
+    return diff
+
+
+def _upsert_table(
+    conn,
+    table,
+    rows: List[Dict[str, Any]],
+    provided: Set[str],
+    date_columns: List[str],
+    now: datetime,
+    chunk_size: int,
+    on_chunk: Callable[[int], None],
+):
+    """INSERT ... ON CONFLICT(telegram_id) DO UPDATE порциями
+
+    Обновляются только колонки из файла и только если хотя бы одна из них
+    изменилась, поэтому неизменные строки не переписываются.
+    """
+    stmt = upsert_insert(table)
+    compared = [column for column in table.c.keys() if column in provided]
+    if compared:
+        set_ = {column: stmt.excluded[column] for column in compared}
+        if "updated_at" in table.c:
+            set_["updated_at"] = stmt.excluded.updated_at
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.telegram_id],
+            set_=set_,
+            where=or_(*[table.c[column].is_distinct_from(stmt.excluded[column]) for column in compared]),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.telegram_id])
+
+    inserted = changed = 0
+    for chunk in _chunks(rows, chunk_size):
+        ids = [row["telegram_id"] for row in chunk]
+        existing = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                select(table.c.telegram_id, *[table.c[column] for column in date_columns])
+                .where(table.c.telegram_id.in_(ids))
+            )
+        }
+        _fill_dates(chunk, date_columns, existing, now)
+
+        new_rows = len(chunk) - len(existing)
+        # rowcount executemany = вставленные + реально обновленные строки
+        affected = conn.execute(stmt, chunk).rowcount
+        inserted += new_rows
+        changed += affected - new_rows
+        on_chunk(len(chunk))
+
+    return {"inserted": inserted, "updated": changed, "unchanged": len(rows) - inserted - changed}
+
+
+def bulk_import_dataframe(
+    df: pd.DataFrame,
+    mode: str = "upsert",
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    progress: Optional[Callable[[float, str], None]] = None,
+) -> Dict[str, Any]:
+    """Массовый импорт подготовленного DataFrame одной транзакцией
+
+    mode="replace" - полная замена пользователей, опросов и тестов
+    (восстановление из выгрузки). mode="upsert" - только новые и изменившиеся
+    строки по telegram_id, остальные данные не трогаются.
+
+    Бот видит либо прежнее состояние, либо результат импорта целиком.
+    progress(доля 0..1, сообщение) вызывается после каждой порции.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Неизвестный режим импорта: {mode}")
+
+    started = time.time()
+    frames = prepare_import_frames(df)
+    prepared = time.time()
+
+    records = {name: _records(frames[name]) for name, _ in IMPORT_TABLES}
+    records["imported_at"] = frames["imported_at"]
+
+    total = sum(len(records[name]) for name, _ in IMPORT_TABLES)
+    written = 0
+
+    def on_chunk(rows: int):
+        nonlocal written
+        written += rows
+        if progress:
+            progress(0.1 + 0.9 * written / max(total, 1), f"Записано строк: {written} из {total}")
+
+    if progress:
+        progress(0.1, f"Данные подготовлены: {total} записей")
+
+    with engine.begin() as conn:
+        if mode == "replace":
+            diff = _replace_tables(conn, records, chunk_size, on_chunk)
+        else:
+            diff = {
+                name: _upsert_table(
+                    conn,
+                    table,
+                    records[name],
+                    frames["provided"][name],
+                    list(DATE_COLUMNS[name].values()),
+                    frames["imported_at"],
+                    chunk_size,
+                    on_chunk,
+                )
+                for name, table in IMPORT_TABLES
+            }
+
+    import_time = time.time() - started
+    rows_per_second = len(df) / import_time if import_time > 0 else 0.0
+
+    if live_stats.initialized:
+        live_stats.reconcile()
+
+    summary = ", ".join(
+        f"{name}: +{counts['inserted']} ~{counts['updated']} ={counts['unchanged']}"
+        for name, counts in diff.items()
+    )
+    logger.info(
+        f"📥 Массовый импорт ({mode}) из {len(df)} строк за {import_time:.2f}с "
+        f"(очистка {prepared - started:.2f}с, {rows_per_second:.0f} строк/с): {summary}"
+    )
+
+    return {
+        "success": True,
+        "mode": mode,
+        "rows_total": len(df),
+        "imported_users": len(records["users"]),
+        "imported_surveys": len(records["surveys"]),
+        "imported_tests": len(records["tests"]),
+        "diff": diff,
+        "created_records": sum(counts["inserted"] for counts in diff.values()),
+        "updated_records": sum(counts["updated"] for counts in diff.values()),
+        "unchanged_records": sum(counts["unchanged"] for counts in diff.values()),
+        "import_time": import_time,
+        "rows_per_second": rows_per_second,
+    }
+
+
+def bulk_import_file(
+    file_path: str, mode: str = "upsert", progress: Optional[Callable[[float, str], None]] = None
+) -> Dict[str, Any]:
+    """Чтение файла и массовый импорт (синхронно, для executor или CLI)"""
+    try:
+        if progress:
+            progress(0.0, "Чтение файла")
+        return bulk_import_dataframe(read_import_file(file_path), mode=mode, progress=progress)
+    except Exception as e:
+        logger.error(f"❌ Ошибка массового импорта {file_path}: {e}")
+        return {"success": False, "error": str(e)}
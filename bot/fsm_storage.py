@@ -0,0 +1,260 @@
+"""
+Постоянное хранилище состояний FSM в базе данных бота
+Заменяет MemoryStorage: незавершенные опросы, тесты и SCORE2 переживают перезапуск
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database import FSMRecord, get_db_sync, run_db_read, run_db_write, upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Сколько хранить брошенные сессии
+FSM_TTL_HOURS = int(os.getenv("FSM_TTL_HOURS", "168"))
+# Как часто сбрасывать изменения в БД
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+# Как часто чистить просроченные сессии
+FSM_CLEANUP_INTERVAL = 3600
+
+
+def _build_key(key: StorageKey) -> str:
+    """Строковый ключ записи"""
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id,
+            key.business_connection_id,
+            key.destiny,
+        )
+    )
+
+
+def _dump_data(data: Dict[str, Any]) -> Optional[str]:
+    """Компактная сериализация данных (без пробелов, кириллица как есть)
+
+    Без default=str: значение, которое JSON не представляет (datetime, set,
+    Decimal...), вызывает TypeError при записи, а не возвращается после
+    перезапуска строкой.
+    """
+    if not data:
+        return None
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM: кэш в памяти + отложенная пакетная запись в БД
+
+    Все чтения обслуживаются из памяти (после загрузки при старте), изменения
+    помечаются грязными и раз в FSM_FLUSH_INTERVAL секунд записываются одной
+    транзакцией. При закрытии хранилища все изменения сбрасываются.
+    """
+
+    def __init__(self, ttl_hours: int = FSM_TTL_HOURS, flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.flush_interval = flush_interval
+
+        # key -> [state, data, время последнего изменения, data в JSON]
+        self._cache: Dict[str, list] = {}
+        self._dirty: set = set()
+        self._loaded = False
+
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self._last_cleanup = datetime.now()
+
+    # ------------------------------------------------------------------------
+    # Загрузка и запись
+    # ------------------------------------------------------------------------
+
+    def _load_sync(self) -> Dict[str, list]:
+        db = get_db_sync()
+        try:
+            now = datetime.now()
+            records = (
+                db.query(FSMRecord.key, FSMRecord.state, FSMRecord.data, FSMRecord.updated_at)
+                .filter(FSMRecord.expires_at > now)
+                .all()
+            )
+            return {
+                key: [state, json.loads(data) if data else {}, updated_at, data]
+                for key, state, data, updated_at in records
+            }
+        finally:
+            db.close()
+
+    def _write_sync(self, upserts: Dict[str, Tuple[Optional[str], Optional[str]]], cleanup: bool):
+        db = get_db_sync()
+        try:
+            now = datetime.now()
+            expires_at = now + self.ttl
+            table = FSMRecord.__table__
+
+            deleted = [key for key, (state, data) in upserts.items() if state is None and data is None]
+            rows = [
+                {"key": key, "state": state, "data": data, "updated_at": now, "expires_at": expires_at}
+                for key, (state, data) in upserts.items()
+                if not (state is None and data is None)
+            ]
+
+            if deleted:
+                db.execute(table.delete().where(table.c.key.in_(deleted)))
+
+            if rows:
+                stmt = upsert_insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.key],
+                    set_={
+                        "state": stmt.excluded.state,
+                        "data": stmt.excluded.data,
+                        "updated_at": stmt.excluded.updated_at,
+                        "expires_at": stmt.excluded.expires_at,
+                    },
+                )
+                db.execute(stmt, rows)
+
+            expired = 0
+            if cleanup:
+                expired = db.execute(table.delete().where(table.c.expires_at <= now)).rowcount
+
+            db.commit()
+            return expired
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def load(self):
+        """Загрузить все непросроченные сессии в память (один запрос при старте)"""
+        cache = await run_db_read(self._load_sync)
+        # Изменения, сделанные до окончания загрузки, важнее сохраненных
+        cache.update(self._cache)
+        self._cache = cache
+        self._loaded = True
+        logger.info(f"✅ FSM: восстановлено сессий из БД: {len(cache)}")
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def flush(self):
+        """Записать накопленные изменения в БД"""
+        async with self._lock:
+            cleanup = datetime.now() - self._last_cleanup > timedelta(seconds=FSM_CLEANUP_INTERVAL)
+            if not self._dirty and not cleanup:
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            upserts = {}
+            for key in dirty:
+                entry = self._cache.get(key)
+                if entry is None:
+                    upserts[key] = (None, None)
+                else:
+                    upserts[key] = (entry[0], entry[3])
+
+            try:
+                expired = await run_db_write(self._write_sync, upserts, cleanup)
+            except Exception as e:
+                # Вернем ключи в очередь, чтобы не потерять изменения
+                self._dirty |= dirty
+                logger.error(f"❌ FSM: ошибка записи {len(upserts)} сессий: {e}")
+                return
+
+            if cleanup:
+                self._last_cleanup = datetime.now()
+                self._evict_expired()
+                if expired:
+                    logger.info(f"🧹 FSM: удалено просроченных сессий: {expired}")
+
+    def _evict_expired(self):
+        """Убрать из памяти брошенные сессии старше TTL"""
+        threshold = datetime.now() - self.ttl
+        expired = [
+            key for key, entry in self._cache.items()
+            if entry[2] <= threshold and key not in self._dirty
+        ]
+        for key in expired:
+            self._cache.pop(key, None)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ FSM: ошибка фонового сброса: {e}")
+
+    def _get_entry(self, key: str) -> list:
+        entry = self._cache.get(key)
+        if entry is None:
+            entry = [None, {}, None, None]
+            self._cache[key] = entry
+        entry[2] = datetime.now()
+        return entry
+
+    def _mark_dirty(self, key: str):
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] is None and not entry[1]:
+            # Пустая сессия - удаляем из памяти и из БД
+            self._cache.pop(key, None)
+        self._dirty.add(key)
+
+    # ------------------------------------------------------------------------
+    # Интерфейс BaseStorage
+    # ------------------------------------------------------------------------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        str_key = _build_key(key)
+        entry = self._get_entry(str_key)
+        entry[0] = state.state if isinstance(state, State) else state
+        self._mark_dirty(str_key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._cache.get(_build_key(key))
+        return entry[0] if entry else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        # Сериализуем сразу: неподдерживаемый тип - ошибка в вызвавшем хендлере,
+        # а не потеря сессии при фоновом сбросе
+        dumped = _dump_data(data)
+        str_key = _build_key(key)
+        entry = self._get_entry(str_key)
+        entry[1] = data.copy()
+        entry[3] = dumped
+        self._mark_dirty(str_key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._cache.get(_build_key(key))
+        return entry[1].copy() if entry else {}
+
+    async def close(self) -> None:
+        """Остановить фоновый сброс и записать все изменения"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+        await self.flush()
+        logger.info(f"💾 FSM: сессии сохранены ({len(self._cache)} в памяти)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Размер кэша и очередь несохраненных изменений"""
+        return {
+            "cached_sessions": len(self._cache),
+            "dirty_sessions": len(self._dirty),
+            "loaded": self._loaded,
+        }
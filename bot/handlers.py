@@ -301,7 +301,7 @@ async def help_command(message: Message, state: FSMContext):
     await log_user_interaction(message.from_user.id, "help_requested")
     
     # Проверяем статус пользователя
-    user_completed = check_user_completed(message.from_user.id)
+    user_completed = await run_db_read(check_user_completed, message.from_user.id)
     current_state = await state.get_state()
     
     if user_completed:
@@ -375,7 +375,7 @@ async def status_command(message: Message, state: FSMContext):
     
     try:
         # Получаем данные пользователя
-        data = get_user_data(message.from_user.id)
+        data = await run_db_read(get_user_data, message.from_user.id)
         user = data.get('user')
         survey = data.get('survey') 
         tests = data.get('tests')
@@ -459,7 +459,7 @@ async def start_command_protected(message: Message, state: FSMContext):
     current_state = await state.get_state()
     
     # Проверяем, завершил ли пользователь диагностику
-    user_completed = check_user_completed(message.from_user.id)
+    user_completed = await run_db_read(check_user_completed, message.from_user.id)
     
     if user_completed:
         # Пользователь уже завершил диагностику
@@ -509,7 +509,7 @@ async def show_completed_user_info(message: Message, state: FSMContext):
     """Показать информацию для завершившего диагностику пользователя"""
     
     try:
-        data = get_user_data(message.from_user.id)
+        data = await run_db_read(get_user_data, message.from_user.id)
         user = data.get('user')
         tests = data.get('tests')
         
@@ -643,7 +643,7 @@ async def show_status_callback(callback: CallbackQuery, state: FSMContext):
     await log_user_interaction(callback.from_user.id, "show_status_callback")
     
     try:
-        data = get_user_data(callback.from_user.id)
+        data = await run_db_read(get_user_data, callback.from_user.id)
         user = data.get('user')
         
         if not user:
@@ -1669,12 +1669,8 @@ async def show_test_menu(message: Message, state: FSMContext):
 # Функции для работы с тестами
 async def start_hads_test(message: Message, state: FSMContext):
     """Запуск теста HADS"""
-    from surveys import get_hads_questions
-    
-    questions = get_hads_questions()
     await state.update_data(
         current_test="hads",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1693,12 +1689,8 @@ async def start_hads_test(message: Message, state: FSMContext):
 
 async def start_burns_test(message: Message, state: FSMContext):
     """Запуск теста Бернса"""
-    from surveys import get_burns_questions
-    
-    questions = get_burns_questions()
     await state.update_data(
         current_test="burns",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1717,12 +1709,8 @@ async def start_burns_test(message: Message, state: FSMContext):
 
 async def start_isi_test(message: Message, state: FSMContext):
     """Запуск теста ISI"""
-    from surveys import get_isi_questions
-    
-    questions = get_isi_questions()
     await state.update_data(
         current_test="isi",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1739,12 +1727,8 @@ async def start_isi_test(message: Message, state: FSMContext):
 
 async def start_stop_bang_test(message: Message, state: FSMContext):
     """Запуск теста STOP-BANG"""
-    from surveys import get_stop_bang_questions
-    
-    questions = get_stop_bang_questions()
     await state.update_data(
         current_test="stop_bang",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1761,12 +1745,8 @@ async def start_stop_bang_test(message: Message, state: FSMContext):
 
 async def start_ess_test(message: Message, state: FSMContext):
     """Запуск теста ESS"""
-    from surveys import get_ess_questions
-    
-    questions = get_ess_questions()
     await state.update_data(
         current_test="ess",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1783,12 +1763,8 @@ async def start_ess_test(message: Message, state: FSMContext):
 
 async def start_fagerstrom_test(message: Message, state: FSMContext):
     """Запуск теста Фагерстрема"""
-    from surveys import get_fagerstrom_questions
-    
-    questions = get_fagerstrom_questions()
     await state.update_data(
         current_test="fagerstrom",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1805,12 +1781,8 @@ async def start_fagerstrom_test(message: Message, state: FSMContext):
 
 async def start_audit_test(message: Message, state: FSMContext):
     """Запуск теста AUDIT"""
-    from surveys import get_audit_questions
-    
-    questions = get_audit_questions()
     await state.update_data(
         current_test="audit",
-        test_questions=questions,
         current_question_index=0,
         test_answers=[]
     )
@@ -1828,9 +1800,9 @@ async def start_audit_test(message: Message, state: FSMContext):
 async def show_current_question(message: Message, state: FSMContext):
     """Показать текущий вопрос теста"""
     data = await state.get_data()
-    questions = data['test_questions']
     current_index = data['current_question_index']
     current_test = data['current_test']
+    questions = get_test_questions(current_test)
     
     if current_index >= len(questions):
         await complete_current_test(message, state)
@@ -1862,67 +1834,15 @@ async def handle_test_answer(callback: CallbackQuery, state: FSMContext):
         
         if current_fsm_state:
             # Пытаемся определить тест по состоянию FSM
-            if "hads_test" in current_fsm_state:
-                await state.update_data(current_test="hads")
-                # Восстанавливаем базовую структуру
-                from surveys import get_hads_questions
-                questions = get_hads_questions()
-                await state.update_data(
-                    test_questions=questions,
-                    current_question_index=0,
-                    test_answers=[]
-                )
-            elif "burns_test" in current_fsm_state:
-                await state.update_data(current_test="burns")
-                from surveys import get_burns_questions
-                questions = get_burns_questions()
-                await state.update_data(
-                    test_questions=questions,
-                    current_question_index=0,
-                    test_answers=[]
-                )
-            elif "isi_test" in current_fsm_state:
-                await state.update_data(current_test="isi")
-                from surveys import get_isi_questions
-                questions = get_isi_questions()
-                await state.update_data(
-                    test_questions=questions,
-                    current_question_index=0,
-                    test_answers=[]
-                )
-            elif "stop_bang_test" in current_fsm_state:
-                await state.update_data(current_test="stop_bang")
-                from surveys import get_stop_bang_questions
-                questions = get_stop_bang_questions()
-                await state.update_data(
-                    test_questions=questions,
-                    current_question_index=0,
-                    test_answers=[]
-                )
-            elif "ess_test" in current_fsm_state:
-                await state.update_data(current_test="ess")
-                from surveys import get_ess_questions
-                questions = get_ess_questions()
-                await state.update_data(
-                    test_questions=questions,
-                    current_question_index=0,
-                    test_answers=[]
-                )
-            elif "fagerstrom_test" in current_fsm_state:
-                await state.update_data(current_test="fagerstrom")
-                from surveys import get_fagerstrom_questions
-                questions = get_fagerstrom_questions()
-                await state.update_data(
-                    test_questions=questions,
-                    current_question_index=0,
-                    test_answers=[]
-                )
-            elif "audit_test" in current_fsm_state:
-                await state.update_data(current_test="audit")
-                from surveys import get_audit_questions
-                questions = get_audit_questions()
+            recovered_test = next(
+                (test_type for test_type in TEST_QUESTIONS if f"{test_type}_test" in current_fsm_state),
+                None
+            )
+            
+            if recovered_test:
+                # Восстанавливаем базовую структуру (вопросы берутся из реестра)
                 await state.update_data(
-                    test_questions=questions,
+                    current_test=recovered_test,
                     current_question_index=0,
                     test_answers=[]
                 )
@@ -1990,67 +1910,13 @@ async def complete_current_test(message: Message, state: FSMContext):
     # Подсчитываем результат
     total_score = sum(answers)
     
-    # Сохраняем результат в зависимости от теста
+    # Баллы подшкал и текст результата - из общего реестра тестов
+    scores = score_test(current_test, answers)
+    result_text = get_test_interpretation(current_test, scores)
     if current_test == "hads":
-        # Для HADS нужно разделить на тревогу и депрессию
-        from surveys import calculate_hads_scores, get_hads_interpretation
-        anxiety_score, depression_score = calculate_hads_scores(answers)
-        
-        await state.update_data(
-            hads_anxiety_score=anxiety_score,
-            hads_depression_score=depression_score,
-            hads_score=total_score,
-            completed_hads=True  # Отмечаем как завершенный
-        )
-        result_text = get_hads_interpretation(anxiety_score, depression_score)
-        
-    elif current_test == "burns":
-        from surveys import get_burns_interpretation
-        await state.update_data(
-            burns_score=total_score,
-            completed_burns=True
-        )
-        result_text = get_burns_interpretation(total_score)
-        
-    elif current_test == "isi":
-        from surveys import get_isi_interpretation
-        await state.update_data(
-            isi_score=total_score,
-            completed_isi=True
-        )
-        result_text = get_isi_interpretation(total_score)
-        
-    elif current_test == "stop_bang":
-        from surveys import get_stop_bang_interpretation
-        await state.update_data(
-            stop_bang_score=total_score,
-            completed_stop_bang=True
-        )
-        result_text = get_stop_bang_interpretation(total_score)
-        
-    elif current_test == "ess":
-        from surveys import get_ess_interpretation
-        await state.update_data(
-            ess_score=total_score,
-            completed_ess=True
-        )
-        result_text = get_ess_interpretation(total_score)
-        
-    elif current_test == "fagerstrom":
-        from surveys import get_fagerstrom_interpretation
-        await state.update_data(
-            fagerstrom_score=total_score,
-            completed_fagerstrom=True
-        )
-        result_text = get_fagerstrom_interpretation(total_score)
-        
-    elif current_test == "audit":
-        from surveys import get_audit_interpretation
-        await state.update_data(
-            audit_score=total_score,
-            completed_audit=True
-        )
-        result_text = get_audit_interpretation(total_score)
+        scores['hads_score'] = total_score
+    
+    await state.update_data(**scores, **{f"completed_{current_test}": True})
     
     # Логируем завершение теста
     await log_user_interaction(message.from_user.id, f"{current_test}_completed", f"Score: {total_score}")
@@ -2061,30 +1927,13 @@ async def complete_current_test(message: Message, state: FSMContext):
         current_data = await state.get_data()
         
         # Формируем данные только для этого теста
-        test_data_to_save = {}
-        
-        if current_test == "hads":
-            test_data_to_save['hads_anxiety_score'] = current_data.get('hads_anxiety_score')
-            test_data_to_save['hads_depression_score'] = current_data.get('hads_depression_score')
-            test_data_to_save['hads_score'] = current_data.get('hads_score')
-        elif current_test == "burns":
-            test_data_to_save['burns_score'] = current_data.get('burns_score')
-        elif current_test == "isi":
-            test_data_to_save['isi_score'] = current_data.get('isi_score')
-        elif current_test == "stop_bang":
-            test_data_to_save['stop_bang_score'] = current_data.get('stop_bang_score')
-        elif current_test == "ess":
-            test_data_to_save['ess_score'] = current_data.get('ess_score')
-        elif current_test == "fagerstrom":
-            test_data_to_save['fagerstrom_score'] = current_data.get('fagerstrom_score')
-        elif current_test == "audit":
-            test_data_to_save['audit_score'] = current_data.get('audit_score')
+        test_data_to_save = {key: current_data.get(key) for key in scores}
         
         # ВРЕМЕННО сохраняем промежуточный результат
         logger.info(f"Сохраняю промежуточный результат теста {current_test} для пользователя {message.from_user.id}: {test_data_to_save}")
         
         # Загружаем текущие сохраненные данные и обновляем их
-        existing_data = get_user_data(message.from_user.id)
+        existing_data = await run_db_read(get_user_data, message.from_user.id)
         if existing_data and existing_data.get('tests'):
             # Если есть данные тестов, обновляем их
             logger.info(f"Обновляю существующие данные тестов для пользователя {message.from_user.id}")
@@ -2185,7 +2034,8 @@ async def complete_all_tests(message: Message, state: FSMContext):
     
     try:
         # 1. НАЙТИ ИЛИ СОЗДАТЬ пользователя с НАСТОЯЩИМ telegram_id
-        existing_user = find_existing_user(
+        existing_user = await run_db_write(
+            find_existing_user,
             telegram_id=REAL_TELEGRAM_ID,
             email=data.get('email'),
             phone=data.get('phone')
@@ -2407,10 +2257,10 @@ async def generate_final_results_summary(telegram_id: int) -> str:
     try:
         logger.info(f"=== ГЕНЕРАЦИЯ ИТОГОВОЙ СВОДКИ ДЛЯ {telegram_id} ===")
         
-        from database import get_user_data
+        from database import get_user_data, run_db_read
         
         # Получаем данные пользователя с дополнительной проверкой
-        data = get_user_data(telegram_id)
+        data = await run_db_read(get_user_data, telegram_id)
         
         logger.info(f"Данные из базы: {data is not None}")
         if data:
@@ -2746,7 +2596,7 @@ async def handle_unknown_message(message: Message, state: FSMContext):
     
     # Проверяем, в каком состоянии пользователь
     current_state = await state.get_state()
-    user_completed = check_user_completed(message.from_user.id)
+    user_completed = await run_db_read(check_user_completed, message.from_user.id)
     
     if current_state and ("survey" in current_state or "test" in current_state):
         # Пользователь в процессе диагностики - подсказываем
@@ -1,6 +1,15 @@
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import List
 
+# Клавиатуры строятся один раз и переиспользуются: статические кэшируются
+# целиком, мультивыбор - по набору выбранных вариантов.
+# Возвращаемые объекты общие для всех пользователей - их нельзя изменять.
+
+# Ограничение кэша для клавиатур с мультивыбором
+MULTI_SELECT_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=None)
 def get_start_keyboard():
     """Клавиатура для начального сообщения"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -10,6 +19,7 @@ def get_start_keyboard():
 
 
 
+@lru_cache(maxsize=None)
 def get_gender_keyboard():
     """Клавиатура для выбора пола"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -18,6 +28,7 @@ def get_gender_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_location_keyboard():
     """Клавиатура для выбора места жительства"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -29,6 +40,7 @@ def get_location_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_education_keyboard():
     """Клавиатура для выбора образования"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -39,6 +51,7 @@ def get_education_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_family_keyboard():
     """Клавиатура для выбора семейного положения"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -48,6 +61,7 @@ def get_family_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_children_keyboard():
     """Клавиатура для наличия детей"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -57,6 +71,7 @@ def get_children_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_income_keyboard():
     """Клавиатура для выбора дохода"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -68,6 +83,7 @@ def get_income_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_death_cause_keyboard():
     """Клавиатура для причин смерти"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -80,6 +96,7 @@ def get_death_cause_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_heart_disease_keyboard():
     """Клавиатура для заболеваний сердца"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -89,6 +106,7 @@ def get_heart_disease_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_cv_risk_keyboard():
     """Клавиатура для сердечно-сосудистого риска"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -98,6 +116,7 @@ def get_cv_risk_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_cv_knowledge_keyboard():
     """Клавиатура для знания о факторах риска"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -109,6 +128,11 @@ def get_cv_knowledge_keyboard():
 
 def get_heart_danger_keyboard(selected: List[str]):
     """Клавиатура для опасных факторов сердца (мультивыбор до 3)"""
+    return _build_heart_danger_keyboard(frozenset(selected), len(selected))
+
+@lru_cache(maxsize=MULTI_SELECT_CACHE_SIZE)
+def _build_heart_danger_keyboard(selected: frozenset, selected_count: int):
+    """Построение клавиатуры для конкретного набора выбранных вариантов"""
     options = [
         ("Возраст", "heart_danger_age"),
         ("Мужской пол", "heart_danger_male"),
@@ -131,11 +155,12 @@ def get_heart_danger_keyboard(selected: List[str]):
         buttons.append([InlineKeyboardButton(text=prefix + text, callback_data=callback_data)])
     
     # Кнопка завершения
-    buttons.append([InlineKeyboardButton(text=f"Готово ({len(selected)}/3)", callback_data="heart_danger_done")])
+    buttons.append([InlineKeyboardButton(text=f"Готово ({selected_count}/3)", callback_data="heart_danger_done")])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_health_importance_keyboard():
     """Клавиатура для важности наблюдения за здоровьем сердца"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -146,6 +171,7 @@ def get_health_importance_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_checkup_history_keyboard():
     """Клавиатура для истории кардиочекапов"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -158,6 +184,11 @@ def get_checkup_history_keyboard():
 
 def get_checkup_content_keyboard(selected: List[str]):
     """Клавиатура для содержимого кардиочекапа (мультивыбор) - ПОЛНОСТЬЮ ИСПРАВЛЕННАЯ"""
+    return _build_checkup_content_keyboard(frozenset(selected), len(selected))
+
+@lru_cache(maxsize=MULTI_SELECT_CACHE_SIZE)
+def _build_checkup_content_keyboard(selected: frozenset, selected_count: int):
+    """Построение клавиатуры для конкретного набора выбранных вариантов"""
     # ТОЧНЫЕ названия пунктов (как они будут сохраняться)
     options = [
         ("Консультация и осмотр врача-кардиолога / терапевта", "checkup_content_consultation"),
@@ -190,6 +221,11 @@ def get_checkup_content_keyboard(selected: List[str]):
 
 def get_prevention_barriers_keyboard(selected: List[str]):
     """Клавиатура для препятствий профилактического обследования (мультивыбор)"""
+    return _build_prevention_barriers_keyboard(frozenset(selected), len(selected))
+
+@lru_cache(maxsize=MULTI_SELECT_CACHE_SIZE)
+def _build_prevention_barriers_keyboard(selected: frozenset, selected_count: int):
+    """Построение клавиатуры для конкретного набора выбранных вариантов"""
     options = [
         ("Не вижу необходимости — нет симптомов", "prevention_barriers_no_symptoms"),
         ("Страх услышать диагноз", "prevention_barriers_fear"),
@@ -213,6 +249,11 @@ def get_prevention_barriers_keyboard(selected: List[str]):
 
 def get_health_advice_keyboard(selected: List[str]):
     """Клавиатура для источников советов по здоровью (мультивыбор до 2)"""
+    return _build_health_advice_keyboard(frozenset(selected), len(selected))
+
+@lru_cache(maxsize=MULTI_SELECT_CACHE_SIZE)
+def _build_health_advice_keyboard(selected: frozenset, selected_count: int):
+    """Построение клавиатуры для конкретного набора выбранных вариантов"""
     options = [
         ("С врачом", "health_advice_doctor"),
         ("С родственниками", "health_advice_relatives"),  # Проверьте этот callback_data
@@ -228,7 +269,7 @@ def get_health_advice_keyboard(selected: List[str]):
         buttons.append([InlineKeyboardButton(text=prefix + text, callback_data=callback_data)])
     
     # Кнопка завершения
-    buttons.append([InlineKeyboardButton(text=f"Готово ({len(selected)}/2)", callback_data="health_advice_done")])
+    buttons.append([InlineKeyboardButton(text=f"Готово ({selected_count}/2)", callback_data="health_advice_done")])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     return keyboard
@@ -238,21 +279,39 @@ def get_test_selection_keyboard(completed_data=None):
     if completed_data is None:
         completed_data = {}
     
-    buttons = []
+    # Клавиатура зависит только от того, какие тесты пройдены или пропущены
+    completed_flags = tuple(
+        any(key in completed_data for key in check_keys)
+        for _, _, check_keys in REQUIRED_TESTS
+    )
+    fagerstrom_status = _optional_test_status(completed_data, "fagerstrom")
+    audit_status = _optional_test_status(completed_data, "audit")
     
-    # Обязательные тесты
-    tests = [
-        ("🟣 Тест HADS (тревога и депрессия)", "test_hads", ["hads_anxiety_score", "completed_hads"]),
-        ("🔵 Тест Бернса (эмоциональное выгорание)", "test_burns", ["burns_score", "completed_burns"]),
-        ("🌙 Тест ISI (качество сна)", "test_isi", ["isi_score", "completed_isi"]),
-        ("😴 Тест STOP-BANG (апноэ сна)", "test_stop_bang", ["stop_bang_score", "completed_stop_bang"]),
-        ("😴 Тест ESS (дневная сонливость)", "test_ess", ["ess_score", "completed_ess"])
-    ]
+    return _build_test_selection_keyboard(completed_flags, fagerstrom_status, audit_status)
+
+# Обязательные тесты
+REQUIRED_TESTS = (
+    ("🟣 Тест HADS (тревога и депрессия)", "test_hads", ("hads_anxiety_score", "completed_hads")),
+    ("🔵 Тест Бернса (эмоциональное выгорание)", "test_burns", ("burns_score", "completed_burns")),
+    ("🌙 Тест ISI (качество сна)", "test_isi", ("isi_score", "completed_isi")),
+    ("😴 Тест STOP-BANG (апноэ сна)", "test_stop_bang", ("stop_bang_score", "completed_stop_bang")),
+    ("😴 Тест ESS (дневная сонливость)", "test_ess", ("ess_score", "completed_ess"))
+)
+
+def _optional_test_status(completed_data, test_type: str) -> str:
+    """Статус необязательного теста: none, skipped или completed"""
+    keys = [f"{test_type}_score", f"{test_type}_skipped", f"completed_{test_type}"]
+    if not any(key in completed_data for key in keys):
+        return "none"
+    return "skipped" if completed_data.get(f"{test_type}_skipped") else "completed"
+
+@lru_cache(maxsize=None)
+def _build_test_selection_keyboard(completed_flags: tuple, fagerstrom_status: str, audit_status: str):
+    """Построение клавиатуры выбора тестов по статусам тестов"""
+    buttons = []
     
     completed_count = 0
-    for text, callback_data, check_keys in tests:
-        # Проверяем, завершен ли тест
-        completed = any(key in completed_data for key in check_keys)
+    for (text, callback_data, _), completed in zip(REQUIRED_TESTS, completed_flags):
         if completed:
             completed_count += 1
         
@@ -260,27 +319,19 @@ def get_test_selection_keyboard(completed_data=None):
         buttons.append([InlineKeyboardButton(text=prefix + text, callback_data=callback_data)])
     
     # Фагерстрем (необязательный)
-    fagerstrom_keys = ["fagerstrom_score", "fagerstrom_skipped", "completed_fagerstrom"]
-    fagerstrom_completed = any(key in completed_data for key in fagerstrom_keys)
-    
-    if fagerstrom_completed:
-        if completed_data.get("fagerstrom_skipped"):
-            buttons.append([InlineKeyboardButton(text="⏭ 🚬 Тест Фагерстрема (пропущен)", callback_data="test_fagerstrom")])
-        else:
-            buttons.append([InlineKeyboardButton(text="✅ 🚬 Тест Фагерстрема (никотиновая зависимость)", callback_data="test_fagerstrom")])
+    if fagerstrom_status == "skipped":
+        buttons.append([InlineKeyboardButton(text="⏭ 🚬 Тест Фагерстрема (пропущен)", callback_data="test_fagerstrom")])
+    elif fagerstrom_status == "completed":
+        buttons.append([InlineKeyboardButton(text="✅ 🚬 Тест Фагерстрема (никотиновая зависимость)", callback_data="test_fagerstrom")])
     else:
         buttons.append([InlineKeyboardButton(text="⭕ 🚬 Тест Фагерстрема (никотиновая зависимость)", callback_data="test_fagerstrom")])
         buttons.append([InlineKeyboardButton(text="⏭ Я не курю", callback_data="test_fagerstrom_skip")])
     
     # AUDIT (необязательный)
-    audit_keys = ["audit_score", "audit_skipped", "completed_audit"]
-    audit_completed = any(key in completed_data for key in audit_keys)
-    
-    if audit_completed:
-        if completed_data.get("audit_skipped"):
-            buttons.append([InlineKeyboardButton(text="⏭ 🍷 Тест AUDIT (пропущен)", callback_data="test_audit")])
-        else:
-            buttons.append([InlineKeyboardButton(text="✅ 🍷 Тест AUDIT (употребление алкоголя)", callback_data="test_audit")])
+    if audit_status == "skipped":
+        buttons.append([InlineKeyboardButton(text="⏭ 🍷 Тест AUDIT (пропущен)", callback_data="test_audit")])
+    elif audit_status == "completed":
+        buttons.append([InlineKeyboardButton(text="✅ 🍷 Тест AUDIT (употребление алкоголя)", callback_data="test_audit")])
     else:
         buttons.append([InlineKeyboardButton(text="⭕ 🍷 Тест AUDIT (употребление алкоголя)", callback_data="test_audit")])
         buttons.append([InlineKeyboardButton(text="⏭ Я не употребляю алкоголь", callback_data="test_audit_skip")])
@@ -299,16 +350,22 @@ def get_test_selection_keyboard(completed_data=None):
 
 def get_question_keyboard(question, test_type):
     """Клавиатура для вопроса теста"""
+    # Клавиатура зависит только от вариантов ответа - у многих вопросов они одинаковые
+    options = tuple((option['text'], option['score']) for option in question['options'])
+    return _build_question_keyboard(options)
+
+@lru_cache(maxsize=None)
+def _build_question_keyboard(options: tuple):
+    """Построение клавиатуры по вариантам ответа (текст, балл)"""
     buttons = []
     
-    for i, option in enumerate(question['options']):
-        text = option['text']
-        score = option['score']
+    for text, score in options:
         buttons.append([InlineKeyboardButton(text=text, callback_data=f"answer_{score}")])
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
     return keyboard
 
+@lru_cache(maxsize=None)
 def get_continue_keyboard():
     """Клавиатура для продолжения после завершения теста"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -316,10 +373,36 @@ def get_continue_keyboard():
     ])
     return keyboard
 
+@lru_cache(maxsize=128)
 def get_yes_no_keyboard(yes_callback, no_callback):
     """Универсальная клавиатура Да/Нет"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Да", callback_data=yes_callback)],
         [InlineKeyboardButton(text="Нет", callback_data=no_callback)]
     ])
-    return keyboard
\ No newline at end of file
+    return keyboard
+
+def preload_keyboards():
+    """Построить все статические клавиатуры и клавиатуры вопросов тестов при старте"""
+    from surveys import TEST_QUESTIONS
+    
+    static_builders = [
+        get_start_keyboard, get_gender_keyboard, get_location_keyboard, get_education_keyboard,
+        get_family_keyboard, get_children_keyboard, get_income_keyboard, get_death_cause_keyboard,
+        get_heart_disease_keyboard, get_cv_risk_keyboard, get_cv_knowledge_keyboard,
+        get_health_importance_keyboard, get_checkup_history_keyboard, get_continue_keyboard,
+    ]
+    for builder in static_builders:
+        builder()
+    
+    for test_type, questions in TEST_QUESTIONS.items():
+        for question in questions:
+            get_question_keyboard(question, test_type)
+    
+    # Начальные (пустые) состояния мультивыбора и меню тестов
+    for builder in (get_heart_danger_keyboard, get_checkup_content_keyboard,
+                    get_prevention_barriers_keyboard, get_health_advice_keyboard):
+        builder([])
+    get_test_selection_keyboard()
+    
+    return _build_question_keyboard.cache_info().currsize + len(static_builders)
@@ -5,18 +5,22 @@ import sys
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.session.aiohttp import AiohttpSession
 import aiohttp
+from dotenv import load_dotenv
+
+# До импорта модулей бота: database читает DATABASE_URL и настройки пула при импорте
+load_dotenv()
+
 from score_2_handler import score2_router
 
 from handlers import router, state_protection
-from database import init_db, ensure_database_exists, fix_incomplete_records, validate_data_integrity
+from database import init_db, ensure_database_exists, fix_incomplete_records, validate_data_integrity, activity_log_queue, live_stats, shutdown_db_executors
 from admin import admin_router
-from broadcast import BroadcastScheduler
-from dotenv import load_dotenv
-
-load_dotenv()
+from admin_jobs import admin_jobs
+from broadcast import BroadcastScheduler, resume_unfinished_broadcasts
+from fsm_storage import SQLiteStorage
+from keyboards import preload_keyboards
 
 # Настройка логирования без эмодзи для совместимости с Windows
 def setup_logging():
@@ -276,6 +280,10 @@ async def main():
         logger.error("КРИТИЧЕСКАЯ ОШИБКА: Проверки при запуске не пройдены. Завершение работы.")
         return
     
+    # Заранее строим клавиатуры опросов и тестов
+    keyboards_count = preload_keyboards()
+    logger.info(f"УСПЕХ: Подготовлено клавиатур: {keyboards_count}")
+    
     # Создание бота
     bot = None
     try:
@@ -291,8 +299,9 @@ async def main():
         # Настройка команд
         await setup_commands(bot)
         
-        # Создаем диспетчер
-        storage = MemoryStorage()
+        # Создаем диспетчер с постоянным хранилищем состояний
+        storage = SQLiteStorage()
+        await storage.load()
         dp = Dispatcher(storage=storage)
         
         # ============================================================================
@@ -366,6 +375,18 @@ async def main():
     logger.info("Запуск polling с защитой от зацикливания...")
     
     try:
+        # Запускаем пакетную запись логов активности
+        activity_log_queue.start()
+        
+        # Счетчики админ-панели: первичный расчет и периодическая сверка с БД
+        await live_stats.start()
+        
+        # Пул фоновых задач админки (экспорт, импорт, бэкап, обслуживание БД)
+        await admin_jobs.start()
+        
+        # Продолжаем рассылки, прерванные предыдущим перезапуском
+        resume_task = asyncio.create_task(resume_unfinished_broadcasts(bot))
+        
         # Запускаем планировщик в фоне
         if scheduler:
             scheduler_task = asyncio.create_task(scheduler.start_scheduler())
@@ -380,6 +401,11 @@ async def main():
             if processing_count > 0 or cache_size > 50:
                 logger.info(f"Защита состояний: обрабатывается {processing_count} пользователей, "
                            f"кэш {cache_size} записей, тайм-ауты {timeout_size}")
+            
+            queue_stats = activity_log_queue.get_stats()
+            logger.info(f"Очередь логов: глубина {queue_stats['queue_depth']}/{queue_stats['max_size']}, "
+                       f"записано {queue_stats['written']}, отброшено {queue_stats['dropped']}, "
+                       f"сброс avg {queue_stats['avg_flush_ms']} мс / max {queue_stats['max_flush_ms']} мс")
         
         # Периодическое логирование статистики (каждые 5 минут)
         async def stats_logger():
@@ -415,6 +441,14 @@ async def main():
             except asyncio.CancelledError:
                 pass
         
+        # Останавливаем возобновление рассылок (незавершенные продолжатся при следующем запуске)
+        if 'resume_task' in locals():
+            resume_task.cancel()
+            try:
+                await resume_task
+            except asyncio.CancelledError:
+                pass
+        
         # Останавливаем логирование статистики
         if 'stats_task' in locals():
             stats_task.cancel()
@@ -423,6 +457,31 @@ async def main():
             except asyncio.CancelledError:
                 pass
         
+        # Останавливаем сверку счетчиков статистики
+        await live_stats.stop()
+        
+        # Останавливаем фоновые задачи админки (незавершенные будут помечены при запуске)
+        await admin_jobs.stop()
+        
+        # Сбрасываем накопленные логи активности в БД
+        try:
+            await activity_log_queue.stop()
+            logger.info("СБРОШЕНО: Очередь логов активности")
+        except Exception as e:
+            logger.warning(f"Ошибка при сбросе очереди логов: {e}")
+        
+        # Сохраняем состояния FSM (незавершенные опросы и тесты)
+        if 'storage' in locals():
+            try:
+                await storage.close()
+                logger.info("СОХРАНЕНО: Состояния FSM")
+            except Exception as e:
+                logger.warning(f"Ошибка при сохранении состояний FSM: {e}")
+        
+        # Дожидаемся поставленных записей в БД и останавливаем потоки БД
+        shutdown_db_executors()
+        logger.info("ОСТАНОВЛЕНО: Потоки доступа к БД")
+        
         # Финальная статистика защиты
         final_processing = len(state_protection.processing_users)
         final_cache = len(state_protection.user_last_action)
@@ -1,8 +1,13 @@
 import asyncio
 import json
 import logging
+from bisect import bisect_right
 from typing import Dict, Any
 from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -11,7 +16,15 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
 
 # Импорты из существующего кода
-from database import log_user_activity, get_db_sync, User, ActivityLog
+from database import (
+    log_user_activity,
+    get_db_sync,
+    get_score2_result,
+    run_db_read,
+    save_score2_result,
+    User,
+    ActivityLog,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -338,109 +351,286 @@ SCORE2_TABLE = {
     }
 }
 
+# Ответы пользователя (callback_data) -> строки и столбцы таблицы SCORE2.
+# Для значений вне таблицы берутся крайние группы, для неизвестных - значения по умолчанию
+AGE_CHOICE_GROUPS = {
+    "менее_40": "40-44",
+    "40-44": "40-44",
+    "45-49": "45-49",
+    "50-54": "50-54",
+    "55-59": "55-59",
+    "60-64": "60-64",
+    "65-69": "65-69",
+    "70-74": "70-74",
+    "75-79": "75-79",
+    "80-84": "80-84",
+    "85-89": "85-89",
+    "более_90": "85-89"
+}
+BP_CHOICE_GROUPS = {
+    "менее_100": "100-119",
+    "100-119": "100-119",
+    "120-139": "120-139",
+    "140-159": "140-159",
+    "160-179": "160-179",
+    "более_180": "160-179"
+}
+CHOL_MMOL_CHOICE_GROUPS = {
+    "менее_3": "3.0-3.9",
+    "3.0-3.9": "3.0-3.9",
+    "4.0-4.9": "4.0-4.9",
+    "5.0-5.9": "5.0-5.9",
+    "6.0-6.9": "6.0-6.9",
+    "более_6.9": "6.0-6.9"
+}
+CHOL_MGDL_CHOICE_GROUPS = {
+    "менее_150": "3.0-3.9",
+    "150-200": "4.0-4.9",
+    "200-250": "5.0-5.9",
+    "более_250": "6.0-6.9"
+}
+DEFAULT_AGE_GROUP = "40-44"
+DEFAULT_BP_GROUP = "120-139"
+DEFAULT_CHOL_GROUP = "4.0-4.9"
+
+# Интерпретация: верхние границы уровней (не включительно) и их описания
+SCORE2_LEVEL_UPPERS = (5, 10, 20)
+SCORE2_INTERPRETATIONS = (
+    {
+        "level": "НИЗКИЙ",
+        "color": "🟢",
+        "description": "Низкий риск сердечно-сосудистых заболеваний",
+        "recommendation": "Здоровый образ жизни"
+    },
+    {
+        "level": "УМЕРЕННЫЙ",
+        "color": "🟡",
+        "description": "Умеренный риск сердечно-сосудистых заболеваний",
+        "recommendation": "Здоровый образ жизни"
+    },
+    {
+        "level": "ВЫСОКИЙ",
+        "color": "🟠",
+        "description": "Высокий риск сердечно-сосудистых заболеваний",
+        "recommendation": "Требуется консультация кардиолога. Необходима коррекция факторов риска."
+    },
+    {
+        "level": "ОЧЕНЬ ВЫСОКИЙ",
+        "color": "🔴",
+        "description": "Очень высокий риск сердечно-сосудистых заболеваний",
+        "recommendation": "Требуется консультация кардиолога. Необходима коррекция факторов риска."
+    },
+)
+
+# ============================================================================
+# КОМПИЛЯЦИЯ ТАБЛИЦЫ SCORE2
+# ============================================================================
+
+# SCORE2_TABLE остается читаемым источником, при импорте он разворачивается
+# в плотный массив SCORE2_RISK[возраст, пол, курение, САД, холестерин]
+# и словари "строка -> номер" для каждой оси
+SCORE2_AGE_GROUPS = tuple(SCORE2_TABLE)
+SCORE2_GENDERS = ("female", "male")
+SCORE2_SMOKING = ("non_smoking", "smoking")
+SCORE2_BP_GROUPS = ("100-119", "120-139", "140-159", "160-179")
+SCORE2_CHOL_GROUPS = ("3.0-3.9", "4.0-4.9", "5.0-5.9", "6.0-6.9")
+
+def _axis_index(groups) -> Dict[str, int]:
+    return {group: index for index, group in enumerate(groups)}
+
+_AGE_INDEX = _axis_index(SCORE2_AGE_GROUPS)
+_GENDER_INDEX = _axis_index(SCORE2_GENDERS)
+_SMOKING_INDEX = _axis_index(SCORE2_SMOKING)
+_BP_INDEX = _axis_index(SCORE2_BP_GROUPS)
+_CHOL_INDEX = _axis_index(SCORE2_CHOL_GROUPS)
+
+def _compile_score2_table() -> np.ndarray:
+    """Вложенный словарь SCORE2_TABLE -> массив uint8 (KeyError, если таблица неполная)"""
+    risk = np.zeros(
+        (len(SCORE2_AGE_GROUPS), len(SCORE2_GENDERS), len(SCORE2_SMOKING),
+         len(SCORE2_BP_GROUPS), len(SCORE2_CHOL_GROUPS)),
+        dtype=np.uint8,
+    )
+    for index in np.ndindex(risk.shape):
+        age, gender, smoking, bp, chol = index
+        risk[index] = SCORE2_TABLE[SCORE2_AGE_GROUPS[age]][SCORE2_GENDERS[gender]][
+            SCORE2_SMOKING[smoking]][SCORE2_BP_GROUPS[bp]][SCORE2_CHOL_GROUPS[chol]]
+    risk.flags.writeable = False
+    return risk
+
+SCORE2_RISK = _compile_score2_table()
+
+# Ответы пользователя сразу в номера строк массива
+_AGE_CHOICE_INDEX = {choice: _AGE_INDEX[group] for choice, group in AGE_CHOICE_GROUPS.items()}
+_BP_CHOICE_INDEX = {choice: _BP_INDEX[group] for choice, group in BP_CHOICE_GROUPS.items()}
+_CHOL_MMOL_CHOICE_INDEX = {choice: _CHOL_INDEX[group] for choice, group in CHOL_MMOL_CHOICE_GROUPS.items()}
+_CHOL_MGDL_CHOICE_INDEX = {choice: _CHOL_INDEX[group] for choice, group in CHOL_MGDL_CHOICE_GROUPS.items()}
+
+_SCORE2_LEVEL_NAMES = np.array([interpretation["level"] for interpretation in SCORE2_INTERPRETATIONS], dtype=object)
+
 # ============================================================================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 # ============================================================================
 
 def get_age_group(age_choice: str) -> str:
     """Определение возрастной группы для таблицы SCORE2"""
-    age_mapping = {
-        "менее_40": "40-44",
-        "40-44": "40-44",
-        "45-49": "45-49", 
-        "50-54": "50-54",
-        "55-59": "55-59",
-        "60-64": "60-64",
-        "65-69": "65-69",
-        "70-74": "70-74",
-        "75-79": "75-79",
-        "80-84": "80-84",
-        "85-89": "85-89",
-        "более_90": "85-89"
-    }
-    return age_mapping.get(age_choice, "40-44")
+    return AGE_CHOICE_GROUPS.get(age_choice, DEFAULT_AGE_GROUP)
 
 def get_bp_group(bp_choice: str) -> str:
     """Определение группы АД для таблицы SCORE2"""
-    bp_mapping = {
-        "менее_100": "100-119",
-        "100-119": "100-119",
-        "120-139": "120-139",
-        "140-159": "140-159",
-        "160-179": "160-179",
-        "более_180": "160-179"
-    }
-    return bp_mapping.get(bp_choice, "120-139")
+    return BP_CHOICE_GROUPS.get(bp_choice, DEFAULT_BP_GROUP)
 
 def get_cholesterol_group_mmol(chol_choice: str) -> str:
     """Определение группы холестерина (ммоль/л) для таблицы SCORE2"""
-    chol_mapping = {
-        "менее_3": "3.0-3.9",
-        "3.0-3.9": "3.0-3.9",
-        "4.0-4.9": "4.0-4.9",
-        "5.0-5.9": "5.0-5.9",
-        "6.0-6.9": "6.0-6.9",
-        "более_6.9": "6.0-6.9"
-    }
-    return chol_mapping.get(chol_choice, "4.0-4.9")
+    return CHOL_MMOL_CHOICE_GROUPS.get(chol_choice, DEFAULT_CHOL_GROUP)
 
 def get_cholesterol_group_mgdl(chol_choice: str) -> str:
     """Определение группы холестерина (мг/дл) для таблицы SCORE2"""
-    chol_mapping = {
-        "менее_150": "3.0-3.9",
-        "150-200": "4.0-4.9", 
-        "200-250": "5.0-5.9",
-        "более_250": "6.0-6.9"
-    }
-    return chol_mapping.get(chol_choice, "4.0-4.9")
+    return CHOL_MGDL_CHOICE_GROUPS.get(chol_choice, DEFAULT_CHOL_GROUP)
 
 def calculate_score2_risk(gender: str, smoking: str, age_group: str, bp_group: str, chol_group: str) -> int:
     """Расчет риска по таблице SCORE2"""
     try:
-        gender_key = "female" if gender == "женский" else "male"
-        smoking_key = "smoking" if smoking == "курит" else "non_smoking"
-        
-        risk = SCORE2_TABLE[age_group][gender_key][smoking_key][bp_group][chol_group]
-        return risk
+        return SCORE2_RISK.item(
+            _AGE_INDEX[age_group],
+            _GENDER_INDEX["female" if gender == "женский" else "male"],
+            _SMOKING_INDEX["smoking" if smoking == "курит" else "non_smoking"],
+            _BP_INDEX[bp_group],
+            _CHOL_INDEX[chol_group],
+        )
     except KeyError:
         logger.error(f"Ошибка расчета SCORE2: {gender}, {smoking}, {age_group}, {bp_group}, {chol_group}")
         return 0
 
 def get_risk_interpretation(risk_score: int) -> Dict[str, str]:
     """Интерпретация результата SCORE2"""
-    if risk_score < 5:
-        return {
-            "level": "НИЗКИЙ",
-            "color": "🟢",
-            "description": "Низкий риск сердечно-сосудистых заболеваний",
-            "recommendation": "Здоровый образ жизни"
-        }
-    elif risk_score < 10:
-        return {
-            "level": "УМЕРЕННЫЙ", 
-            "color": "🟡",
-            "description": "Умеренный риск сердечно-сосудистых заболеваний",
-            "recommendation": "Здоровый образ жизни"
-        }
-    elif risk_score < 20:
-        return {
-            "level": "ВЫСОКИЙ",
-            "color": "🟠", 
-            "description": "Высокий риск сердечно-сосудистых заболеваний",
-            "recommendation": "Требуется консультация кардиолога. Необходима коррекция факторов риска."
-        }
+    return dict(SCORE2_INTERPRETATIONS[bisect_right(SCORE2_LEVEL_UPPERS, risk_score)])
+
+def format_score2_result(answers: Dict[str, Any], risk_score: int, calculated_at: datetime) -> str:
+    """Текст результата SCORE2 по ответам (как в состоянии FSM) и риску"""
+    gender = answers.get("gender")
+    smoking = answers.get("smoking")
+    age = answers.get("age")
+    bp = answers.get("blood_pressure")
+    cholesterol = answers.get("cholesterol")
+    cholesterol_unit = answers.get("cholesterol_unit")
+    risk_info = get_risk_interpretation(risk_score)
+    
+    age_display_map = {
+        "менее_40": "Менее 40 лет",
+        "40-44": "40-44 года", 
+        "45-49": "45-49 лет",
+        "50-54": "50-54 года",
+        "55-59": "55-59 лет",
+        "60-64": "60-64 года",
+        "65-69": "65-69 лет",
+        "70-74": "70-74 года",
+        "75-79": "75-79 лет",
+        "80-84": "80-84 года",
+        "85-89": "85-89 лет",
+        "более_90": "Старше 90 лет"
+    }
+    
+    bp_display_map = {
+        "менее_100": "Менее 100",
+        "100-119": "100-119",
+        "120-139": "120-139",
+        "140-159": "140-159",
+        "160-179": "160-179",
+        "более_180": "Более 180"
+    }
+    
+    chol_display_map_mmol = {
+        "менее_3": "Менее 3,0",
+        "3.0-3.9": "3,0-3,9",
+        "4.0-4.9": "4,0-4,9",
+        "5.0-5.9": "5,0-5,9",
+        "6.0-6.9": "6,0-6,9",
+        "более_6.9": "Более 6,9"
+    }
+    
+    chol_display_map_mgdl = {
+        "менее_150": "Менее 150",
+        "150-200": "150-200",
+        "200-250": "200-250", 
+        "более_250": "Более 250"
+    }
+    
+    age_text = age_display_map.get(age, age)
+    bp_text = bp_display_map.get(bp, bp) + " мм рт. ст."
+    smoking_text = "Не курю" if smoking == "не_курит" else "Курю"
+    gender_text = "Женский" if gender == "женский" else "Мужской"
+    
+    if cholesterol_unit == "mmol":
+        chol_text = chol_display_map_mmol.get(cholesterol, cholesterol) + " ммоль/л"
     else:
-        return {
-            "level": "ОЧЕНЬ ВЫСОКИЙ",
-            "color": "🔴",
-            "description": "Очень высокий риск сердечно-сосудистых заболеваний", 
-            "recommendation": "Требуется консультация кардиолога. Необходима коррекция факторов риска."
-        }
+        chol_text = chol_display_map_mgdl.get(cholesterol, cholesterol) + " мг/дл"
+    
+    result_text = f"""
+🩺 *РЕЗУЛЬТАТ SCORE2*
+
+📊 **Ваши данные:**
+• Пол: {gender_text}
+• Курение: {smoking_text}
+• Возраст: {age_text}
+• АД: {bp_text}
+• Холестерин: {chol_text}
+
+{risk_info["color"]} **Ваш 10-летний риск: {risk_score}%**
+
+📈 **Уровень риска: {risk_info["level"]}**
+
+{risk_info["description"]}
+
+📅 Дата расчета: {calculated_at.strftime("%d.%m.%Y")}
+    """
+    return result_text
+
+def _choice_index(column: pd.Series, index_map: Dict[str, int], default: int) -> np.ndarray:
+    """Ответы -> номера по оси таблицы; неизвестные и пустые -> default"""
+    # factorize: код значения в порядке появления, пустые -> -1
+    codes, uniques = pd.factorize(column)
+    lookup = np.array([index_map.get(value, default) for value in uniques] + [default], dtype=np.intp)
+    return lookup[codes]
+
+def score2_batch(data: pd.DataFrame) -> pd.DataFrame:
+    """Векторный расчет SCORE2 для многих ответов сразу
+
+    data - колонки database.SCORE2_ANSWER_COLUMNS с ответами в том виде, в каком они
+    хранятся в состоянии FSM ("женский", "курит", "менее_40", "mmol"...),
+    отсутствующие колонки считаются пустыми. Возвращает score2_risk и
+    score2_level с тем же индексом; значения совпадают с расчетом
+    calculate_and_show_result для каждой строки.
+    """
+    def column(field: str) -> pd.Series:
+        if field in data.columns:
+            return data[field]
+        return pd.Series([None] * len(data), index=data.index, dtype=object)
+
+    mmol = _choice_index(column("cholesterol_unit"), {"mmol": 1}, 0).astype(bool)
+    chol = np.where(
+        mmol,
+        _choice_index(column("cholesterol"), _CHOL_MMOL_CHOICE_INDEX, _CHOL_INDEX[DEFAULT_CHOL_GROUP]),
+        _choice_index(column("cholesterol"), _CHOL_MGDL_CHOICE_INDEX, _CHOL_INDEX[DEFAULT_CHOL_GROUP]),
+    )
+    risk = SCORE2_RISK[
+        _choice_index(column("age"), _AGE_CHOICE_INDEX, _AGE_INDEX[DEFAULT_AGE_GROUP]),
+        _choice_index(column("gender"), {"женский": _GENDER_INDEX["female"]}, _GENDER_INDEX["male"]),
+        _choice_index(column("smoking"), {"курит": _SMOKING_INDEX["smoking"]}, _SMOKING_INDEX["non_smoking"]),
+        _choice_index(column("blood_pressure"), _BP_CHOICE_INDEX, _BP_INDEX[DEFAULT_BP_GROUP]),
+        chol,
+    ]
+    level_index = np.searchsorted(SCORE2_LEVEL_UPPERS, risk, side='right')
+    return pd.DataFrame(
+        {'score2_risk': risk.astype(np.int64), 'score2_level': _SCORE2_LEVEL_NAMES[level_index]},
+        index=data.index,
+    )
 
 # ============================================================================
 # СОЗДАНИЕ КЛАВИАТУР
 # ============================================================================
 
+@lru_cache(maxsize=None)
 def create_gender_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора пола"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -451,6 +641,7 @@ def create_gender_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_smoking_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора курения"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -461,6 +652,7 @@ def create_smoking_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_age_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора возраста (в 2 ряда)"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -485,6 +677,7 @@ def create_age_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_bp_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора артериального давления"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -503,6 +696,7 @@ def create_bp_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_cholesterol_unit_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора единиц измерения холестерина"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -513,6 +707,7 @@ def create_cholesterol_unit_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_cholesterol_mmol_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора холестерина в ммоль/л"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -531,6 +726,7 @@ def create_cholesterol_mmol_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_cholesterol_mgdl_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора холестерина в мг/дл"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -545,6 +741,7 @@ def create_cholesterol_mgdl_keyboard() -> InlineKeyboardMarkup:
     ])
     return keyboard
 
+@lru_cache(maxsize=None)
 def create_restart_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для повторного прохождения"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -567,14 +764,31 @@ async def cmd_score2_start(message: Message, state: FSMContext):
     user_id = message.from_user.id
     
     try:
+        # Результат уже сохранен - показываем его вместо повторных вопросов
+        stored = await run_db_read(get_score2_result, user_id)
+        
         # Логируем начало SCORE2
         await log_user_activity(
             telegram_id=user_id,
             action="score2_started",
-            details={"method": "command"},
+            details={"method": "command", "stored_result": stored is not None},
             step="score2_start"
         )
         
+        if stored:
+            result_text = format_score2_result(stored, stored["risk"], stored["calculated_at"])
+            await message.edit_text(
+                text=result_text,
+                reply_markup=create_restart_keyboard(),
+                parse_mode="Markdown"
+            ) if message.text != "/score" else await message.answer(
+                text=result_text,
+                reply_markup=create_restart_keyboard(),
+                parse_mode="Markdown"
+            )
+            await state.set_state(Score2States.showing_result)
+            return
+        
         welcome_text = """
 🩺 *SCORE2 - Калькулятор сердечно-сосудистого риска*
 
@@ -975,7 +1189,7 @@ async def process_cholesterol_mgdl(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Произошла ошибка")
 
 async def calculate_and_show_result(callback: CallbackQuery, state: FSMContext):
-    """Расчет и отображение результата SCORE2"""
+    """Расчет, сохранение и отображение результата SCORE2"""
     user_id = callback.from_user.id
     
     data = await state.get_data()
@@ -1001,6 +1215,12 @@ async def calculate_and_show_result(callback: CallbackQuery, state: FSMContext):
     risk_score = calculate_score2_risk(gender, smoking, age_group, bp_group, chol_group)
     risk_info = get_risk_interpretation(risk_score)
     
+    # Сохраняем результат: при следующем /score он будет показан без повторных вопросов
+    try:
+        await save_score2_result(user_id, data, risk_score, risk_info["level"])
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результата SCORE2 для {user_id}: {e}")
+    
     # Логируем результат
     await log_user_activity(
         telegram_id=user_id,
@@ -1018,78 +1238,8 @@ async def calculate_and_show_result(callback: CallbackQuery, state: FSMContext):
         step="score2_result"
     )
     
-    # Формируем текст результата
-    age_display_map = {
-        "менее_40": "Менее 40 лет",
-        "40-44": "40-44 года", 
-        "45-49": "45-49 лет",
-        "50-54": "50-54 года",
-        "55-59": "55-59 лет",
-        "60-64": "60-64 года",
-        "65-69": "65-69 лет",
-        "70-74": "70-74 года",
-        "75-79": "75-79 лет",
-        "80-84": "80-84 года",
-        "85-89": "85-89 лет",
-        "более_90": "Старше 90 лет"
-    }
-    
-    bp_display_map = {
-        "менее_100": "Менее 100",
-        "100-119": "100-119",
-        "120-139": "120-139",
-        "140-159": "140-159",
-        "160-179": "160-179",
-        "более_180": "Более 180"
-    }
-    
-    chol_display_map_mmol = {
-        "менее_3": "Менее 3,0",
-        "3.0-3.9": "3,0-3,9",
-        "4.0-4.9": "4,0-4,9",
-        "5.0-5.9": "5,0-5,9",
-        "6.0-6.9": "6,0-6,9",
-        "более_6.9": "Более 6,9"
-    }
-    
-    chol_display_map_mgdl = {
-        "менее_150": "Менее 150",
-        "150-200": "150-200",
-        "200-250": "200-250", 
-        "более_250": "Более 250"
-    }
-    
-    age_text = age_display_map.get(age, age)
-    bp_text = bp_display_map.get(bp, bp) + " мм рт. ст."
-    smoking_text = "Не курю" if smoking == "не_курит" else "Курю"
-    gender_text = "Женский" if gender == "женский" else "Мужской"
-    
-    if cholesterol_unit == "mmol":
-        chol_text = chol_display_map_mmol.get(cholesterol, cholesterol) + " ммоль/л"
-    else:
-        chol_text = chol_display_map_mgdl.get(cholesterol, cholesterol) + " мг/дл"
-    
-    result_text = f"""
-🩺 *РЕЗУЛЬТАТ SCORE2*
-
-📊 **Ваши данные:**
-• Пол: {gender_text}
-• Курение: {smoking_text}
-• Возраст: {age_text}
-• АД: {bp_text}
-• Холестерин: {chol_text}
-
-{risk_info["color"]} **Ваш 10-летний риск: {risk_score}%**
-
-📈 **Уровень риска: {risk_info["level"]}**
-
-{risk_info["description"]}
-
-📅 Дата расчета: {datetime.now().strftime("%d.%m.%Y")}
-    """
-    
     await callback.message.edit_text(
-        text=result_text,
+        text=format_score2_result(data, risk_score, datetime.now()),
         reply_markup=create_restart_keyboard(),
         parse_mode="Markdown"
     )
@@ -3,63 +3,13 @@
 Включает в себя все тесты, их интерпретацию и комплексную оценку рисков
 """
 
+import operator
 from datetime import datetime
-from typing import Dict, List, Any, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Any, Tuple, Mapping
 
-# ============================================================================
-# КОНСТАНТЫ И НАСТРОЙКИ
-# ============================================================================
-
-# Нормативные значения для тестов
-TEST_NORMS = {
-    'hads_anxiety': {
-        'норма': (0, 7),
-        'субклиническая': (8, 10), 
-        'клиническая': (11, 21)
-    },
-    'hads_depression': {
-        'норма': (0, 7),
-        'субклиническая': (8, 10),
-        'клиническая': (11, 21)
-    },
-    'burns': {
-        'минимальная': (0, 5),
-        'легкая': (6, 10),
-        'умеренная': (11, 25),
-        'тяжелая': (26, 50),
-        'крайне_тяжелая': (51, 100)
-    },
-    'isi': {
-        'нет_бессонницы': (0, 7),
-        'подпороговая': (8, 14),
-        'умеренная': (15, 21),
-        'тяжелая': (22, 28)
-    },
-    'stop_bang': {
-        'низкий': (0, 2),
-        'умеренный': (3, 4),
-        'высокий': (5, 8)
-    },
-    'ess': {
-        'норма': (0, 10),
-        'легкая': (11, 12),
-        'умеренная': (13, 15),
-        'выраженная': (16, 24)
-    },
-    'fagerstrom': {
-        'очень_слабая': (0, 2),
-        'слабая': (3, 4),
-        'средняя': (5, 6),
-        'сильная': (7, 8),
-        'очень_сильная': (9, 10)
-    },
-    'audit': {
-        'низкий': (0, 7),
-        'опасное': (8, 15),
-        'вредное': (16, 19),
-        'зависимость': (20, 40)
-    }
-}
+import numpy as np
+import pandas as pd
 
 # ============================================================================
 # СТРУКТУРЫ ДАННЫХ ТЕСТОВ
@@ -620,42 +570,265 @@ def get_audit_questions() -> List[Dict]:
         }
     ]
 
+# ============================================================================
+# РЕЕСТР ВОПРОСОВ ТЕСТОВ
+# ============================================================================
+
+def _freeze(obj):
+    """Рекурсивно сделать структуру вопросов неизменяемой"""
+    if isinstance(obj, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(item) for item in obj)
+    return obj
+
+# Вопросы строятся один раз на процесс; в FSM хранится только id теста,
+# индекс текущего вопроса и список баллов
+TEST_QUESTIONS: Mapping[str, Tuple[Mapping[str, Any], ...]] = MappingProxyType({
+    'hads': _freeze(get_hads_questions()),
+    'burns': _freeze(get_burns_questions()),
+    'isi': _freeze(get_isi_questions()),
+    'stop_bang': _freeze(get_stop_bang_questions()),
+    'ess': _freeze(get_ess_questions()),
+    'fagerstrom': _freeze(get_fagerstrom_questions()),
+    'audit': _freeze(get_audit_questions()),
+})
+
+def get_test_questions(test_type: str) -> Tuple[Mapping[str, Any], ...]:
+    """Неизменяемый список вопросов теста из общего реестра"""
+    return TEST_QUESTIONS[test_type]
+
+# ============================================================================
+# РЕЕСТР ПОДСЧЕТА И НОРМ ТЕСТОВ
+# ============================================================================
+
+# Декларативное описание всех тестов: подшкалы (какие вопросы в них входят)
+# и нормативные диапазоны. Каждый диапазон задается верхней границей балла
+# и содержит категорию для БД, подпись и рекомендацию для пользователя.
+# Подшкала "items" - значение поля type вопроса; None - все вопросы теста.
+# Итоговые тексты собираются из heading/tail, tail диапазона заменяет tail теста.
+TEST_SCORING: Dict[str, Dict[str, Any]] = {
+    'hads': {
+        'scales': {
+            'hads_anxiety': {'items': 'anxiety', 'title': 'Тревога', 'level_column': 'hads_anxiety_level'},
+            'hads_depression': {'items': 'depression', 'title': 'Депрессия', 'level_column': 'hads_depression_level'},
+        },
+        'bands': (
+            {'upper': 7, 'category': 'норма', 'label': 'норма',
+             'recommendation': "✅ <b>Результат:</b> Ваши показатели тревоги и депрессии находятся в пределах нормы."},
+            {'upper': 10, 'category': 'субклиническая', 'label': 'субклинически выраженные симптомы',
+             'recommendation': "⚠️ <b>Рекомендация:</b> Обратите внимание на свое эмоциональное состояние. Рассмотрите возможность работы со стрессом, релаксационные техники."},
+            {'upper': 21, 'category': 'клиническая', 'label': 'клинически выраженные симптомы',
+             'recommendation': "🚨 <b>Рекомендация:</b> Рекомендуется консультация специалиста (психолога, психотерапевта) для дальнейшей оценки и возможной помощи."},
+        ),
+    },
+    'burns': {
+        'scales': {'burns': {'items': None, 'level_column': 'burns_level'}},
+        'heading': 'Уровень депрессии',
+        'tail': "\n\n{color}",
+        'bands': (
+            {'upper': 5, 'category': 'минимальная', 'label': 'минимальная депрессия', 'color': '🟢', 'tail': '',
+             'recommendation': "✅ Ваше эмоциональное состояние в норме."},
+            {'upper': 10, 'category': 'легкая', 'label': 'легкая депрессия', 'color': '🟡', 'tail': '',
+             'recommendation': "💡 Легкие признаки сниженного настроения. Обратите внимание на режим дня, физическую активность и качество сна."},
+            {'upper': 25, 'category': 'умеренная', 'label': 'умеренная депрессия', 'color': '🟠',
+             'recommendation': "⚠️ Рекомендуется обратиться к специалисту для получения поддержки и консультации."},
+            {'upper': 50, 'category': 'тяжелая', 'label': 'тяжелая депрессия', 'color': '🔴',
+             'recommendation': "🚨 Настоятельно рекомендуется консультация психотерапевта или психиатра."},
+            {'upper': 100, 'category': 'крайне_тяжелая', 'label': 'крайне тяжелая депрессия', 'color': '🔴',
+             'recommendation': "🚨 Необходима немедленная помощь специалиста. Обратитесь к врачу как можно скорее."},
+        ),
+    },
+    'isi': {
+        'scales': {'isi': {'items': None, 'level_column': 'isi_level'}},
+        'heading': 'Качество сна',
+        'tail': "\n\n{color} ",
+        'bands': (
+            {'upper': 7, 'category': 'нет_бессонницы', 'label': 'отсутствие клинически значимой бессонницы', 'color': '🟢',
+             'recommendation': "✅ У вас хорошее качество сна."},
+            {'upper': 14, 'category': 'подпороговая', 'label': 'подпороговая бессонница', 'color': '🟡',
+             'recommendation': "💡 Легкие нарушения сна. Обратите внимание на гигиену сна: регулярный режим, комфортная обстановка в спальне."},
+            {'upper': 21, 'category': 'умеренная', 'label': 'клиническая бессонница умеренной тяжести', 'color': '🟠',
+             'recommendation': "⚠️ Рекомендуется консультация врача для оценки причин нарушений сна и подбора лечения."},
+            {'upper': 28, 'category': 'тяжелая', 'label': 'тяжелая клиническая бессонница', 'color': '🔴',
+             'recommendation': "🚨 Необходима консультация сомнолога или невролога для комплексного обследования и лечения."},
+        ),
+    },
+    'stop_bang': {
+        'scales': {'stop_bang': {'items': None, 'level_column': 'stop_bang_risk'}},
+        'heading': 'Риск апноэ сна',
+        'tail': "\n\n{color} ",
+        'bands': (
+            {'upper': 2, 'category': 'низкий', 'label': 'низкий риск', 'color': '🟢',
+             'recommendation': "✅ У вас низкий риск синдрома обструктивного апноэ сна."},
+            {'upper': 4, 'category': 'умеренный', 'label': 'умеренный риск', 'color': '🟡',
+             'recommendation': "⚠️ Умеренный риск апноэ сна. Рекомендуется обратиться к врачу для дополнительного обследования."},
+            {'upper': 8, 'category': 'высокий', 'label': 'высокий риск', 'color': '🔴',
+             'recommendation': "🚨 Высокий риск синдрома обструктивного апноэ сна. Настоятельно рекомендуется консультация сомнолога и полисомнография."},
+        ),
+    },
+    'ess': {
+        'scales': {'ess': {'items': None, 'level_column': 'ess_level'}},
+        'heading': 'Дневная сонливость',
+        'tail': "\n\n{color} ",
+        'bands': (
+            {'upper': 10, 'category': 'норма', 'label': 'нормальная дневная сонливость', 'color': '🟢',
+             'recommendation': "✅ Уровень дневной сонливости в пределах нормы."},
+            {'upper': 12, 'category': 'легкая', 'label': 'легкая дневная сонливость', 'color': '🟡',
+             'recommendation': "💡 Легкая дневная сонливость. Обратите внимание на качество ночного сна и режим дня."},
+            {'upper': 15, 'category': 'умеренная', 'label': 'умеренная дневная сонливость', 'color': '🟠',
+             'recommendation': "⚠️ Умеренная дневная сонливость. Рекомендуется консультация врача для выявления причин."},
+            {'upper': 24, 'category': 'выраженная', 'label': 'выраженная дневная сонливость', 'color': '🔴',
+             'recommendation': "🚨 Выраженная дневная сонливость. Необходима консультация сомнолога для исключения нарушений сна."},
+        ),
+    },
+    'fagerstrom': {
+        'scales': {'fagerstrom': {'items': None, 'level_column': 'fagerstrom_level'}},
+        'heading': 'Никотиновая зависимость',
+        'tail': "\n\n{color}\n\n\n🎯 <b>Шансы на успех при отказе:</b> {success_rate}",
+        'bands': (
+            {'upper': 2, 'category': 'очень_слабая', 'label': 'очень слабая зависимость', 'color': '🟡', 'success_rate': '85-90%',
+             'recommendation': "💡 У вас минимальная никотиновая зависимость. Отличное время для отказа от курения!"},
+            {'upper': 4, 'category': 'слабая', 'label': 'слабая зависимость', 'color': '🟠', 'success_rate': '70-80%',
+             'recommendation': "⚠️ Слабая никотиновая зависимость. Рекомендуется обратиться к врачу за помощью в отказе от курения."},
+            {'upper': 6, 'category': 'средняя', 'label': 'средняя зависимость', 'color': '🔴', 'success_rate': '50-60%',
+             'recommendation': "🚨 Средняя никотиновая зависимость. Необходима профессиональная помощь и медикаментозная поддержка."},
+            {'upper': 7, 'category': 'сильная', 'label': 'сильная зависимость', 'color': '🔴', 'success_rate': '30-40%',
+             'recommendation': "🚨 Сильная никотиновая зависимость. Настоятельно рекомендуется комплексная программа отказа под наблюдением врача."},
+            {'upper': 10, 'category': 'очень_сильная', 'label': 'очень сильная зависимость', 'color': '🔴', 'success_rate': '15-25%',
+             'recommendation': "🚨 Очень сильная никотиновая зависимость. Необходима срочная медицинская помощь в отказе от курения."},
+        ),
+    },
+    'audit': {
+        'scales': {'audit': {'items': None, 'level_column': 'audit_level'}},
+        'heading': 'Потребление алкоголя',
+        'tail': "\n\n{color} ",
+        'bands': (
+            {'upper': 7, 'category': 'низкий', 'label': 'низкий риск', 'color': '🟢',
+             'recommendation': "✅ Ваше потребление алкоголя находится в безопасных пределах."},
+            {'upper': 15, 'category': 'опасное', 'label': 'опасное потребление', 'color': '🟡',
+             'recommendation': "⚠️ Опасное потребление алкоголя. Рекомендуется снизить употребление и обратиться к врачу за консультацией."},
+            {'upper': 19, 'category': 'вредное', 'label': 'вредное потребление', 'color': '🟠',
+             'recommendation': "🚨 Вредное потребление алкоголя. Необходима консультация нарколога и программа снижения потребления."},
+            {'upper': 40, 'category': 'зависимость', 'label': 'возможная алкогольная зависимость', 'color': '🔴',
+             'recommendation': "🚨 Высокий риск алкогольной зависимости. Настоятельно рекомендуется срочная консультация нарколога."},
+        ),
+    },
+}
+
+
+def _compile_scoring():
+    """Развернуть TEST_SCORING в плоские таблицы поиска (один раз при импорте)
+
+    Для каждого теста - кортеж "номер вопроса -> индекс подшкалы", для каждой
+    подшкалы - кортеж "балл -> индекс диапазона" и готовые тексты диапазонов,
+    поэтому подсчет и интерпретация сводятся к обращениям по индексу.
+    """
+    item_scales, test_scales = {}, {}
+    scale_bands, band_by_score, scale_texts = {}, {}, {}
+    norms, level_columns = {}, {}
+
+    for test_type, spec in TEST_SCORING.items():
+        names = tuple(spec['scales'])
+        questions = TEST_QUESTIONS[test_type]
+        item_scales[test_type] = tuple(
+            next(
+                (index for index, name in enumerate(names)
+                 if spec['scales'][name]['items'] in (None, question.get('type'))),
+                len(names) - 1,
+            )
+            for question in questions
+        )
+        test_scales[test_type] = names
+
+        bands = _freeze(list(spec['bands']))
+        lookup = []
+        lower = 0
+        for index, band in enumerate(bands):
+            lookup.extend([index] * (band['upper'] - lower + 1))
+            lower = band['upper'] + 1
+
+        texts = tuple(
+            f"<b>{spec['heading']}:</b> {band['label']}\n\n{band['recommendation']}"
+            + band.get('tail', spec['tail']).format(**band)
+            for band in bands
+        ) if 'heading' in spec else ()
+
+        for name, scale in spec['scales'].items():
+            scale_bands[name] = bands
+            band_by_score[name] = tuple(lookup)
+            scale_texts[name] = texts
+            level_columns[scale['level_column']] = name
+            lower = 0
+            norms[name] = {}
+            for band in bands:
+                norms[name][band['category']] = (lower, band['upper'])
+                lower = band['upper'] + 1
+
+    return item_scales, test_scales, scale_bands, band_by_score, scale_texts, norms, level_columns
+
+
+(
+    _ITEM_SCALES,      # тест -> (индекс подшкалы для каждого вопроса)
+    _TEST_SCALES,      # тест -> (названия подшкал)
+    _SCALE_BANDS,      # подшкала -> (диапазоны)
+    _BAND_BY_SCORE,    # подшкала -> (индекс диапазона для балла 0..max)
+    _SCALE_TEXTS,      # подшкала -> (текст интерпретации для диапазона)
+    TEST_NORMS,        # подшкала -> {категория: (min, max)}
+    TEST_LEVEL_COLUMNS,  # колонка уровня в test_results -> подшкала
+) = _compile_scoring()
+
+# Допустимые диапазоны баллов: колонка балла -> (min, max)
+SCORE_LIMITS = {
+    f"{scale}_score": (0, len(lookup) - 1) for scale, lookup in _BAND_BY_SCORE.items()
+}
+
 # ============================================================================
 # ФУНКЦИИ РАСЧЕТА РЕЗУЛЬТАТОВ
 # ============================================================================
 
+def score_test(test_type: str, answers: List[int]) -> Dict[str, int]:
+    """Баллы подшкал теста по ответам: {"<подшкала>_score": сумма}
+
+    Ответы сверх числа вопросов не учитываются.
+    """
+    scales = _TEST_SCALES[test_type]
+    item_scales = _ITEM_SCALES[test_type]
+    sums = [0] * len(scales)
+    for scale_index, answer in zip(item_scales, answers):
+        sums[scale_index] += answer
+    return {f"{scale}_score": total for scale, total in zip(scales, sums)}
+
 def calculate_hads_scores(answers: List[int]) -> Tuple[int, int]:
     """Рассчитывает баллы тревоги и депрессии для HADS"""
-    questions = get_hads_questions()
-    anxiety_score = 0
-    depression_score = 0
-    
-    for i, answer in enumerate(answers):
-        if i < len(questions):
-            if questions[i]["type"] == "anxiety":
-                anxiety_score += answer
-            else:
-                depression_score += answer
-    
-    return anxiety_score, depression_score
+    scores = score_test('hads', answers)
+    return scores['hads_anxiety_score'], scores['hads_depression_score']
+
+def get_band_index(scale: str, score: int) -> int:
+    """Индекс нормативного диапазона балла (баллы вне шкалы - к крайним диапазонам)"""
+    lookup = _BAND_BY_SCORE[scale]
+    return lookup[min(max(int(score), 0), len(lookup) - 1)]
+
+def get_risk_category(test_type: str, score: int) -> str:
+    """Определение категории риска по баллам теста"""
+    if test_type not in _BAND_BY_SCORE:
+        return 'неопределено'
+    return _SCALE_BANDS[test_type][get_band_index(test_type, score)]['category']
+
+def get_level_values(scores: Mapping[str, Any]) -> Dict[str, Any]:
+    """Уровни для колонок test_results по баллам (None, если балла нет)"""
+    levels = {}
+    for column, scale in TEST_LEVEL_COLUMNS.items():
+        score = scores.get(f"{scale}_score")
+        levels[column] = get_risk_category(scale, score) if score is not None else None
+    return levels
 
 def validate_test_scores(**scores) -> Dict[str, Any]:
     """Валидация результатов тестов"""
-    validation_rules = {
-        'hads_anxiety_score': (0, 21),
-        'hads_depression_score': (0, 21),
-        'burns_score': (0, 100),
-        'isi_score': (0, 28),
-        'stop_bang_score': (0, 8),
-        'ess_score': (0, 24),
-        'fagerstrom_score': (0, 10),
-        'audit_score': (0, 40)
-    }
-    
     errors = []
     for test_name, score in scores.items():
-        if test_name in validation_rules and score is not None:
-            min_val, max_val = validation_rules[test_name]
+        if test_name in SCORE_LIMITS and score is not None:
+            min_val, max_val = SCORE_LIMITS[test_name]
             if not (min_val <= score <= max_val):
                 errors.append(f"Некорректное значение для {test_name}: {score} (должно быть {min_val}-{max_val})")
     
@@ -665,608 +838,318 @@ def validate_test_scores(**scores) -> Dict[str, Any]:
 # ФУНКЦИИ ИНТЕРПРЕТАЦИИ РЕЗУЛЬТАТОВ
 # ============================================================================
 
+def get_test_interpretation(test_type: str, scores: Mapping[str, int]) -> str:
+    """Текст результата теста по баллам подшкал (как возвращает score_test)"""
+    scales = _TEST_SCALES[test_type]
+    if len(scales) == 1:
+        scale = scales[0]
+        return _SCALE_TEXTS[scale][get_band_index(scale, scores[f"{scale}_score"])]
+
+    # Несколько подшкал: строка на каждую и рекомендация по худшей из них
+    lines = []
+    worst = 0
+    for scale in scales:
+        score = scores[f"{scale}_score"]
+        band_index = get_band_index(scale, score)
+        worst = max(worst, band_index)
+        title = TEST_SCORING[test_type]['scales'][scale]['title']
+        lines.append(f"<b>{title}:</b> {score} баллов - {_SCALE_BANDS[scale][band_index]['label']}\n")
+    return "".join(lines) + "\n" + _SCALE_BANDS[scales[0]][worst]['recommendation']
+
 def get_hads_interpretation(anxiety_score: int, depression_score: int) -> str:
     """Интерпретация результатов HADS"""
-    def get_level(score: int) -> str:
-        if score <= 7:
-            return "норма"
-        elif score <= 10:
-            return "субклинически выраженные симптомы"
-        else:
-            return "клинически выраженные симптомы"
-    
-    anxiety_level = get_level(anxiety_score)
-    depression_level = get_level(depression_score)
-    
-    result = f"<b>Тревога:</b> {anxiety_score} баллов - {anxiety_level}\n"
-    result += f"<b>Депрессия:</b> {depression_score} баллов - {depression_level}\n\n"
-    
-    if anxiety_score > 10 or depression_score > 10:
-        result += "🚨 <b>Рекомендация:</b> Рекомендуется консультация специалиста (психолога, психотерапевта) для дальнейшей оценки и возможной помощи."
-    elif anxiety_score > 7 or depression_score > 7:
-        result += "⚠️ <b>Рекомендация:</b> Обратите внимание на свое эмоциональное состояние. Рассмотрите возможность работы со стрессом, релаксационные техники."
-    else:
-        result += "✅ <b>Результат:</b> Ваши показатели тревоги и депрессии находятся в пределах нормы."
-    
-    return result
+    return get_test_interpretation(
+        'hads', {'hads_anxiety_score': anxiety_score, 'hads_depression_score': depression_score}
+    )
 
 def get_burns_interpretation(score: int) -> str:
     """Интерпретация результатов теста Бернса"""
-    if score <= 5:
-        level = "минимальная депрессия"
-        color = "🟢"
-        recommendation = "✅ Ваше эмоциональное состояние в норме."
-    elif score <= 10:
-        level = "легкая депрессия"
-        color = "🟡"
-        recommendation = "💡 Легкие признаки сниженного настроения. Обратите внимание на режим дня, физическую активность и качество сна."
-    elif score <= 25:
-        level = "умеренная депрессия"
-        color = "🟠"
-        recommendation = "⚠️ Рекомендуется обратиться к специалисту для получения поддержки и консультации."
-    elif score <= 50:
-        level = "тяжелая депрессия"
-        color = "🔴"
-        recommendation = "🚨 Настоятельно рекомендуется консультация психотерапевта или психиатра."
-    else:
-        level = "крайне тяжелая депрессия"
-        color = "🔴"
-        recommendation = "🚨 Необходима немедленная помощь специалиста. Обратитесь к врачу как можно скорее."
-    
-    cardio_impact = ""
-    if score > 10:
-        cardio_impact = f"\n\n{color}"
-    
-    return f"<b>Уровень депрессии:</b> {level}\n\n{recommendation}{cardio_impact}"
+    return get_test_interpretation('burns', {'burns_score': score})
 
 def get_isi_interpretation(score: int) -> str:
     """Интерпретация результатов теста ISI"""
-    if score <= 7:
-        level = "отсутствие клинически значимой бессонницы"
-        color = "🟢"
-        recommendation = "✅ У вас хорошее качество сна."
-    elif score <= 14:
-        level = "подпороговая бессонница"
-        color = "🟡"
-        recommendation = "💡 Легкие нарушения сна. Обратите внимание на гигиену сна: регулярный режим, комфортная обстановка в спальне."
-    elif score <= 21:
-        level = "клиническая бессонница умеренной тяжести"
-        color = "🟠"
-        recommendation = "⚠️ Рекомендуется консультация врача для оценки причин нарушений сна и подбора лечения."
-    else:
-        level = "тяжелая клиническая бессонница"
-        color = "🔴"
-        recommendation = "🚨 Необходима консультация сомнолога или невролога для комплексного обследования и лечения."
-    
-    sleep_tips = f"""\n\n{color} """
-    
-    return f"<b>Качество сна:</b> {level}\n\n{recommendation}{sleep_tips}"
+    return get_test_interpretation('isi', {'isi_score': score})
 
 def get_stop_bang_interpretation(score: int) -> str:
     """Интерпретация результатов теста STOP-BANG"""
-    if score <= 2:
-        risk = "низкий риск"
-        color = "🟢"
-        recommendation = "✅ У вас низкий риск синдрома обструктивного апноэ сна."
-    elif score <= 4:
-        risk = "умеренный риск"
-        color = "🟡"
-        recommendation = "⚠️ Умеренный риск апноэ сна. Рекомендуется обратиться к врачу для дополнительного обследования."
-    else:
-        risk = "высокий риск"
-        color = "🔴"
-        recommendation = "🚨 Высокий риск синдрома обструктивного апноэ сна. Настоятельно рекомендуется консультация сомнолога и полисомнография."
-    
-    cardio_risks = f"""\n\n{color} """
-    
-    return f"<b>Риск апноэ сна:</b> {risk}\n\n{recommendation}{cardio_risks}"
+    return get_test_interpretation('stop_bang', {'stop_bang_score': score})
 
 def get_ess_interpretation(score: int) -> str:
     """Интерпретация результатов теста ESS"""
-    if score <= 10:
-        level = "нормальная дневная сонливость"
-        color = "🟢"
-        recommendation = "✅ Уровень дневной сонливости в пределах нормы."
-    elif score <= 12:
-        level = "легкая дневная сонливость"
-        color = "🟡"
-        recommendation = "💡 Легкая дневная сонливость. Обратите внимание на качество ночного сна и режим дня."
-    elif score <= 15:
-        level = "умеренная дневная сонливость"
-        color = "🟠"
-        recommendation = "⚠️ Умеренная дневная сонливость. Рекомендуется консультация врача для выявления причин."
-    else:
-        level = "выраженная дневная сонливость"
-        color = "🔴"
-        recommendation = "🚨 Выраженная дневная сонливость. Необходима консультация сомнолога для исключения нарушений сна."
-    
-    safety_info = f"""\n\n{color} """
-    
-    return f"<b>Дневная сонливость:</b> {level}\n\n{recommendation}{safety_info}"
+    return get_test_interpretation('ess', {'ess_score': score})
 
 def get_fagerstrom_interpretation(score: int) -> str:
     """Интерпретация результатов теста Фагерстрема"""
-    if score <= 2:
-        level = "очень слабая зависимость"
-        color = "🟡"
-        recommendation = "💡 У вас минимальная никотиновая зависимость. Отличное время для отказа от курения!"
-        success_rate = "85-90%"
-    elif score <= 4:
-        level = "слабая зависимость"
-        color = "🟠"
-        recommendation = "⚠️ Слабая никотиновая зависимость. Рекомендуется обратиться к врачу за помощью в отказе от курения."
-        success_rate = "70-80%"
-    elif score <= 6:
-        level = "средняя зависимость"
-        color = "🔴"
-        recommendation = "🚨 Средняя никотиновая зависимость. Необходима профессиональная помощь и медикаментозная поддержка."
-        success_rate = "50-60%"
-    elif score <= 7:
-        level = "сильная зависимость"
-        color = "🔴"
-        recommendation = "🚨 Сильная никотиновая зависимость. Настоятельно рекомендуется комплексная программа отказа под наблюдением врача."
-        success_rate = "30-40%"
-    else:
-        level = "очень сильная зависимость"
-        color = "🔴"
-        recommendation = "🚨 Очень сильная никотиновая зависимость. Необходима срочная медицинская помощь в отказе от курения."
-        success_rate = "15-25%"
-    
-    cardio_impact = f"""\n\n{color}
-
-
-🎯 <b>Шансы на успех при отказе:</b> {success_rate}"""
-    return f"<b>Никотиновая зависимость:</b> {level}\n\n{recommendation}{cardio_impact}"
+    return get_test_interpretation('fagerstrom', {'fagerstrom_score': score})
 
 def get_audit_interpretation(score: int) -> str:
     """Интерпретация результатов теста AUDIT"""
-    if score <= 7:
-        level = "низкий риск"
-        color = "🟢"
-        recommendation = "✅ Ваше потребление алкоголя находится в безопасных пределах."
-    elif score <= 15:
-        level = "опасное потребление"
-        color = "🟡"
-        recommendation = "⚠️ Опасное потребление алкоголя. Рекомендуется снизить употребление и обратиться к врачу за консультацией."
-    elif score <= 19:
-        level = "вредное потребление"
-        color = "🟠"
-        recommendation = "🚨 Вредное потребление алкоголя. Необходима консультация нарколога и программа снижения потребления."
-    else:
-        level = "возможная алкогольная зависимость"
-        color = "🔴"
-        recommendation = "🚨 Высокий риск алкогольной зависимости. Настоятельно рекомендуется срочная консультация нарколога."
-    
-    cardio_info = f"""\n\n{color} """
-    
-    return f"<b>Потребление алкоголя:</b> {level}\n\n{recommendation}{cardio_info}"
+    return get_test_interpretation('audit', {'audit_score': score})
 
 # ============================================================================
 # КОМПЛЕКСНАЯ ОЦЕНКА РИСКОВ
 # ============================================================================
 
-def calculate_overall_cardiovascular_risk(user_data: Dict, survey_data: Dict, test_data: Dict) -> Dict[str, Any]:
-    """Расчет общего сердечно-сосудистого риска"""
-    risk_factors = []
-    risk_score = 0
-    
+# Правила общего сердечно-сосудистого риска: (источник, поле, сравнение, ступени).
+# Ступени (порог, баллы, фактор) идут от старшей к младшей, засчитывается первая
+# подходящая. Отсутствующие значения фактор не дают. Одни и те же правила
+# используются для одного пользователя и для пакетного расчета по всей базе.
+CV_RISK_RULES: Tuple[Tuple[str, str, str, Tuple[Tuple[Any, int, str], ...]], ...] = (
     # Демографические факторы риска
-    age = survey_data.get('age', 0)
-    if age > 45:
-        risk_factors.append("Возраст старше 45 лет")
-        risk_score += 2
-    elif age > 35:
-        risk_factors.append("Возраст старше 35 лет")
-        risk_score += 1
-    
-    if survey_data.get('gender') == 'Мужской':
-        risk_factors.append("Мужской пол")
-        risk_score += 1
-    
+    ('survey', 'age', '>', (
+        (45, 2, "Возраст старше 45 лет"),
+        (35, 1, "Возраст старше 35 лет"),
+    )),
+    ('survey', 'gender', '==', ((
+        'Мужской', 1, "Мужской пол"),
+    )),
     # Анамнестические факторы
-    if survey_data.get('heart_disease') == 'Да':
-        risk_factors.append("Заболевания сердца в анамнезе")
-        risk_score += 4
-    
+    ('survey', 'heart_disease', '==', (
+        ('Да', 4, "Заболевания сердца в анамнезе"),
+    )),
     # Самооценка здоровья и риска
-    health_rating = survey_data.get('health_rating', 10)
-    if health_rating <= 5:
-        risk_factors.append("Низкая самооценка здоровья")
-        risk_score += 1
-    
-    cv_risk = survey_data.get('cv_risk', '')
-    if cv_risk == 'очень высокий':
-        risk_factors.append("Высокая самооценка сердечно-сосудистого риска")
-        risk_score += 2
-    elif cv_risk == 'высокий':
-        risk_factors.append("Повышенная самооценка сердечно-сосудистого риска")
-        risk_score += 1
-    
+    ('survey', 'health_rating', '<=', (
+        (5, 1, "Низкая самооценка здоровья"),
+    )),
+    ('survey', 'cv_risk', '==', (
+        ('очень высокий', 2, "Высокая самооценка сердечно-сосудистого риска"),
+        ('высокий', 1, "Повышенная самооценка сердечно-сосудистого риска"),
+    )),
     # Психоэмоциональные факторы
-    hads_anxiety = test_data.get('hads_anxiety_score', 0)
-    if hads_anxiety >= 11:
-        risk_factors.append("Клинически значимая тревога")
-        risk_score += 2
-    elif hads_anxiety >= 8:
-        risk_factors.append("Субклиническая тревога")
-        risk_score += 1
-    
-    hads_depression = test_data.get('hads_depression_score', 0)
-    if hads_depression >= 11:
-        risk_factors.append("Клинически значимая депрессия")
-        risk_score += 3
-    elif hads_depression >= 8:
-        risk_factors.append("Субклиническая депрессия")
-        risk_score += 1
-    
-    burns_score = test_data.get('burns_score', 0)
-    if burns_score >= 25:
-        risk_factors.append("Выраженное эмоциональное выгорание")
-        risk_score += 2
-    elif burns_score >= 11:
-        risk_factors.append("Умеренное эмоциональное выгорание")
-        risk_score += 1
-    
+    ('tests', 'hads_anxiety_score', '>=', (
+        (11, 2, "Клинически значимая тревога"),
+        (8, 1, "Субклиническая тревога"),
+    )),
+    ('tests', 'hads_depression_score', '>=', (
+        (11, 3, "Клинически значимая депрессия"),
+        (8, 1, "Субклиническая депрессия"),
+    )),
+    ('tests', 'burns_score', '>=', (
+        (25, 2, "Выраженное эмоциональное выгорание"),
+        (11, 1, "Умеренное эмоциональное выгорание"),
+    )),
     # Нарушения сна
-    isi_score = test_data.get('isi_score', 0)
-    if isi_score >= 15:
-        risk_factors.append("Клиническая бессонница")
-        risk_score += 2
-    elif isi_score >= 8:
-        risk_factors.append("Субклиническая бессонница")
-        risk_score += 1
-    
-    stop_bang_score = test_data.get('stop_bang_score', 0)
-    if stop_bang_score >= 5:
-        risk_factors.append("Высокий риск апноэ сна")
-        risk_score += 3
-    elif stop_bang_score >= 3:
-        risk_factors.append("Умеренный риск апноэ сна")
-        risk_score += 1
-    
-    ess_score = test_data.get('ess_score', 0)
-    if ess_score >= 16:
-        risk_factors.append("Выраженная дневная сонливость")
-        risk_score += 1
-    
+    ('tests', 'isi_score', '>=', (
+        (15, 2, "Клиническая бессонница"),
+        (8, 1, "Субклиническая бессонница"),
+    )),
+    ('tests', 'stop_bang_score', '>=', (
+        (5, 3, "Высокий риск апноэ сна"),
+        (3, 1, "Умеренный риск апноэ сна"),
+    )),
+    ('tests', 'ess_score', '>=', (
+        (16, 1, "Выраженная дневная сонливость"),
+    )),
     # Вредные привычки
-    fagerstrom_score = test_data.get('fagerstrom_score', 0)
-    if fagerstrom_score and fagerstrom_score >= 7:
-        risk_factors.append("Сильная никотиновая зависимость")
-        risk_score += 4
-    elif fagerstrom_score and fagerstrom_score >= 5:
-        risk_factors.append("Умеренная никотиновая зависимость")
-        risk_score += 3
-    elif fagerstrom_score and fagerstrom_score >= 3:
-        risk_factors.append("Слабая никотиновая зависимость")
-        risk_score += 2
-    elif fagerstrom_score and fagerstrom_score > 0:
-        risk_factors.append("Курение")
-        risk_score += 1
+    ('tests', 'fagerstrom_score', '>=', (
+        (7, 4, "Сильная никотиновая зависимость"),
+        (5, 3, "Умеренная никотиновая зависимость"),
+        (3, 2, "Слабая никотиновая зависимость"),
+        (1, 1, "Курение"),
+    )),
+    ('tests', 'audit_score', '>=', (
+        (20, 3, "Возможная алкогольная зависимость"),
+        (16, 2, "Вредное употребление алкоголя"),
+        (8, 1, "Опасное употребление алкоголя"),
+    )),
+)
+
+# Уровни риска: (верхняя граница балла, уровень, цвет, рекомендация); последний - без границы
+CV_RISK_LEVELS: Tuple[Tuple[Any, str, str, str], ...] = (
+    (3, "НИЗКИЙ", "🟢", "Ваш риск сердечно-сосудистых заболеваний низкий. Продолжайте вести здоровый образ жизни."),
+    (6, "УМЕРЕННЫЙ", "🟡", "У вас умеренный риск. Рекомендуется консультация кардиолога и коррекция образа жизни."),
+    (10, "ВЫСОКИЙ", "🟠", "Высокий риск! Необходима срочная консультация кардиолога и комплексное обследование."),
+    (None, "ОЧЕНЬ ВЫСОКИЙ", "🔴", "Критически высокий риск! Немедленно обратитесь к кардиологу для экстренного обследования."),
+)
+
+_CV_RISK_UPPERS = np.array([level[0] for level in CV_RISK_LEVELS[:-1]])
+_CV_RISK_LEVEL_NAMES = np.array([level[1] for level in CV_RISK_LEVELS], dtype=object)
+
+# Поля, нужные для расчета риска (колонки для пакетного расчета)
+CV_RISK_FIELDS = tuple(field for _, field, _, _ in CV_RISK_RULES)
+CV_RISK_SURVEY_FIELDS = tuple(field for source, field, _, _ in CV_RISK_RULES if source == 'survey')
+CV_RISK_TEST_FIELDS = tuple(field for source, field, _, _ in CV_RISK_RULES if source == 'tests')
+
+_COMPARE = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+def _cv_risk_level_index(risk_score: int) -> int:
+    for index, (upper, _, _, _) in enumerate(CV_RISK_LEVELS[:-1]):
+        if risk_score <= upper:
+            return index
+    return len(CV_RISK_LEVELS) - 1
+
+def calculate_overall_cardiovascular_risk(user_data: Dict, survey_data: Dict, test_data: Dict) -> Dict[str, Any]:
+    """Расчет общего сердечно-сосудистого риска"""
+    sources = {'survey': survey_data or {}, 'tests': test_data or {}}
+    risk_factors = []
+    risk_score = 0
     
-    audit_score = test_data.get('audit_score', 0)
-    if audit_score and audit_score >= 20:
-        risk_factors.append("Возможная алкогольная зависимость")
-        risk_score += 3
-    elif audit_score and audit_score >= 16:
-        risk_factors.append("Вредное употребление алкоголя")
-        risk_score += 2
-    elif audit_score and audit_score >= 8:
-        risk_factors.append("Опасное употребление алкоголя")
-        risk_score += 1
+    for source, field, op, steps in CV_RISK_RULES:
+        value = sources[source].get(field)
+        if value is None:
+            continue
+        compare = _COMPARE[op]
+        for threshold, points, factor in steps:
+            if compare(value, threshold):
+                risk_factors.append(factor)
+                risk_score += points
+                break
     
-    # Определяем уровень риска
-    if risk_score <= 3:
-        risk_level = "НИЗКИЙ"
-        risk_color = "🟢"
-        recommendation = "Ваш риск сердечно-сосудистых заболеваний низкий. Продолжайте вести здоровый образ жизни и проходите профилактические осмотры."
-    elif risk_score <= 7:
-        risk_level = "УМЕРЕННЫЙ"
-        risk_color = "🟡"
-        recommendation = "У вас умеренный риск. Рекомендуется профилактическое обследование и коррекция выявленных факторов риска."
-    elif risk_score <= 12:
-        risk_level = "ВЫСОКИЙ"
-        risk_color = "🟠"
-        recommendation = "Высокий риск сердечно-сосудистых заболеваний. Необходима консультация кардиолога и активная профилактика."
-    else:
-        risk_level = "ОЧЕНЬ ВЫСОКИЙ"
-        risk_color = "🔴"
-        recommendation = "Очень высокий риск. Срочно обратитесь к кардиологу для комплексного обследования и лечения."
+    _, risk_level, risk_color, recommendation = CV_RISK_LEVELS[_cv_risk_level_index(risk_score)]
     
     return {
-        'risk_level': risk_level,
         'risk_score': risk_score,
-        'risk_factors': risk_factors,
+        'risk_level': risk_level,
         'risk_color': risk_color,
-        'recommendation': recommendation,
-        'factors_count': len(risk_factors)
+        'factors_count': len(risk_factors),
+        'risk_factors': risk_factors,
+        'recommendation': recommendation
     }
 
-def generate_personalized_recommendations(risk_assessment: Dict, test_data: Dict) -> str:
-    """Генерация персональных рекомендаций"""
-    recommendations = []
-    
-    # Базовые рекомендации
-    recommendations.append("🫀 <b>БАЗОВЫЕ РЕКОМЕНДАЦИИ ДЛЯ ЗДОРОВЬЯ СЕРДЦА:</b>")
-    recommendations.append("• Регулярная физическая активность: минимум 150 минут в неделю")
-    recommendations.append("• Средиземноморская диета: больше овощей, рыбы, оливкового масла")
-    recommendations.append("• Контроль веса: ИМТ в пределах 18,5-24,9 кг/м²")
-    recommendations.append("• Ограничение соли: не более 5г в день")
-    recommendations.append("• Регулярное измерение артериального давления")
-    
-    # Специфические рекомендации
-    hads_anxiety = test_data.get('hads_anxiety_score', 0)
-    hads_depression = test_data.get('hads_depression_score', 0)
-    
-    if hads_anxiety >= 8 or hads_depression >= 8:
-        recommendations.append("\n😰 <b>УПРАВЛЕНИЕ СТРЕССОМ И НАСТРОЕНИЕМ:</b>")
-        recommendations.append("• Техники релаксации: медитация, глубокое дыхание")
-        recommendations.append("• Регулярная физическая активность для снижения стресса")
-        recommendations.append("• Достаточный сон: 7-9 часов в сутки")
-        recommendations.append("• Социальная поддержка: общение с близкими")
-        
-        if hads_anxiety >= 11 or hads_depression >= 11:
-            recommendations.append("• 🚨 ОБЯЗАТЕЛЬНО: консультация психотерапевта")
-    
-    isi_score = test_data.get('isi_score', 0)
-    if isi_score >= 8:
-        recommendations.append("\n😴 <b>УЛУЧШЕНИЕ КАЧЕСТВА СНА:</b>")
-        recommendations.append("• Соблюдение режима: ложиться и вставать в одно время")
-        recommendations.append("• Комфортная среда: температура 18-20°C, темнота, тишина")
-        recommendations.append("• Избегание кофеина после 14:00")
-        recommendations.append("• Отказ от гаджетов за 1 час до сна")
-        recommendations.append("• Релаксация перед сном: чтение, легкая музыка")
-        
-        if isi_score >= 15:
-            recommendations.append("• 🚨 ОБЯЗАТЕЛЬНО: консультация сомнолога")
-    
-    stop_bang_score = test_data.get('stop_bang_score', 0)
-    if stop_bang_score >= 3:
-        recommendations.append("\n😪 <b>ПРОФИЛАКТИКА АПНОЭ СНА:</b>")
-        recommendations.append("• Снижение веса при ожирении")
-        recommendations.append("• Сон на боку (не на спине)")
-        recommendations.append("• Отказ от алкоголя за 3 часа до сна")
-        recommendations.append("• Избегание седативных препаратов")
-        
-        if stop_bang_score >= 5:
-            recommendations.append("• 🚨 СРОЧНО: обследование у сомнолога (полисомнография)")
-    
-    fagerstrom_score = test_data.get('fagerstrom_score')
-    if fagerstrom_score and fagerstrom_score > 0:
-        recommendations.append("\n🚭 <b>ОТКАЗ ОТ КУРЕНИЯ:</b>")
-        recommendations.append("• Назначьте дату отказа от курения")
-        recommendations.append("• Обратитесь к врачу за медикаментозной поддержкой")
-        recommendations.append("• Используйте никотинзаместительную терапию")
-        recommendations.append("• Избегайте триггеров: места и ситуации курения")
-        
-        if fagerstrom_score >= 5:
-            recommendations.append("• 🚨 ОБЯЗАТЕЛЬНО: комплексная программа в наркологической клинике")
-    
-    audit_score = test_data.get('audit_score', 0)
-    if audit_score >= 8:
-        recommendations.append("\n🍷 <b>КОНТРОЛЬ УПОТРЕБЛЕНИЯ АЛКОГОЛЯ:</b>")
-        recommendations.append("• Ведите дневник употребления алкоголя")
-        recommendations.append("• Установите дни полного воздержания")
-        recommendations.append("• Не превышайте безопасные дозы")
-        recommendations.append("• Замените алкогольные напитки безалкогольными")
-        
-        if audit_score >= 16:
-            recommendations.append("• 🚨 ОБЯЗАТЕЛЬНО: консультация нарколога")
-    
-    # Рекомендации по уровню риска
-    risk_level = risk_assessment.get('risk_level', 'НИЗКИЙ')
-    
-    if risk_level in ['ВЫСОКИЙ', 'ОЧЕНЬ ВЫСОКИЙ']:
-            recommendations.append("\n🏥 <b>ДОПОЛНИТЕЛЬНЫЕ МЕРЫ ПРИ ВЫСОКОМ РИСКЕ:</b>")
-            recommendations.append("• Консультация кардиолога в течение месяца")
-            recommendations.append("• Ежедневное измерение АД дома")
-            recommendations.append("• Анализы крови каждые 3-6 месяцев")
-            recommendations.append("• ЭКГ каждые 6 месяцев")
-            recommendations.append("• ЭхоКГ и УЗИ сосудов по показаниям")
-            recommendations.append("• Рассмотрение профилактической терапии")
-        
-    # Экстренные ситуации
-    recommendations.append("\n🚨 <b>КОГДА СРОЧНО ОБРАЩАТЬСЯ К ВРАЧУ:</b>")
-    recommendations.append("• Боль в груди, особенно с иррадиацией в руку, шею")
-    recommendations.append("• Одышка в покое или при небольшой нагрузке")
-    recommendations.append("• АД выше 180/110 мм рт.ст.")
-    recommendations.append("• Учащенное сердцебиение в покое (>100 уд/мин)")
-    recommendations.append("• Головокружение с потерей сознания")
-    recommendations.append("• Отеки ног, особенно к вечеру")
-    
-    return "\n".join(recommendations)
-
-def create_comprehensive_report(user_data: Dict, survey_data: Dict, test_data: Dict) -> str:
-    """Создание комплексного отчета по результатам диагностики"""
-    
-    # Расчет общего риска
-    risk_assessment = calculate_overall_cardiovascular_risk(user_data, survey_data, test_data)
-    
-    # Персональные рекомендации
-    recommendations = generate_personalized_recommendations(risk_assessment, test_data)
-    
-    # Заголовок отчета
-    report = f"""📊 <b>ПЕРСОНАЛЬНЫЙ ОТЧЕТ ПО КАРДИОРИСКУ</b>
-
-👤 <b>Участник:</b> {user_data.get('name', 'Пользователь')}
-📅 <b>Дата:</b> {datetime.now().strftime('%d.%m.%Y')}
-
-{risk_assessment['risk_color']} <b>ОБЩИЙ УРОВЕНЬ РИСКА: {risk_assessment['risk_level']}</b>
-<b>Количество баллов риска:</b> {risk_assessment['risk_score']}
-<b>Выявленных факторов риска:</b> {risk_assessment['factors_count']}
+def _rule_steps(column: pd.Series, op: str, steps) -> np.ndarray:
+    """Номер сработавшей ступени правила для каждой строки (len(steps) - ни одной)"""
+    missed = len(steps)
+    if op == '==':
+        # factorize: код значения в порядке появления, пустые -> -1
+        codes, uniques = pd.factorize(column)
+        lookup = np.array(
+            [
+                next((index for index, (threshold, _, _) in enumerate(steps) if value == threshold), missed)
+                for value in uniques
+            ]
+            + [missed]
+        )
+        return lookup[codes]
 
-<b>🎯 КЛЮЧЕВАЯ РЕКОМЕНДАЦИЯ:</b>
-{risk_assessment['recommendation']}
+    values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    thresholds = np.array([threshold for threshold, _, _ in steps], dtype=float)
+    if op == '<=':
+        # Пороги по возрастанию: первый порог не меньше значения
+        step = np.searchsorted(thresholds, values, side='left')
+    else:
+        # Пороги по убыванию: сколько порогов пройдено с младшего конца
+        passed = np.searchsorted(thresholds[::-1], values, side='right' if op == '>=' else 'left')
+        step = missed - passed
+    return np.where(np.isnan(values), missed, step)
 
-📋 <b>ВЫЯВЛЕННЫЕ ФАКТОРЫ РИСКА:</b>"""
+def calculate_cv_risk_batch(data: pd.DataFrame, with_factors: bool = False) -> pd.DataFrame:
+    """Векторный расчет общего риска для многих пользователей сразу
 
-    if risk_assessment['risk_factors']:
-        for i, factor in enumerate(risk_assessment['risk_factors'], 1):
-            report += f"\n{i}. {factor}"
-    else:
-        report += "\n✅ Значимых факторов риска не выявлено"
-    
-    # Детализированные результаты тестов
-    report += "\n\n📈 <b>ДЕТАЛЬНЫЕ РЕЗУЛЬТАТЫ ТЕСТОВ:</b>"
-    
-    # HADS
-    hads_anxiety = test_data.get('hads_anxiety_score')
-    hads_depression = test_data.get('hads_depression_score')
-    if hads_anxiety is not None and hads_depression is not None:
-        report += f"\n\n🧠 <b>Тревога и депрессия (HADS):</b>"
-        report += f"\n• Тревога: {hads_anxiety} баллов"
-        report += f"\n• Депрессия: {hads_depression} баллов"
-    
-    # Burns
-    burns_score = test_data.get('burns_score')
-    if burns_score is not None:
-        report += f"\n\n💔 <b>Эмоциональное выгорание (Бернс):</b> {burns_score} баллов"
-    
-    # ISI
-    isi_score = test_data.get('isi_score')
-    if isi_score is not None:
-        report += f"\n\n😴 <b>Качество сна (ISI):</b> {isi_score} баллов"
-    
-    # STOP-BANG
-    stop_bang_score = test_data.get('stop_bang_score')
-    if stop_bang_score is not None:
-        report += f"\n\n😪 <b>Риск апноэ сна (STOP-BANG):</b> {stop_bang_score} баллов"
-    
-    # ESS
-    ess_score = test_data.get('ess_score')
-    if ess_score is not None:
-        report += f"\n\n🥱 <b>Дневная сонливость (ESS):</b> {ess_score} баллов"
-    
-    # Fagerstrom
-    fagerstrom_score = test_data.get('fagerstrom_score')
-    if fagerstrom_score is not None:
-        report += f"\n\n🚬 <b>Никотиновая зависимость (Фагерстрем):</b> {fagerstrom_score} баллов"
-    elif test_data.get('fagerstrom_skipped'):
-        report += f"\n\n🚬 <b>Никотиновая зависимость:</b> не курит"
-    
-    # AUDIT
-    audit_score = test_data.get('audit_score')
-    if audit_score is not None:
-        report += f"\n\n🍷 <b>Употребление алкоголя (AUDIT):</b> {audit_score} баллов"
-    elif test_data.get('audit_skipped'):
-        report += f"\n\n🍷 <b>Употребление алкоголя:</b> не употребляет"
-    
-    # Рекомендации
-    report += f"\n\n{recommendations}"
-    
-    # План действий
-    report += f"""\n\n📋 <b>ПЛАН ДЕЙСТВИЙ НА БЛИЖАЙШИЙ МЕСЯЦ:</b>
+    data - колонки CV_RISK_FIELDS (поля опроса и баллы тестов, любые могут
+    отсутствовать), строка на пользователя. Возвращает risk_score, risk_level
+    и factors_count с тем же индексом; при with_factors еще по колонке
+    "factor_<поле>" с названием сработавшего фактора (или None).
+    Результат совпадает с calculate_overall_cardiovascular_risk для каждой строки.
+    """
+    size = len(data)
+    risk_score = np.zeros(size, dtype=np.int64)
+    factors_count = np.zeros(size, dtype=np.int64)
+    factor_columns = {}
+    
+    for _, field, op, steps in CV_RISK_RULES:
+        if field not in data.columns:
+            continue
+        step = _rule_steps(data[field], op, steps)
+        points = np.array([step_points for _, step_points, _ in steps] + [0], dtype=np.int64)
+        risk_score += points[step]
+        factors_count += step < len(steps)
+        if with_factors:
+            factors = np.array([factor for _, _, factor in steps] + [None], dtype=object)
+            factor_columns[f"factor_{field}"] = factors[step]
+    
+    level_index = np.searchsorted(_CV_RISK_UPPERS, risk_score, side='left')
+    return pd.DataFrame(
+        {
+            'risk_score': risk_score,
+            'risk_level': _CV_RISK_LEVEL_NAMES[level_index],
+            'factors_count': factors_count,
+            **factor_columns,
+        },
+        index=data.index,
+    )
 
-🎯 <b>ПРИОРИТЕТ 1:</b>"""
-    
-    priority_actions = []
-    
-    # Определяем приоритетные действия
-    if test_data.get('fagerstrom_score', 0) >= 3:
-        priority_actions.append("• Начать процесс отказа от курения")
-    
-    if test_data.get('stop_bang_score', 0) >= 5:
-        priority_actions.append("• Записаться к сомнологу на обследование")
-    
-    if test_data.get('hads_anxiety_score', 0) >= 11 or test_data.get('hads_depression_score', 0) >= 11:
-        priority_actions.append("• Обратиться к психотерапевту или психиатру")
-    
-    if risk_assessment['risk_level'] in ['ВЫСОКИЙ', 'ОЧЕНЬ ВЫСОКИЙ']:
-        priority_actions.append("• Записаться к кардиологу в течение 2 недель")
-        priority_actions.append("• Начать ежедневный контроль АД")
-    
-    if test_data.get('isi_score', 0) >= 15:
-        priority_actions.append("• Обратиться к врачу по поводу бессонницы")
-    
-    if not priority_actions:
-        priority_actions.append("• Продолжать здоровый образ жизни")
-        priority_actions.append("• Пройти профилактический осмотр у терапевта")
-    
-    report += "\n" + "\n".join(priority_actions)
-    
-    report += f"""\n\n🎯 <b>ПРИОРИТЕТ 2 (в течение месяца):</b>
-• Оптимизировать питание (средиземноморская диета)
-• Увеличить физическую активность до 150 мин/неделю
-• Наладить режим сна (7-9 часов)
-• Освоить техники управления стрессом
-• Сдать базовые анализы крови"""
-    
-    return report
+def build_risk_frame(all_users_data: List[Dict]) -> pd.DataFrame:
+    """Список словарей {"survey": ..., "tests": ...} -> колонки для пакетного расчета"""
+    surveys = [user_data.get('survey') or {} for user_data in all_users_data]
+    tests = [user_data.get('tests') or {} for user_data in all_users_data]
+    columns = {field: [survey.get(field) for survey in surveys] for field in CV_RISK_SURVEY_FIELDS}
+    for field in dict.fromkeys(CV_RISK_TEST_FIELDS + POPULATION_TEST_FIELDS):
+        columns[field] = [test_data.get(field) for test_data in tests]
+    return pd.DataFrame(columns)
 
 # ============================================================================
 # ПОПУЛЯЦИОННАЯ АНАЛИТИКА
 # ============================================================================
 
+# Статистика по тестам: ключ -> (балл теста, порог)
+POPULATION_TEST_THRESHOLDS = {
+    'hads_high_anxiety': ('hads_anxiety_score', 11),
+    'hads_high_depression': ('hads_depression_score', 11),
+    'burns_moderate_plus': ('burns_score', 11),
+    'isi_insomnia': ('isi_score', 8),
+    'stop_bang_high_risk': ('stop_bang_score', 5),
+    'ess_excessive': ('ess_score', 16),
+    'fagerstrom_dependent': ('fagerstrom_score', 5),
+    'audit_risky': ('audit_score', 8),
+}
+POPULATION_TEST_FIELDS = tuple(field for field, _ in POPULATION_TEST_THRESHOLDS.values())
+
+def _population_factor_counts(factors: pd.DataFrame) -> List[Tuple[str, int]]:
+    """Частота факторов риска по убыванию; при равенстве - кто раньше встретился"""
+    counts = []
+    for rule_index, column in enumerate(factors.columns):
+        # factorize нумерует значения в порядке появления, None -> -1
+        codes, uniques = pd.factorize(factors[column])
+        if not len(uniques):
+            continue
+        totals = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        present, first_rows = np.unique(codes, return_index=True)
+        first_rows = first_rows[present >= 0]
+        for code, factor in enumerate(uniques):
+            counts.append((factor, int(totals[code]), (int(first_rows[code]), rule_index)))
+    counts.sort(key=lambda item: (-item[1], item[2]))
+    return [(factor, count) for factor, count, _ in counts]
+
 def analyze_population_risk(all_users_data: List[Dict]) -> str:
-    """Анализ рисков на уровне популяции"""
+    """Анализ рисков на уровне популяции (пакетный расчет по колонкам)"""
     total_users = len(all_users_data)
     if total_users == 0:
         return "Нет данных для анализа"
     
-    # Инициализация счетчиков
-    risk_distribution = {"НИЗКИЙ": 0, "УМЕРЕННЫЙ": 0, "ВЫСОКИЙ": 0, "ОЧЕНЬ ВЫСОКИЙ": 0}
-    age_groups = {"18-30": 0, "31-45": 0, "46-60": 0, "60+": 0}
-    gender_distribution = {"Мужской": 0, "Женский": 0}
-    common_factors = {}
+    data = build_risk_frame(all_users_data)
+    risk = calculate_cv_risk_batch(data, with_factors=True)
     
-    # Статистика по тестам
-    test_stats = {
-        'hads_high_anxiety': 0,
-        'hads_high_depression': 0,
-        'burns_moderate_plus': 0,
-        'isi_insomnia': 0,
-        'stop_bang_high_risk': 0,
-        'ess_excessive': 0,
-        'fagerstrom_dependent': 0,
-        'audit_risky': 0
+    # Распределение по уровню риска
+    level_counts = risk['risk_level'].value_counts()
+    risk_distribution = {level: int(level_counts.get(level, 0)) for _, level, _, _ in CV_RISK_LEVELS}
+    
+    # Возрастные группы
+    age = pd.to_numeric(data['age'], errors='coerce').fillna(0)
+    age_groups = {
+        "18-30": int(((age >= 18) & (age <= 30)).sum()),
+        "31-45": int(((age >= 31) & (age <= 45)).sum()),
+        "46-60": int(((age >= 46) & (age <= 60)).sum()),
+        "60+": int((age > 60).sum()),
     }
     
-    for user_data in all_users_data:
-        survey_data = user_data.get('survey', {})
-        test_data = user_data.get('tests', {})
-        user_info = user_data.get('user', {})
-        
-        # Анализ риска
-        risk_assessment = calculate_overall_cardiovascular_risk(user_info, survey_data, test_data)
-        risk_distribution[risk_assessment['risk_level']] += 1
-        
-        # Возрастные группы
-        age = survey_data.get('age', 0)
-        if 18 <= age <= 30:
-            age_groups["18-30"] += 1
-        elif 31 <= age <= 45:
-            age_groups["31-45"] += 1
-        elif 46 <= age <= 60:
-            age_groups["46-60"] += 1
-        elif age > 60:
-            age_groups["60+"] += 1
-        
-        # Пол
-        gender = survey_data.get('gender', '')
-        if gender in gender_distribution:
-            gender_distribution[gender] += 1
-        
-        # Факторы риска
-        for factor in risk_assessment['risk_factors']:
-            common_factors[factor] = common_factors.get(factor, 0) + 1
-        
-        # Статистика тестов
-        if test_data.get('hads_anxiety_score', 0) >= 11:
-            test_stats['hads_high_anxiety'] += 1
-        if test_data.get('hads_depression_score', 0) >= 11:
-            test_stats['hads_high_depression'] += 1
-        if test_data.get('burns_score', 0) >= 11:
-            test_stats['burns_moderate_plus'] += 1
-        if test_data.get('isi_score', 0) >= 8:
-            test_stats['isi_insomnia'] += 1
-        if test_data.get('stop_bang_score', 0) >= 5:
-            test_stats['stop_bang_high_risk'] += 1
-        if test_data.get('ess_score', 0) >= 16:
-            test_stats['ess_excessive'] += 1
-        if test_data.get('fagerstrom_score', 0) >= 5:
-            test_stats['fagerstrom_dependent'] += 1
-        if test_data.get('audit_score', 0) >= 8:
-            test_stats['audit_risky'] += 1
+    # Пол
+    gender_counts = data['gender'].value_counts()
+    gender_distribution = {gender: int(gender_counts.get(gender, 0)) for gender in ("Мужской", "Женский")}
+    
+    # Факторы риска
+    factor_columns = [column for column in risk.columns if column.startswith('factor_')]
+    common_factors = _population_factor_counts(risk[factor_columns])
+    
+    # Статистика тестов
+    test_stats = {
+        key: int((pd.to_numeric(data[field], errors='coerce').fillna(0) >= threshold).sum())
+        for key, (field, threshold) in POPULATION_TEST_THRESHOLDS.items()
+    }
     
     # Формирование отчета
     report = f"""📈 <b>ПОПУЛЯЦИОННЫЙ АНАЛИЗ КАРДИОРИСКА</b>
@@ -1291,7 +1174,7 @@ def analyze_population_risk(all_users_data: List[Dict]) -> str:
         report += f"\n• {age_group} лет: {count} чел. ({percentage:.1f}%)"
     
     # Топ-5 факторов риска
-    sorted_factors = sorted(common_factors.items(), key=lambda x: x[1], reverse=True)[:5]
+    sorted_factors = common_factors[:5]
     if sorted_factors:
         report += f"""\n\n⚠️ <b>НАИБОЛЕЕ ЧАСТЫЕ ФАКТОРЫ РИСКА:</b>"""
         for i, (factor, count) in enumerate(sorted_factors, 1):
@@ -1353,18 +1236,6 @@ def get_test_norms() -> Dict[str, Dict[str, Tuple[int, int]]]:
     """Получить нормативные значения всех тестов"""
     return TEST_NORMS
 
-def get_risk_category(test_name: str, score: int) -> str:
-    """Определить категорию риска для конкретного теста"""
-    if test_name not in TEST_NORMS:
-        return "неизвестно"
-    
-    norms = TEST_NORMS[test_name]
-    for category, (min_val, max_val) in norms.items():
-        if min_val <= score <= max_val:
-            return category
-    
-    return "вне нормы"
-
 def calculate_test_percentile(test_name: str, score: int, population_scores: List[int]) -> int:
     """Рассчитать процентиль для результата теста"""
     if not population_scores:
@@ -1446,224 +1317,3 @@ def _get_recommendations_summary(risk_assessment: Dict, test_data: Dict) -> List
         recommendations.append("управление стрессом")
     
     return recommendations
-
-def get_risk_category(test_type: str, score: int) -> str:
-    """Определение категории риска по баллам теста"""
-    
-    if test_type == 'hads_anxiety':
-        if score <= 7:
-            return 'норма'
-        elif score <= 10:
-            return 'субклиническая'
-        else:
-            return 'клиническая'
-    
-    elif test_type == 'hads_depression':
-        if score <= 7:
-            return 'норма'
-        elif score <= 10:
-            return 'субклиническая'
-        else:
-            return 'клиническая'
-    
-    elif test_type == 'burns':
-        if score <= 5:
-            return 'минимальная'
-        elif score <= 10:
-            return 'легкая'
-        elif score <= 25:
-            return 'умеренная'
-        elif score <= 50:
-            return 'тяжелая'
-        else:
-            return 'крайне_тяжелая'
-    
-    elif test_type == 'isi':
-        if score <= 7:
-            return 'нет_бессонницы'
-        elif score <= 14:
-            return 'подпороговая'
-        elif score <= 21:
-            return 'умеренная'
-        else:
-            return 'тяжелая'
-    
-    elif test_type == 'stop_bang':
-        if score <= 2:
-            return 'низкий'
-        elif score <= 4:
-            return 'умеренный'
-        else:
-            return 'высокий'
-    
-    elif test_type == 'ess':
-        if score <= 10:
-            return 'норма'
-        elif score <= 12:
-            return 'легкая'
-        elif score <= 15:
-            return 'умеренная'
-        else:
-            return 'выраженная'
-    
-    elif test_type == 'fagerstrom':
-        if score <= 2:
-            return 'очень_слабая'
-        elif score <= 4:
-            return 'слабая'
-        elif score <= 6:
-            return 'средняя'
-        elif score <= 8:
-            return 'сильная'
-        else:
-            return 'очень_сильная'
-    
-    elif test_type == 'audit':
-        if score <= 7:
-            return 'низкий'
-        elif score <= 15:
-            return 'опасное'
-        elif score <= 19:
-            return 'вредное'
-        else:
-            return 'зависимость'
-    
-    return 'неопределено'
-
-def calculate_overall_cardiovascular_risk(user_data: dict, survey_data: dict, test_data: dict) -> dict:
-    """Расчет общего сердечно-сосудистого риска"""
-    
-    risk_factors = []
-    risk_score = 0
-    
-    # Демографические факторы риска
-    age = survey_data.get('age', 0)
-    if age > 45:
-        risk_factors.append("Возраст старше 45 лет")
-        risk_score += 2
-    elif age > 35:
-        risk_factors.append("Возраст старше 35 лет")
-        risk_score += 1
-    
-    if survey_data.get('gender') == 'Мужской':
-        risk_factors.append("Мужской пол")
-        risk_score += 1
-    
-    # Анамнестические факторы
-    if survey_data.get('heart_disease') == 'Да':
-        risk_factors.append("Заболевания сердца в анамнезе")
-        risk_score += 4
-    
-    # Самооценка здоровья и риска
-    health_rating = survey_data.get('health_rating', 10)
-    if health_rating <= 5:
-        risk_factors.append("Низкая самооценка здоровья")
-        risk_score += 1
-    
-    cv_risk = survey_data.get('cv_risk', '')
-    if cv_risk == 'очень высокий':
-        risk_factors.append("Высокая самооценка сердечно-сосудистого риска")
-        risk_score += 2
-    elif cv_risk == 'высокий':
-        risk_factors.append("Повышенная самооценка сердечно-сосудистого риска")
-        risk_score += 1
-    
-    # Психоэмоциональные факторы
-    hads_anxiety = test_data.get('hads_anxiety_score', 0)
-    if hads_anxiety and hads_anxiety >= 11:
-        risk_factors.append("Клинически значимая тревога")
-        risk_score += 2
-    elif hads_anxiety and hads_anxiety >= 8:
-        risk_factors.append("Субклиническая тревога")
-        risk_score += 1
-    
-    hads_depression = test_data.get('hads_depression_score', 0)
-    if hads_depression and hads_depression >= 11:
-        risk_factors.append("Клинически значимая депрессия")
-        risk_score += 3
-    elif hads_depression and hads_depression >= 8:
-        risk_factors.append("Субклиническая депрессия")
-        risk_score += 1
-    
-    burns_score = test_data.get('burns_score', 0)
-    if burns_score and burns_score >= 25:
-        risk_factors.append("Выраженное эмоциональное выгорание")
-        risk_score += 2
-    elif burns_score and burns_score >= 11:
-        risk_factors.append("Умеренное эмоциональное выгорание")
-        risk_score += 1
-    
-    # Нарушения сна
-    isi_score = test_data.get('isi_score', 0)
-    if isi_score and isi_score >= 15:
-        risk_factors.append("Клиническая бессонница")
-        risk_score += 2
-    elif isi_score and isi_score >= 8:
-        risk_factors.append("Субклиническая бессонница")
-        risk_score += 1
-    
-    stop_bang_score = test_data.get('stop_bang_score', 0)
-    if stop_bang_score and stop_bang_score >= 5:
-        risk_factors.append("Высокий риск апноэ сна")
-        risk_score += 3
-    elif stop_bang_score and stop_bang_score >= 3:
-        risk_factors.append("Умеренный риск апноэ сна")
-        risk_score += 1
-    
-    ess_score = test_data.get('ess_score', 0)
-    if ess_score and ess_score >= 16:
-        risk_factors.append("Выраженная дневная сонливость")
-        risk_score += 1
-    
-    # Вредные привычки
-    fagerstrom_score = test_data.get('fagerstrom_score')
-    if fagerstrom_score and fagerstrom_score >= 7:
-        risk_factors.append("Сильная никотиновая зависимость")
-        risk_score += 4
-    elif fagerstrom_score and fagerstrom_score >= 5:
-        risk_factors.append("Умеренная никотиновая зависимость")
-        risk_score += 3
-    elif fagerstrom_score and fagerstrom_score >= 3:
-        risk_factors.append("Слабая никотиновая зависимость")
-        risk_score += 2
-    elif fagerstrom_score and fagerstrom_score > 0:
-        risk_factors.append("Курение")
-        risk_score += 1
-    
-    audit_score = test_data.get('audit_score')
-    if audit_score and audit_score >= 20:
-        risk_factors.append("Возможная алкогольная зависимость")
-        risk_score += 3
-    elif audit_score and audit_score >= 16:
-        risk_factors.append("Вредное употребление алкоголя")
-        risk_score += 2
-    elif audit_score and audit_score >= 8:
-        risk_factors.append("Опасное употребление алкоголя")
-        risk_score += 1
-    
-    # Определяем уровень риска
-    if risk_score <= 3:
-        risk_level = "НИЗКИЙ"
-        risk_color = "🟢"
-        recommendation = "Ваш риск сердечно-сосудистых заболеваний низкий. Продолжайте вести здоровый образ жизни."
-    elif risk_score <= 6:
-        risk_level = "УМЕРЕННЫЙ"
-        risk_color = "🟡"
-        recommendation = "У вас умеренный риск. Рекомендуется консультация кардиолога и коррекция образа жизни."
-    elif risk_score <= 10:
-        risk_level = "ВЫСОКИЙ"
-        risk_color = "🟠"
-        recommendation = "Высокий риск! Необходима срочная консультация кардиолога и комплексное обследование."
-    else:
-        risk_level = "ОЧЕНЬ ВЫСОКИЙ"
-        risk_color = "🔴"
-        recommendation = "Критически высокий риск! Немедленно обратитесь к кардиологу для экстренного обследования."
-    
-    return {
-        'risk_score': risk_score,
-        'risk_level': risk_level,
-        'risk_color': risk_color,
-        'factors_count': len(risk_factors),
-        'risk_factors': risk_factors,
-        'recommendation': recommendation
-    }
\ No newline at end of file
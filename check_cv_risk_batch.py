@@ -0,0 +1,96 @@
+"""
+Проверка пакетного расчета общего риска против расчета по одному пользователю
+Случайные опросы и баллы тестов (включая пустые значения и граничные баллы)
+считаются calculate_cv_risk_batch и calculate_overall_cardiovascular_risk,
+результаты сравниваются построчно, печатается время обоих способов
+(сборка DataFrame из словарей считается отдельно).
+Запуск: python check_cv_risk_batch.py [число_пользователей]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot"))
+
+from surveys import (
+    CV_RISK_RULES,
+    SCORE_LIMITS,
+    build_risk_frame,
+    calculate_cv_risk_batch,
+    calculate_overall_cardiovascular_risk,
+)
+
+SURVEY_VALUES = {
+    "gender": ["Мужской", "Женский", None],
+    "heart_disease": ["Да", "Нет", "Не знаю", None],
+    "cv_risk": ["очень высокий", "высокий", "средний", "низкий", None],
+}
+
+
+def random_user(rng: random.Random) -> dict:
+    """Опрос и тесты одного пользователя; каждое поле может отсутствовать"""
+    survey = {
+        "age": rng.choice([None, rng.randint(18, 80), 35, 36, 45, 46]),
+        "health_rating": rng.choice([None, rng.randint(0, 10), 5, 6]),
+    }
+    for field, values in SURVEY_VALUES.items():
+        survey[field] = rng.choice(values)
+
+    tests = {}
+    for field, (low, high) in SCORE_LIMITS.items():
+        if rng.random() < 0.15:
+            continue  # тест не пройден
+        tests[field] = rng.choice([None, rng.randint(low, high), rng.randint(low, min(high, 20))])
+
+    survey = {key: value for key, value in survey.items() if value is not None or rng.random() < 0.5}
+    return {"user": {}, "survey": survey, "tests": tests}
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rng = random.Random(2025)
+    users = [random_user(rng) for _ in range(size)]
+
+    started = time.perf_counter()
+    expected = [
+        calculate_overall_cardiovascular_risk(user["user"], user["survey"], user["tests"])
+        for user in users
+    ]
+    per_user = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frame = build_risk_frame(users)
+    framing = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = calculate_cv_risk_batch(frame, with_factors=True)
+    vectorized = time.perf_counter() - started
+
+    factor_columns = [f"factor_{field}" for _, field, _, _ in CV_RISK_RULES]
+    mismatches = 0
+    for index, (single, row) in enumerate(zip(expected, batch.itertuples(index=False))):
+        row = row._asdict()
+        factors = [row[column] for column in factor_columns if row[column] is not None]
+        if (
+            single["risk_score"] != row["risk_score"]
+            or single["risk_level"] != row["risk_level"]
+            or single["factors_count"] != row["factors_count"]
+            or single["risk_factors"] != factors
+        ):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ Строка {index}: {users[index]}\n   по одному: {single}\n   пакетно: {row}")
+
+    print(f"Пользователей: {size}")
+    print(f"По одному: {per_user * 1000:.1f} мс, пакетно: {vectorized * 1000:.1f} мс "
+          f"(x{per_user / vectorized:.1f}), сборка таблицы: {framing * 1000:.1f} мс")
+    if mismatches:
+        print(f"❌ Расхождений: {mismatches}")
+        sys.exit(1)
+    print("✅ Результаты совпадают")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Проверка скомпилированной таблицы SCORE2
+Каждая ячейка массива SCORE2_RISK сравнивается с исходным словарем SCORE2_TABLE,
+затем score2_batch сравнивается с расчетом по одному ответу на всех сочетаниях
+вариантов клавиатур (плюс пустые и неизвестные значения), печатается время на
+случайной выборке.
+Запуск: python check_score2_table.py [число_строк]
+"""
+
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot"))
+
+import pandas as pd
+
+from score_2_handler import (
+    AGE_CHOICE_GROUPS,
+    BP_CHOICE_GROUPS,
+    CHOL_MGDL_CHOICE_GROUPS,
+    CHOL_MMOL_CHOICE_GROUPS,
+    SCORE2_RISK,
+    SCORE2_TABLE,
+    calculate_score2_risk,
+    get_age_group,
+    get_bp_group,
+    get_cholesterol_group_mgdl,
+    get_cholesterol_group_mmol,
+    get_risk_interpretation,
+    score2_batch,
+)
+
+GENDERS = ["женский", "мужской", None]
+SMOKING = ["курит", "не_курит", None]
+UNITS = ["mmol", "mgdl", None]
+UNKNOWN = [None, "???"]
+
+
+def check_cells() -> int:
+    """Каждая ячейка словаря против массива и calculate_score2_risk"""
+    mismatches = 0
+    cells = 0
+    for age_group, genders in SCORE2_TABLE.items():
+        for gender_key, smoking_rows in genders.items():
+            for smoking_key, bp_rows in smoking_rows.items():
+                for bp_group, chol_cells in bp_rows.items():
+                    for chol_group, expected in chol_cells.items():
+                        cells += 1
+                        gender = "женский" if gender_key == "female" else "мужской"
+                        smoking = "курит" if smoking_key == "smoking" else "не_курит"
+                        actual = calculate_score2_risk(gender, smoking, age_group, bp_group, chol_group)
+                        if actual != expected:
+                            mismatches += 1
+                            print(f"❌ {age_group}/{gender_key}/{smoking_key}/{bp_group}/{chol_group}: "
+                                  f"словарь {expected}, массив {actual}")
+
+    if cells != SCORE2_RISK.size:
+        mismatches += 1
+        print(f"❌ Ячеек в словаре {cells}, в массиве {SCORE2_RISK.size}")
+    print(f"Ячеек проверено: {cells}")
+    return mismatches
+
+
+def single_result(answers: dict):
+    """Расчет по одному ответу - как в calculate_and_show_result"""
+    if answers["cholesterol_unit"] == "mmol":
+        chol_group = get_cholesterol_group_mmol(answers["cholesterol"])
+    else:
+        chol_group = get_cholesterol_group_mgdl(answers["cholesterol"])
+    risk = calculate_score2_risk(
+        answers["gender"],
+        answers["smoking"],
+        get_age_group(answers["age"]),
+        get_bp_group(answers["blood_pressure"]),
+        chol_group,
+    )
+    return risk, get_risk_interpretation(risk)["level"]
+
+
+def all_answers() -> list:
+    """Все сочетания вариантов клавиатур, включая пустые и неизвестные ответы"""
+    cholesterol = list(CHOL_MMOL_CHOICE_GROUPS) + list(CHOL_MGDL_CHOICE_GROUPS) + UNKNOWN
+    return [
+        dict(zip(
+            ("gender", "smoking", "age", "blood_pressure", "cholesterol_unit", "cholesterol"),
+            combination,
+        ))
+        for combination in itertools.product(
+            GENDERS, SMOKING, list(AGE_CHOICE_GROUPS) + UNKNOWN,
+            list(BP_CHOICE_GROUPS) + UNKNOWN, UNITS, cholesterol,
+        )
+    ]
+
+
+def check_batch(answers: list) -> int:
+    """score2_batch против расчета по одному ответу"""
+    batch = score2_batch(pd.DataFrame(answers))
+    mismatches = 0
+    for row, risk, level in zip(answers, batch["score2_risk"], batch["score2_level"]):
+        if single_result(row) != (risk, level):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ {row}: по одному {single_result(row)}, пакетно {(risk, level)}")
+    print(f"Сочетаний ответов проверено: {len(answers)}")
+    return mismatches
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    combinations = all_answers()
+    mismatches = check_cells() + check_batch(combinations)
+
+    rng = random.Random(2025)
+    answers = [rng.choice(combinations) for _ in range(size)]
+    frame = pd.DataFrame(answers)
+
+    started = time.perf_counter()
+    for row in answers:
+        single_result(row)
+    per_row = time.perf_counter() - started
+
+    started = time.perf_counter()
+    score2_batch(frame)
+    vectorized = time.perf_counter() - started
+
+    print(f"Строк: {size}")
+    print(f"По одному: {per_row * 1000:.1f} мс, пакетно: {vectorized * 1000:.1f} мс "
+          f"(x{per_row / vectorized:.1f})")
+    if mismatches:
+        print(f"❌ Расхождений: {mismatches}")
+        sys.exit(1)
+    print("✅ Результаты совпадают")
+
+
+if __name__ == "__main__":
+    main()
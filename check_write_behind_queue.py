@@ -0,0 +1,68 @@
+"""
+Проверка остановки очереди логов активности без потери записей
+Записи ставятся в очередь, очередь останавливается в разные моменты
+(внутри окна сброса, сразу после постановки, при нескольких пакетах),
+после чего число строк в activity_logs сверяется с числом поставленных.
+Запуск: python check_write_behind_queue.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# Отдельная временная база, до импорта database
+_tmp_dir = tempfile.mkdtemp(prefix="check_queue_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'check.db')}"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot"))
+
+import logging
+
+from database import ActivityLog, activity_log_queue, get_db_sync, init_db, log_user_activity
+
+# (название, число записей, пауза перед остановкой в секундах)
+SCENARIOS = [
+    ("внутри окна сброса", 5, 0.05),
+    ("сразу после постановки", 5, 0.0),
+    ("несколько пакетов", activity_log_queue.batch_size * 3 + 7, 0.0),
+    ("после сброса по таймеру", 5, activity_log_queue.flush_interval * 2),
+]
+
+
+def count_rows(action: str) -> int:
+    db = get_db_sync()
+    try:
+        return db.query(ActivityLog).filter(ActivityLog.action == action).count()
+    finally:
+        db.close()
+
+
+async def run_scenario(index: int, count: int, pause: float) -> int:
+    action = f"check_queue_{index}"
+    activity_log_queue.start()
+    for i in range(count):
+        await log_user_activity(telegram_id=1_000_000 + i, action=action)
+    await asyncio.sleep(pause)
+    await activity_log_queue.stop()
+    return count_rows(action)
+
+
+async def main():
+    logging.disable(logging.INFO)
+    init_db()
+
+    failed = 0
+    for index, (title, count, pause) in enumerate(SCENARIOS):
+        written = await run_scenario(index, count, pause)
+        mark = "✅" if written == count else "❌"
+        print(f"{mark} {title}: поставлено {count}, записано {written}")
+        failed += written != count
+
+    if failed:
+        sys.exit(1)
+    print("✅ Записи не теряются при остановке очереди")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
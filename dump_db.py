@@ -1,9 +1,36 @@
+import os
 import sqlite3
+import subprocess
 import sys
 
-src = "cardio.db"
+from sqlalchemy.engine import make_url
+
+url = make_url(os.getenv("DATABASE_URL", "sqlite:///cardio_bot.db"))
 dump = "dump_all.sql"
 
+if url.get_backend_name() == "postgresql":
+    # Текстовый дамп PostgreSQL (восстановление: psql -f dump_all.sql)
+    env = dict(os.environ)
+    if url.password:
+        env["PGPASSWORD"] = url.password
+    dsn = url.set(drivername="postgresql", password=None).render_as_string(hide_password=False)
+    result = subprocess.run(
+        ["pg_dump", "--format=plain", "--file", dump, "--dbname", dsn],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print("❌ Не удалось сделать дамп:", result.stderr.strip(), file=sys.stderr)
+        sys.exit(1)
+    print(f"✔ Дамп успешно сохранён в {dump}")
+    sys.exit(0)
+
+src = url.database
+if not src or not os.path.exists(src):
+    print(f"❌ Файл базы не найден: {src}", file=sys.stderr)
+    sys.exit(1)
+
 try:
     conn = sqlite3.connect(src)
     with open(dump, "w", encoding="utf-8") as f:
@@ -14,4 +41,4 @@ except sqlite3.DatabaseError as e:
     print("❌ Не удалось сделать дамп:", e, file=sys.stderr)
     sys.exit(1)
 finally:
-    conn.close()
\ No newline at end of file
+    conn.close()